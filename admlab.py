@@ -2,61 +2,125 @@
 import streamlit as st
 from datetime import date
 from database import supabase
-from email_service import send_email  # Certifique-se de importar o módulo de e-mail
+from espelho_local import leitura, registrar, registrar_remocao
+from carregamento import carregar, mapa_usuarios
+from escolas import cabecalho_escola, escola_id
+from estado_sessao import estado_sessao
+from cache_compartilhado import obter
+from dados_sessao import carregar_sessao, aplicar, atualizar_linhas, remover_linhas, manter
+from functools import partial
+from conflitos_horarios import verificar_conflitos_horario_fixo
+from busca import exibir_busca
+from relatorios import exibir_exportacao
+from email_service import notify  # Certifique-se de importar o módulo de e-mail
 
 
 def painel_admin_laboratorio():
     st.title("📅 Espaços MCPF")  # Título do sistema
     st.subheader("Painel de Administração dos Laboratórios")
-    st.write("**EEEP Professora Maria Célia Pinheiro Falcão**")
+    cabecalho_escola()
    
-    administrador_id = st.session_state["usuario_id"]
+    administrador_id = estado_sessao().usuario_id
 
     try:
-        # Obter laboratórios associados ao administrador
-        response = supabase.table('laboratorios').select('*').eq('administrador_id', administrador_id).execute()
-        laboratorios = response.data
+        # Obter laboratórios associados ao administrador; a lista fica na sessão até uma gravação nos espaços da escola
+        laboratorios = carregar_sessao({'meus_laboratorios': (
+            [f'laboratorios:{escola_id()}'], partial(buscar_laboratorios_administrador, administrador_id, escola_id())
+        )})['meus_laboratorios']
 
         if not laboratorios:
             st.info('Você não está associado a nenhum laboratório.')
             return
 
+        dados = carregar_dados_laboratorios(laboratorios)
+
         for lab in laboratorios:
             st.subheader(f"Laboratório de {lab['nome']}")
 
-            tab1, tab2, tab3 = st.tabs(["Agendamentos Pendentes", "Horários Fixos", "Histórico de Atividades"])
+            tab1, tab2, tab3, tab4 = st.tabs(["Agendamentos Pendentes", "Horários Fixos", "Histórico de Atividades", "Buscar Atividades"])
 
             with tab1:
-                gerenciar_agendamentos_pendentes(lab['id'])
+                gerenciar_agendamentos_pendentes(lab['id'], dados)
 
             with tab2:
-                gerenciar_horarios_fixos(lab['id'])
+                gerenciar_horarios_fixos(lab['id'], dados)
             
             with tab3:
-                visualizar_historico_atividades(lab['id'])
+                visualizar_historico_atividades(lab['id'], dados)
+                # Exportação em lotes de todo o histórico do espaço, inclusive o arquivado (ver relatorios.py)
+                st.write("📥 **Exportar relatório:**")
+                exibir_exportacao(f"relatorio_{lab['id']}", escola_id(), [lab])
+
+            with tab4:
+                # Busca paginada no servidor, inclusive nos agendamentos arquivados (ver busca.py)
+                exibir_busca(f"busca_{lab['id']}", escola_id(), [lab])
 
     except Exception as e:
         st.error(f'Erro ao carregar os laboratórios: {e}')
 
 
+COLUNAS_HISTORICO = ('id', 'usuario_id', 'data_agendamento', 'aulas', 'descricao', 'status')
+
+def chave_historico(laboratorio_id):
+    return ('historico', laboratorio_id, date.today().isoformat())
+
+def carregar_dados_laboratorios(laboratorios):
+    # As consultas de todos os laboratórios rodam ao mesmo tempo e ficam na sessão até uma gravação
+    # nas suas etiquetas (ver dados_sessao.py); só os nomes dos professores dependem delas e são
+    # buscados depois, em uma única consulta
+    hoje = date.today().isoformat()
+    consultas = {}
+    for lab in laboratorios:
+        lab_id = lab['id']
+        consultas[('pendentes', lab_id)] = ([f'pendentes:{lab_id}', f'usuarios:{escola_id()}'], partial(buscar_pendentes, lab_id, escola_id()))
+        consultas[('horarios', lab_id)] = ([f'agenda:{lab_id}'], partial(buscar_horarios_fixos, lab_id, escola_id()))
+        # Inclui os agendamentos já movidos para o arquivo (ver arquivamento.py)
+        consultas[chave_historico(lab_id)] = (
+            [f'agenda:{lab_id}', f'pendentes:{lab_id}', f'usuarios:{escola_id()}'],
+            partial(buscar_historico, lab_id, hoje, escola_id(), colunas=COLUNAS_HISTORICO)
+        )
+    dados = carregar_sessao(consultas)
+
+    ids_usuarios = set()
+    for chave in consultas:
+        if dados.ok(chave) and chave[0] != 'horarios':
+            ids_usuarios.update(agendamento['usuario_id'] for agendamento in dados[chave])
+    dados.update(carregar({'usuarios': partial(mapa_usuarios, ids_usuarios, escola_id(), colunas=('id', 'name'))}))
+    return dados
+
+def buscar_laboratorios_administrador(administrador_id, escola_id):
+    return supabase.table('laboratorios').select('*').eq('escola_id', escola_id).eq('administrador_id', administrador_id).execute().data
+
+def buscar_pendentes(laboratorio_id, escola_id):
+    # Pedidos pendentes e horários fixos ficam no cache compartilhado (ver cache_compartilhado.py)
+    return obter(
+        f'pendentes:{escola_id}:{laboratorio_id}', [f'pendentes:{laboratorio_id}', f'usuarios:{escola_id}'],
+        lambda: supabase.table('agendamentos').select('*').eq('escola_id', escola_id).eq('laboratorio_id', laboratorio_id).eq('status', 'pendente').execute().data
+    )
+
+def buscar_horarios_fixos(laboratorio_id, escola_id):
+    return obter(
+        f'horarios:{escola_id}:{laboratorio_id}', [f'agenda:{laboratorio_id}'],
+        lambda: supabase.table('horarios_fixos').select('*').eq('escola_id', escola_id).eq('laboratorio_id', laboratorio_id).execute().data
+    )
+
+def nome_usuario(dados, usuario_id):
+    if not dados.ok('usuarios'):
+        return 'Desconhecido'
+    return dados['usuarios'].get(usuario_id, {}).get('name', 'Desconhecido')
+
+
 import streamlit as st
 from datetime import date
 from database import supabase
+from arquivamento import buscar_historico
 
-def visualizar_historico_atividades(laboratorio_id):
+def visualizar_historico_atividades(laboratorio_id, dados):
     st.subheader("📜 Histórico de Atividades")
 
     try:
-        # Buscar todos os agendamentos passados para este laboratório
-        hoje = date.today().isoformat()  # Data de hoje para comparação
-        response_agendamentos = (
-            supabase.table('agendamentos')
-            .select('id', 'usuario_id', 'data_agendamento', 'aulas', 'descricao', 'status')
-            .eq('laboratorio_id', laboratorio_id)
-            .lt('data_agendamento', hoje)  # Apenas agendamentos passados
-            .execute()
-        )
-        agendamentos = response_agendamentos.data
+        # Agendamentos passados deste laboratório, carregados em carregar_dados_laboratorios
+        agendamentos = dados[chave_historico(laboratorio_id)]
 
         if not agendamentos:
             st.info('Nenhuma atividade passada registrada neste espaço.')
@@ -65,9 +129,7 @@ def visualizar_historico_atividades(laboratorio_id):
         # Criar uma lista formatada para exibição
         historico = []
         for agendamento in agendamentos:
-            # Buscar nome do professor
-            response_user = supabase.table('users').select('name').eq('id', agendamento['usuario_id']).execute()
-            nome_professor = response_user.data[0]['name'] if response_user.data else "Desconhecido"
+            nome_professor = nome_usuario(dados, agendamento['usuario_id'])
 
             # Formatar a lista de aulas
             aulas = ', '.join([f"{aula}ª Aula" for aula in sorted(agendamento['aulas'])])
@@ -93,115 +155,146 @@ def visualizar_historico_atividades(laboratorio_id):
     except Exception as e:
         st.error(f'Erro ao carregar o histórico de atividades: {e}')
 
-def gerenciar_agendamentos_pendentes(laboratorio_id):
+# Colunas das listas de aulas; o formato "3ª Aula" vira uma lista de rótulos em uma única célula
+COLUNA_AULAS = st.column_config.ListColumn("Aulas")
+
+def formatar_aulas(aulas):
+    return [f"{aula}ª Aula" for aula in sorted(aulas)]
+
+def chave_tabela(nome, laboratorio_id, linhas):
+    # A chave muda quando as linhas mudam, então uma seleção antiga nunca aponta para outro registro
+    return f"{nome}_{laboratorio_id}_{hash(tuple(linha['id'] for linha in linhas))}"
+
+def gerenciar_agendamentos_pendentes(laboratorio_id, dados):
     st.subheader("Agendamentos Pendentes")
     try:
         # Obter agendamentos pendentes para este laboratório
-        response_agendamentos = supabase.table('agendamentos').select('*').eq('laboratorio_id', laboratorio_id).eq('status', 'pendente').execute()
-        agendamentos = response_agendamentos.data
+        agendamentos = dados[('pendentes', laboratorio_id)]
         if not agendamentos:
             st.info('Nenhum agendamento pendente.')
-        else:
-            for agendamento in agendamentos:
-                exibir_agendamento_para_validacao(agendamento)
-    except Exception as e:
-        st.error(f'Erro ao carregar os agendamentos: {e}')
-
-def exibir_agendamento_para_validacao(agendamento):
-    try:
-        # Obter informações adicionais
-        # Obter nome do professor
-        response_user = supabase.table('users').select('name').eq('id', agendamento['usuario_id']).execute()
-        professor_name = response_user.data[0]['name'] if response_user.data else 'Desconhecido'
-
-        aulas = [f"{aula}ª Aula" for aula in agendamento['aulas']]
-        st.write(f"**Professor:** {professor_name}")
-        st.write(f"**Data:** {agendamento['data_agendamento']}")
+            return
 
-        st.write(f"**Aulas:** {', '.join(aulas)}")
-        st.write(f"**Status:** {agendamento['status']}")
+        # Uma única tabela com seleção de linhas, em vez de textos e botões por agendamento
+        tabela = [{
+            "Professor(a)": nome_usuario(dados, agendamento['usuario_id']),
+            "Data": date.fromisoformat(agendamento['data_agendamento']),
+            "Aulas": formatar_aulas(agendamento['aulas']),
+            "Descrição": agendamento.get('descricao') or '',
+        } for agendamento in agendamentos]
+        evento = st.dataframe(
+            tabela,
+            column_config={"Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"), "Aulas": COLUNA_AULAS},
+            hide_index=True,
+            use_container_width=True,
+            on_select='rerun',
+            selection_mode='multi-row',
+            key=chave_tabela('pendentes', laboratorio_id, agendamentos)
+        )
+        selecionados = [agendamentos[linha]['id'] for linha in evento.selection.rows if linha < len(agendamentos)]
+        st.caption(f"{len(selecionados)} de {len(agendamentos)} selecionado(s). Marque as linhas e escolha a ação.")
 
+        # As ações rodam como callbacks, antes da próxima execução, que já mostra a lista corrigida
         col1, col2 = st.columns(2)
         with col1:
-            if st.button("✅ Aprovar", key=f"aprovar_{agendamento['id']}"):
-                atualizar_status_agendamento(agendamento['id'], 'aprovado')
+            st.button("✅ Aprovar", key=f"aprovar_{laboratorio_id}", disabled=not selecionados,
+                      on_click=atualizar_status_agendamentos, args=(selecionados, 'aprovado'))
         with col2:
-            if st.button("❌ Rejeitar", key=f"rejeitar_{agendamento['id']}"):
-                atualizar_status_agendamento(agendamento['id'], 'rejeitado')
+            st.button("❌ Rejeitar", key=f"rejeitar_{laboratorio_id}", disabled=not selecionados,
+                      on_click=atualizar_status_agendamentos, args=(selecionados, 'rejeitado'))
     except Exception as e:
-        st.error(f'Erro ao exibir agendamento: {e}')
+        st.error(f'Erro ao carregar os agendamentos: {e}')
 
-def atualizar_status_agendamento(agendamento_id, novo_status):
+def atualizar_status_agendamentos(agendamento_ids, novo_status):
     try:
-        # Atualiza o status do agendamento no banco de dados
-        response = supabase.table('agendamentos').update({'status': novo_status}).eq('id', agendamento_id).execute()
-        st.success(f'Agendamento {novo_status} com sucesso!')
-        
-               
-        
-        # Recupera os detalhes do agendamento para montar a notificação
-        response_agendamento = supabase.table('agendamentos').select('usuario_id', 'laboratorio_id', 'data_agendamento', 'descricao').eq('id', agendamento_id).execute()
-        if response_agendamento.data:
-            agendamento_info = response_agendamento.data[0]
-            usuario_id = agendamento_info['usuario_id']
-            # Recupera o e-mail do professor
-            response_user = supabase.table('users').select('email').eq('id', usuario_id).execute()
-            email_usuario = response_user.data[0]['email'] if response_user.data else None
-            
-            # Recupera o nome do laboratório
-            response_lab = supabase.table('laboratorios').select('nome').eq('id', agendamento_info['laboratorio_id']).execute()
-            nome_laboratorio = response_lab.data[0]['nome'] if response_lab.data else "Laboratório Desconhecido"
-            
-            # Recupera a data do agendamento para o e-mail
-            data_agendamento = agendamento_info.get('data_agendamento', 'Data não informada')
-
-            if email_usuario:
-                subject = f"Agendamento {novo_status.capitalize()}"
-                body = (
-                    f"Olá,\n\n"
-                    f"Informamos que o seu agendamento para o espaço {nome_laboratorio}, marcado para o dia {data_agendamento}, foi {novo_status}.\n\n"
-                    f"Descrição da atividade: {agendamento_info.get('descricao', 'Sem descrição')}\n\n"
-                    "Caso necessite de esclarecimentos adicionais ou tenha dúvidas, por favor, entre em contato conosco.\n\n"
-                    "Atenciosamente,\nEquipe 🦉AgendaMCPF"
-                )
-
-                send_email(subject, body, email_usuario)
-        st.rerun()
+        # Atualiza o status de todos os agendamentos selecionados em uma única chamada
+        response = supabase.table('agendamentos').update({'status': novo_status}).eq('escola_id', escola_id()).in_('id', agendamento_ids).execute()
+        registrar('agendamentos', response.data)
+        ids_labs = {agendamento['laboratorio_id'] for agendamento in response.data}
+        ids = [agendamento['id'] for agendamento in response.data]
+        correcoes = {}
+        for lab_id in ids_labs:
+            correcoes[('pendentes', lab_id)] = remover_linhas(ids)
+            correcoes[('horarios', lab_id)] = manter
+            correcoes[chave_historico(lab_id)] = atualizar_linhas(response.data, acrescentar=False)
+        aplicar(
+            [*[f'pendentes:{lab_id}' for lab_id in ids_labs], *[f'agenda:{lab_id}' for lab_id in ids_labs],
+             *{f"agendamentos_usuario:{agendamento['usuario_id']}" for agendamento in response.data}],
+            correcoes
+        )
+        st.success(f'{len(response.data)} agendamento(s) {novo_status}(s) com sucesso!')
+
+        # As linhas atualizadas já trazem os detalhes; o e-mail dos professores e o nome dos
+        # laboratórios são recuperados ao mesmo tempo para montar as notificações
+        if response.data:
+            dados = carregar({
+                'usuarios': partial(mapa_usuarios, {agendamento['usuario_id'] for agendamento in response.data}, escola_id(), colunas=('id', 'email')),
+                'laboratorios': leitura().table('laboratorios').select('id', 'nome').eq('escola_id', escola_id()).in_('id', list(ids_labs)).execute,
+            })
+            nomes_laboratorios = {lab['id']: lab['nome'] for lab in dados['laboratorios'].data}
+            for agendamento_info in response.data:
+                notificar_status_agendamento(agendamento_info, novo_status, dados['usuarios'], nomes_laboratorios)
     except Exception as e:
         st.error(f'Erro ao atualizar o status do agendamento: {e}')
 
-def gerenciar_horarios_fixos(laboratorio_id):
+def notificar_status_agendamento(agendamento_info, novo_status, usuarios, nomes_laboratorios):
+    email_usuario = usuarios.get(agendamento_info['usuario_id'], {}).get('email')
+    nome_laboratorio = nomes_laboratorios.get(agendamento_info['laboratorio_id'], "Laboratório Desconhecido")
+    
+    # Recupera a data do agendamento para o e-mail
+    data_agendamento = agendamento_info.get('data_agendamento', 'Data não informada')
+
+    if email_usuario:
+        subject = f"Agendamento {novo_status.capitalize()}"
+        body = (
+            f"Olá,\n\n"
+            f"Informamos que o seu agendamento para o espaço {nome_laboratorio}, marcado para o dia {data_agendamento}, foi {novo_status}.\n\n"
+            f"Descrição da atividade: {agendamento_info.get('descricao', 'Sem descrição')}\n\n"
+            "Caso necessite de esclarecimentos adicionais ou tenha dúvidas, por favor, entre em contato conosco.\n\n"
+            "Atenciosamente,\nEquipe 🦉AgendaMCPF"
+        )
+
+        notify(subject, body, email_usuario)
+
+def gerenciar_horarios_fixos(laboratorio_id, dados):
     st.subheader("Gerenciar Horários Fixos")
     # Mapeamento inverso para exibir o nome do dia da semana
-    dias_semana_inverso = {
-        0: 'Segunda',
-        1: 'Terça',
-        2: 'Quarta',
-        3: 'Quinta',
-        4: 'Sexta'
-    }
+    dias_semana_inverso = {v: k for k, v in DIAS_SEMANA.items()}
     # Exibir horários fixos existentes
     try:
-        response_horarios = supabase.table('horarios_fixos').select('*').eq('laboratorio_id', laboratorio_id).execute()
-        horarios = response_horarios.data
+        horarios = dados[('horarios', laboratorio_id)]
 
         if horarios:
             # Ordenar os horários por dia da semana
             horarios.sort(key=lambda x: x['dia_semana'])
-            for horario in horarios:
-                dia_semana_nome = dias_semana_inverso.get(horario['dia_semana'], 'Desconhecido')
-                aulas_formatadas = ', '.join([f'{aula}ª Aula' for aula in sorted(horario['aulas'])])
-                periodo = f"{horario['data_inicio']} até {horario['data_fim']}"
-                with st.expander(f"{dia_semana_nome} - {aulas_formatadas}"):
-                    st.write(f"**Período:** {periodo}")
-                    st.write(f"**Descrição:** {horario.get('descricao', '')}")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button("📝 Editar Horário", key=f"editar_horario_{horario['id']}"):
-                            editar_horario_fixo(horario)
-                    with col2:
-                        if st.button("❌ Excluir Horário", key=f"excluir_horario_{horario['id']}"):
-                            remover_horario_fixo(horario['id'])
+            tabela = [{
+                "Dia": dias_semana_inverso.get(horario['dia_semana'], 'Desconhecido'),
+                "Aulas": formatar_aulas(horario['aulas']),
+                "Início": date.fromisoformat(horario['data_inicio']),
+                "Fim": date.fromisoformat(horario['data_fim']),
+                "Descrição": horario.get('descricao') or '',
+            } for horario in horarios]
+            evento = st.dataframe(
+                tabela,
+                column_config={
+                    "Aulas": COLUNA_AULAS,
+                    "Início": st.column_config.DateColumn("Início", format="DD/MM/YYYY"),
+                    "Fim": st.column_config.DateColumn("Fim", format="DD/MM/YYYY"),
+                },
+                hide_index=True,
+                use_container_width=True,
+                on_select='rerun',
+                selection_mode='single-row',
+                key=chave_tabela('horarios', laboratorio_id, horarios)
+            )
+            linhas = [linha for linha in evento.selection.rows if linha < len(horarios)]
+            if not linhas:
+                st.caption("Selecione um horário na tabela para editá-lo ou excluí-lo.")
+            else:
+                # As ações valem só para o horário selecionado
+                horario = horarios[linhas[0]]
+                st.button("❌ Excluir Horário", key=f"excluir_horario_{horario['id']}",
+                          on_click=remover_horario_fixo, args=(horario['id'], laboratorio_id))
+                editar_horario_fixo(horario)
         else:
             st.info("Nenhum horário fixo cadastrado.")
 
@@ -212,89 +305,119 @@ def gerenciar_horarios_fixos(laboratorio_id):
     st.subheader("Adicionar Novo Horário Fixo")
     adicionar_horario_fixo(laboratorio_id)
 
+# Mapeamento dos dias da semana para inteiros
+DIAS_SEMANA = {
+    'Segunda': 0,
+    'Terça': 1,
+    'Quarta': 2,
+    'Quinta': 3,
+    'Sexta': 4
+}
+
+def ler_formulario_horario(prefixo):
+    # Os formulários são enviados por callbacks, que leem os campos da sessão pelas chaves dos widgets
+    campos = {campo: st.session_state[f'{prefixo}_{campo}'] for campo in ('dia', 'aulas', 'inicio', 'fim', 'descricao')}
+    if not campos['aulas']:
+        st.warning("Por favor, selecione ao menos uma aula.")
+        return None
+    if campos['inicio'] > campos['fim']:
+        st.warning("A data de início não pode ser posterior à data de fim.")
+        return None
+    return campos
+
 def adicionar_horario_fixo(laboratorio_id):
-    with st.form(key='form_adicionar_horario_fixo'):
-        # Mapeamento dos dias da semana para inteiros
-        dias_semana_opcoes = {
-            'Segunda': 0,
-            'Terça': 1,
-            'Quarta': 2,
-            'Quinta': 3,
-            'Sexta': 4
-        }
-
-        dia_semana_nome = st.selectbox("Dia da Semana", options=list(dias_semana_opcoes.keys()))
-        dia_semana = dias_semana_opcoes[dia_semana_nome]  # Obter o valor inteiro correspondente
-        aulas_selecionadas = st.multiselect("Selecione as Aulas", options=list(range(1, 10)))  # Aulas de 1 a 9
-        data_inicio = st.date_input("Data de Início", value=date.today())
-        data_fim = st.date_input("Data de Fim", value=date.today())
-        descricao = st.text_input("Descrição (opcional)")
-        submitted = st.form_submit_button("✅ Adicionar Horário Fixo")
-        if submitted:
-            if not aulas_selecionadas:
-                st.warning("Por favor, selecione ao menos uma aula.")
-            elif data_inicio > data_fim:
-                st.warning("A data de início não pode ser posterior à data de fim.")
-            else:
-                novo_horario = {
-                    'laboratorio_id': laboratorio_id,
-                    'dia_semana': dia_semana,  # Agora é um inteiro
-                    'aulas': aulas_selecionadas,
-                    'data_inicio': data_inicio.isoformat(),
-                    'data_fim': data_fim.isoformat(),
-                    'descricao': descricao.strip()
-                }
-                try:
-                    response = supabase.table('horarios_fixos').insert(novo_horario).execute()
-                    st.success("Horário fixo adicionado com sucesso!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f'Erro ao adicionar o horário fixo: {e}')
+    prefixo = f'novo_horario_{laboratorio_id}'
+    with st.form(key=f'form_adicionar_horario_fixo_{laboratorio_id}'):
+        st.selectbox("Dia da Semana", options=list(DIAS_SEMANA.keys()), key=f'{prefixo}_dia')
+        st.multiselect("Selecione as Aulas", options=list(range(1, 10)), key=f'{prefixo}_aulas')  # Aulas de 1 a 9
+        st.date_input("Data de Início", value=date.today(), key=f'{prefixo}_inicio')
+        st.date_input("Data de Fim", value=date.today(), key=f'{prefixo}_fim')
+        st.text_input("Descrição (opcional)", key=f'{prefixo}_descricao')
+        st.form_submit_button("✅ Adicionar Horário Fixo", on_click=salvar_novo_horario_fixo, args=(laboratorio_id, prefixo))
+
+def salvar_novo_horario_fixo(laboratorio_id, prefixo):
+    campos = ler_formulario_horario(prefixo)
+    if campos is None:
+        return
+    dia_semana = DIAS_SEMANA[campos['dia']]  # Obter o valor inteiro correspondente
+    novo_horario = {
+        'laboratorio_id': laboratorio_id,
+        'escola_id': escola_id(),
+        'dia_semana': dia_semana,  # Agora é um inteiro
+        'aulas': campos['aulas'],
+        'data_inicio': campos['inicio'].isoformat(),
+        'data_fim': campos['fim'].isoformat(),
+        'descricao': campos['descricao'].strip()
+    }
+    try:
+        conflitos = verificar_conflitos_horario_fixo(laboratorio_id, dia_semana, campos['aulas'], campos['inicio'], campos['fim'], escola_id())
+        if conflitos:
+            exibir_conflitos(conflitos)
+        else:
+            response = supabase.table('horarios_fixos').insert(novo_horario).execute()
+            registrar('horarios_fixos', response.data)
+            aplicar([f'agenda:{laboratorio_id}'], {
+                ('horarios', laboratorio_id): atualizar_linhas(response.data),
+                chave_historico(laboratorio_id): manter,
+            })
+            st.success("Horário fixo adicionado com sucesso!")
+    except Exception as e:
+        st.error(f'Erro ao adicionar o horário fixo: {e}')
 
 def editar_horario_fixo(horario):
     st.subheader(f"Editar Horário Fixo - ID {horario['id']}")
+    prefixo = f'horario_{horario["id"]}'
     with st.form(key=f'form_editar_horario_fixo_{horario["id"]}'):
-        dias_semana_opcoes = {
-            'Segunda': 0,
-            'Terça': 1,
-            'Quarta': 2,
-            'Quinta': 3,
-            'Sexta': 4
-        }
-        dias_semana_inverso = {v: k for k, v in dias_semana_opcoes.items()}
-
-        dia_semana_nome = st.selectbox("Dia da Semana", options=list(dias_semana_opcoes.keys()), index=horario['dia_semana'])
-        dia_semana = dias_semana_opcoes[dia_semana_nome]
-        aulas_selecionadas = st.multiselect("Selecione as Aulas", options=list(range(1, 10)), default=horario['aulas'])
-        data_inicio = st.date_input("Data de Início", value=date.fromisoformat(horario['data_inicio']))
-        data_fim = st.date_input("Data de Fim", value=date.fromisoformat(horario['data_fim']))
-        descricao = st.text_input("Descrição (opcional)", value=horario.get('descricao', ''))
-
-        submitted = st.form_submit_button("💾 Atualizar Horário Fixo")
-        if submitted:
-            if not aulas_selecionadas:
-                st.warning("Por favor, selecione ao menos uma aula.")
-            elif data_inicio > data_fim:
-                st.warning("A data de início não pode ser posterior à data de fim.")
-            else:
-                horario_atualizado = {
-                    'dia_semana': dia_semana,
-                    'aulas': aulas_selecionadas,
-                    'data_inicio': data_inicio.isoformat(),
-                    'data_fim': data_fim.isoformat(),
-                    'descricao': descricao.strip()
-                }
-                try:
-                    response = supabase.table('horarios_fixos').update(horario_atualizado).eq('id', horario['id']).execute()
-                    st.success("Horário fixo atualizado com sucesso!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f'Erro ao atualizar o horário fixo: {e}')
-
-def remover_horario_fixo(horario_id):
+        st.selectbox("Dia da Semana", options=list(DIAS_SEMANA.keys()), index=horario['dia_semana'], key=f'{prefixo}_dia')
+        st.multiselect("Selecione as Aulas", options=list(range(1, 10)), default=horario['aulas'], key=f'{prefixo}_aulas')
+        st.date_input("Data de Início", value=date.fromisoformat(horario['data_inicio']), key=f'{prefixo}_inicio')
+        st.date_input("Data de Fim", value=date.fromisoformat(horario['data_fim']), key=f'{prefixo}_fim')
+        st.text_input("Descrição (opcional)", value=horario.get('descricao', ''), key=f'{prefixo}_descricao')
+
+        st.form_submit_button("💾 Atualizar Horário Fixo", on_click=salvar_horario_fixo_editado, args=(horario, prefixo))
+
+def salvar_horario_fixo_editado(horario, prefixo):
+    campos = ler_formulario_horario(prefixo)
+    if campos is None:
+        return
+    dia_semana = DIAS_SEMANA[campos['dia']]
+    horario_atualizado = {
+        'dia_semana': dia_semana,
+        'aulas': campos['aulas'],
+        'data_inicio': campos['inicio'].isoformat(),
+        'data_fim': campos['fim'].isoformat(),
+        'descricao': campos['descricao'].strip()
+    }
+    try:
+        conflitos = verificar_conflitos_horario_fixo(
+            horario['laboratorio_id'], dia_semana, campos['aulas'], campos['inicio'], campos['fim'], escola_id(),
+            ignorar_horario_id=horario['id']
+        )
+        if conflitos:
+            exibir_conflitos(conflitos)
+        else:
+            response = supabase.table('horarios_fixos').update(horario_atualizado).eq('escola_id', escola_id()).eq('id', horario['id']).execute()
+            registrar('horarios_fixos', response.data)
+            aplicar([f"agenda:{horario['laboratorio_id']}"], {
+                ('horarios', horario['laboratorio_id']): atualizar_linhas(response.data),
+                chave_historico(horario['laboratorio_id']): manter,
+            })
+            st.success("Horário fixo atualizado com sucesso!")
+    except Exception as e:
+        st.error(f'Erro ao atualizar o horário fixo: {e}')
+
+def exibir_conflitos(conflitos):
+    st.error(f"O horário fixo não foi salvo: {len(conflitos)} aula(s) já estão ocupadas no período.")
+    st.dataframe(conflitos, use_container_width=True)
+
+def remover_horario_fixo(horario_id, laboratorio_id):
     try:
-        response = supabase.table('horarios_fixos').delete().eq('id', horario_id).execute()
+        response = supabase.table('horarios_fixos').delete().eq('escola_id', escola_id()).eq('id', horario_id).execute()
+        registrar_remocao('horarios_fixos', [horario_id])
+        aplicar([f'agenda:{laboratorio_id}'], {
+            ('horarios', laboratorio_id): remover_linhas([horario_id]),
+            chave_historico(laboratorio_id): manter,
+        })
         st.success("Horário fixo excluído com sucesso!")
-        st.rerun()
     except Exception as e:
         st.error(f'Erro ao remover o horário fixo: {e}')
@@ -0,0 +1,242 @@
+# agendador.py
+"""
+Agendador das tarefas de manutenção.
+
+Roda como um processo separado do aplicativo, para que nenhuma tarefa dependa de um usuário abrir
+uma tela:
+
+- expirar_pendentes: os pedidos ainda pendentes cuja data já passou viram 'expirado' em uma única
+  atualização. Assim a fila de pendentes dos administradores e a verificação de pedido duplicado
+  só consideram pedidos que ainda podem ser atendidos.
+- lembretes: cada professor recebe um e-mail com seus agendamentos aprovados do dia seguinte. Os
+  e-mails saem em lotes, uma conexão SMTP por lote, e cada agendamento lembrado é marcado em
+  `lembrete_enviado_em`.
+- resumos: os resumos de resumo_notificacoes.py.
+- arquivamento: o arquivamento de arquivamento.py.
+
+Cada execução de uma tarefa tem uma referência: o início da janela do intervalo da tarefa, como
+'2025-03-10T00:00' para as diárias. A execução é reservada com um insert na tabela
+`tarefas_agendadas`, cuja chave primária é (tarefa, referencia). Com vários agendadores, só quem
+conseguir o insert executa a tarefa. Se a tarefa falhar, a reserva é removida e a tarefa é repetida
+no próximo ciclo. A reserva de um processo interrompido expira depois de AGENDADOR_RESERVA_MINUTOS.
+
+As tabelas e colunas são criadas por migracoes/0008_tarefas_agendadas.sql.
+
+Uso:
+    python agendador.py                     # executa continuamente, um ciclo por minuto
+    python agendador.py --uma-vez           # um único ciclo (por exemplo em um cron)
+    python agendador.py --tarefa lembretes  # executa uma tarefa agora, sem reserva
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from postgrest.exceptions import APIError
+from database import supabase
+from cache_compartilhado import invalidar
+from email_service import send_emails
+from arquivamento import arquivar_agendamentos
+from resumo_notificacoes import enviar_resumos_administradores, enviar_emails_agrupados
+
+TABELA_TAREFAS = 'tarefas_agendadas'
+INTERVALO_CICLO_S = float(os.getenv('AGENDADOR_INTERVALO_S', 60))
+RESERVA_MINUTOS = int(os.getenv('AGENDADOR_RESERVA_MINUTOS', 30))
+HORA_LEMBRETES = int(os.getenv('AGENDADOR_HORA_LEMBRETES', 17))
+TAMANHO_LOTE_EMAILS = int(os.getenv('AGENDADOR_LOTE_EMAILS', 50))
+HISTORICO_TAREFAS_DIAS = 30
+
+
+def expirar_pendentes(hoje=None):
+    # Retorna quantos pedidos foram expirados
+    response = (
+        supabase.table('agendamentos')
+        .update({'status': 'expirado'})
+        .eq('status', 'pendente')
+        .lt('data_agendamento', (hoje or date.today()).isoformat())
+        .execute()
+    )
+    if response.data:
+        invalidar(
+            *{f"pendentes:{agendamento['laboratorio_id']}" for agendamento in response.data},
+            *{f"agendamentos_usuario:{agendamento['usuario_id']}" for agendamento in response.data}
+        )
+        logging.info(f"{len(response.data)} pedido(s) pendente(s) expirado(s).")
+    return len(response.data)
+
+
+def montar_lembretes(agendamentos, laboratorios, usuarios):
+    """
+    Agrupa os agendamentos por professor.
+
+    Retorna uma lista de tuplas ((assunto, corpo, email_professor), ids dos agendamentos).
+    """
+    por_professor = {}
+    for agendamento in agendamentos:
+        por_professor.setdefault(agendamento['usuario_id'], []).append(agendamento)
+
+    lembretes = []
+    for usuario_id, itens in por_professor.items():
+        professor = usuarios.get(usuario_id)
+        if not professor or not professor.get('email'):
+            continue
+        data = itens[0]['data_agendamento']
+        linhas = [f"Olá, {professor.get('name') or professor['email']}.\n\nLembramos que você tem {len(itens)} agendamento(s) para amanhã, {data}:"]
+        for agendamento in sorted(itens, key=lambda a: min(a['aulas'])):
+            aulas = ', '.join([f"{aula}ª Aula" for aula in sorted(agendamento['aulas'])])
+            linhas.append(
+                f"- {laboratorios.get(agendamento['laboratorio_id'], 'Espaço desconhecido')} | {aulas}"
+                f" | {agendamento.get('descricao') or 'Sem descrição'}"
+            )
+        linhas.append("\nCaso não vá utilizar o espaço, avise o administrador para liberá-lo.\n\nAtenciosamente,\nEquipe 🦉AgendaMCPF")
+        lembretes.append((("Lembrete de Agendamento para Amanhã", '\n'.join(linhas), professor['email']), [a['id'] for a in itens]))
+    return lembretes
+
+
+def enviar_lembretes(hoje=None, tamanho_lote=TAMANHO_LOTE_EMAILS):
+    # Envia os lembretes dos agendamentos aprovados de amanhã e retorna quantos e-mails saíram
+    amanha = ((hoje or date.today()) + timedelta(days=1)).isoformat()
+    agendamentos = (
+        supabase.table('agendamentos')
+        .select('id', 'usuario_id', 'laboratorio_id', 'data_agendamento', 'aulas', 'descricao')
+        .eq('data_agendamento', amanha)
+        .eq('status', 'aprovado')
+        .is_('lembrete_enviado_em', 'null')
+        .execute()
+    ).data
+    if not agendamentos:
+        return 0
+
+    ids_labs = list({a['laboratorio_id'] for a in agendamentos})
+    laboratorios = {
+        lab['id']: lab['nome']
+        for lab in supabase.table('laboratorios').select('id', 'nome').in_('id', ids_labs).execute().data
+    }
+    ids_usuarios = list({a['usuario_id'] for a in agendamentos})
+    usuarios = {
+        usuario['id']: usuario
+        for usuario in supabase.table('users').select('id', 'name', 'email').in_('id', ids_usuarios).execute().data
+    }
+
+    lembretes = montar_lembretes(agendamentos, laboratorios, usuarios)
+    total = 0
+    for inicio in range(0, len(lembretes), tamanho_lote):
+        lote = lembretes[inicio:inicio + tamanho_lote]
+        enviados = send_emails([mensagem for mensagem, _ in lote])
+        # Só os agendamentos dos e-mails enviados são marcados; os demais entram no próximo ciclo
+        ids_enviados = [id_agendamento for indice in enviados for id_agendamento in lote[indice][1]]
+        if ids_enviados:
+            supabase.table('agendamentos').update({'lembrete_enviado_em': datetime.now(timezone.utc).isoformat()}).in_('id', ids_enviados).execute()
+        total += len(enviados)
+    return total
+
+
+def enviar_resumos():
+    return enviar_resumos_administradores() + enviar_emails_agrupados()
+
+
+def limpar_tarefas():
+    # Remove o registro das execuções concluídas há mais de HISTORICO_TAREFAS_DIAS dias
+    limite = (datetime.now(timezone.utc) - timedelta(days=HISTORICO_TAREFAS_DIAS)).isoformat()
+    response = supabase.table(TABELA_TAREFAS).delete().eq('status', 'concluida').lt('concluida_em', limite).execute()
+    return len(response.data)
+
+
+# nome: (função, intervalo em minutos, hora a partir da qual a tarefa roda no dia)
+TAREFAS = {
+    'expirar_pendentes': (expirar_pendentes, 60, 0),
+    'lembretes': (enviar_lembretes, 24 * 60, HORA_LEMBRETES),
+    'resumos': (enviar_resumos, 15, 0),
+    'arquivamento': (arquivar_agendamentos, 24 * 60, 2),
+    'limpar_tarefas': (limpar_tarefas, 24 * 60, 3),
+}
+
+
+def referencia(agora, intervalo_minutos):
+    # Início da janela do intervalo que contém `agora`, contada a partir da meia-noite
+    minutos = agora.hour * 60 + agora.minute
+    inicio = datetime.combine(agora.date(), datetime.min.time()) + timedelta(minutes=minutos - minutos % intervalo_minutos)
+    return inicio.strftime('%Y-%m-%dT%H:%M')
+
+
+def reservar(tarefa, ref):
+    # Retorna True se este processo ficou com a execução
+    agora = datetime.now(timezone.utc)
+    try:
+        supabase.table(TABELA_TAREFAS).insert({'tarefa': tarefa, 'referencia': ref, 'status': 'executando', 'iniciada_em': agora.isoformat()}).execute()
+        return True
+    except APIError as e:
+        if e.code != '23505':
+            raise
+    # Já reservada: só é retomada se a reserva expirou sem ser concluída
+    response = (
+        supabase.table(TABELA_TAREFAS)
+        .update({'iniciada_em': agora.isoformat()})
+        .eq('tarefa', tarefa)
+        .eq('referencia', ref)
+        .eq('status', 'executando')
+        .lt('iniciada_em', (agora - timedelta(minutes=RESERVA_MINUTOS)).isoformat())
+        .execute()
+    )
+    return bool(response.data)
+
+
+def concluir(tarefa, ref, resultado):
+    supabase.table(TABELA_TAREFAS).update({
+        'status': 'concluida',
+        'concluida_em': datetime.now(timezone.utc).isoformat(),
+        'resultado': str(resultado),
+    }).eq('tarefa', tarefa).eq('referencia', ref).execute()
+
+
+def liberar(tarefa, ref):
+    supabase.table(TABELA_TAREFAS).delete().eq('tarefa', tarefa).eq('referencia', ref).eq('status', 'executando').execute()
+
+
+def executar_ciclo(agora=None):
+    """
+    Executa as tarefas cuja janela atual ainda não foi executada e retorna {tarefa: resultado}.
+    """
+    agora = agora or datetime.now()
+    resultados = {}
+    for tarefa, (funcao, intervalo, hora_inicial) in TAREFAS.items():
+        if agora.hour < hora_inicial:
+            continue
+        ref = referencia(agora, intervalo)
+        try:
+            if not reservar(tarefa, ref):
+                continue
+        except Exception as e:
+            logging.error(f"Erro ao reservar a tarefa {tarefa}: {e}")
+            continue
+        try:
+            resultados[tarefa] = funcao()
+            concluir(tarefa, ref, resultados[tarefa])
+            logging.info(f"Tarefa {tarefa} ({ref}) concluída: {resultados[tarefa]}")
+        except Exception as e:
+            logging.exception(f"Erro na tarefa {tarefa} ({ref}): {e}")
+            if tarefa not in resultados:
+                # A tarefa não terminou: sem a reserva, ela é repetida no próximo ciclo. Se só o
+                # registro da conclusão falhou, a reserva expira e a tarefa, idempotente, roda de novo
+                try:
+                    liberar(tarefa, ref)
+                except Exception as erro:
+                    logging.error(f"Erro ao liberar a tarefa {tarefa}: {erro}")
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Executa as tarefas agendadas do AgendaMCPF.')
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--uma-vez', action='store_true', help='Executa um único ciclo e termina')
+    grupo.add_argument('--tarefa', choices=list(TAREFAS), help='Executa só esta tarefa, sem reserva')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.tarefa:
+        print(f"{args.tarefa}: {TAREFAS[args.tarefa][0]()}")
+    elif args.uma_vez:
+        print(executar_ciclo())
+    else:
+        while True:
+            executar_ciclo()
+            time.sleep(INTERVALO_CICLO_S)
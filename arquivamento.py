@@ -0,0 +1,84 @@
+# arquivamento.py
+"""
+Arquivamento de agendamentos antigos.
+
+Os agendamentos com data anterior ao horizonte configurado são movidos, em lotes, da tabela
+`agendamentos` para `agendamentos_arquivo`, que tem as mesmas colunas. Assim as consultas do dia a dia
+(disponibilidade, pendentes, agenda) e seus índices ficam pequenos independentemente de quantos anos
+letivos já passaram. O histórico e os relatórios leem das duas tabelas por meio de `buscar_historico`.
+
+A tabela de arquivo é criada por migracoes/0005_arquivo_agendamentos.sql.
+
+Uso (por exemplo em um cron noturno):
+    python arquivamento.py --horizonte-dias 365 --lote 500
+"""
+import argparse
+import logging
+import os
+from datetime import date, timedelta
+from database import supabase
+
+TABELA_ARQUIVO = 'agendamentos_arquivo'
+HORIZONTE_PADRAO_DIAS = int(os.getenv('ARQUIVAMENTO_HORIZONTE_DIAS', 365))
+TAMANHO_LOTE_PADRAO = int(os.getenv('ARQUIVAMENTO_TAMANHO_LOTE', 500))
+
+
+def data_corte(horizonte_dias=HORIZONTE_PADRAO_DIAS, hoje=None):
+    return ((hoje or date.today()) - timedelta(days=horizonte_dias)).isoformat()
+
+
+def arquivar_agendamentos(horizonte_dias=HORIZONTE_PADRAO_DIAS, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Move os agendamentos anteriores ao horizonte para a tabela de arquivo e retorna quantos foram movidos.
+
+    Cada lote é gravado no arquivo com upsert antes de ser removido da tabela principal, então uma
+    execução interrompida pode ser repetida sem duplicar nem perder registros.
+    """
+    corte = data_corte(horizonte_dias)
+    total = 0
+    while True:
+        response = (
+            supabase.table('agendamentos')
+            .select('*')
+            .lt('data_agendamento', corte)
+            .order('id')
+            .limit(tamanho_lote)
+            .execute()
+        )
+        lote = response.data
+        if not lote:
+            break
+        supabase.table(TABELA_ARQUIVO).upsert(lote, on_conflict='id').execute()
+        supabase.table('agendamentos').delete().in_('id', [agendamento['id'] for agendamento in lote]).execute()
+        total += len(lote)
+        logging.info(f"Arquivados {len(lote)} agendamentos anteriores a {corte} (total {total})")
+        if len(lote) < tamanho_lote:
+            break
+    return total
+
+
+def buscar_historico(laboratorio_id, antes_de, escola_id, colunas=('*',)):
+    # Lê os agendamentos passados de um espaço nas tabelas principal e de arquivo
+    registros = []
+    for tabela in ('agendamentos', TABELA_ARQUIVO):
+        response = (
+            supabase.table(tabela)
+            .select(*colunas)
+            .eq('escola_id', escola_id)
+            .eq('laboratorio_id', laboratorio_id)
+            .lt('data_agendamento', antes_de)
+            .execute()
+        )
+        registros.extend(response.data or [])
+    registros.sort(key=lambda agendamento: agendamento['data_agendamento'])
+    return registros
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Arquiva agendamentos anteriores ao horizonte configurado.')
+    parser.add_argument('--horizonte-dias', type=int, default=HORIZONTE_PADRAO_DIAS, help='Idade mínima, em dias, dos agendamentos arquivados')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO, help='Quantidade de agendamentos movidos por lote')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    movidos = arquivar_agendamentos(args.horizonte_dias, args.lote)
+    print(f"{movidos} agendamentos arquivados.")
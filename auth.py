@@ -1,12 +1,23 @@
 # auth.py
 import streamlit as st
-import bcrypt
 from database import supabase
+from validacao import email_em_uso, normalizar_email, violacao_unicidade
+from escolas import cabecalho_escola, escola_id
+from estado_sessao import estado_sessao
+
+# Depois que um superadministrador existe ele não é mais removido pelo sistema, então basta
+# confirmar uma vez por processo (e por escola) em vez de consultar a cada carregamento da tela de login
+_escolas_com_superadmin = set()
 
 def verificar_superadmin():
+    escola = escola_id()
+    if escola in _escolas_com_superadmin:
+        return True
     try:
-        response = supabase.table('users').select('*').eq('tipo_usuario', 'superadmin').execute()
+        # Sem a última resposta boa (resiliencia.py): uma resposta antiga poderia liberar a criação de outro superadministrador
+        response = supabase.table('users', guardar=False).select('id').eq('escola_id', escola).eq('tipo_usuario', 'superadmin').limit(1).execute()
         if response.data:
+            _escolas_com_superadmin.add(escola)
             return True
         else:
             return False
@@ -26,23 +37,30 @@ def criar_superadmin():
                 st.warning('As senhas não coincidem.')
             elif email.strip() == '' or senha.strip() == '':
                 st.warning('Email e senha são obrigatórios.')
+            elif email_em_uso(email, escola_id()):
+                st.warning('Já existe um usuário com este email.')
             else:
+                import bcrypt  # Carregado só quando necessário (ver main.py)
                 hashed_password = bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
                 novo_usuario = {
                     'email': email.strip(),
                     'password': hashed_password,
-                    'tipo_usuario': 'superadmin'
+                    'tipo_usuario': 'superadmin',
+                    'escola_id': escola_id()
                 }
                 try:
                     response = supabase.table('users').insert(novo_usuario).execute()
                     st.success('Superadministrador criado com sucesso! Por favor, faça login.')
                     st.rerun()
                 except Exception as e:
-                    st.error(f'Erro ao criar o superadministrador: {e}')
+                    if violacao_unicidade(e):
+                        st.warning('Já existe um usuário com este email.')
+                    else:
+                        st.error(f'Erro ao criar o superadministrador: {e}')
 
 def tela_login():
     st.title("🦉AgendaMCPF")  # Título do sistema
-    st.write("**EEEP Professora Maria Célia Pinheiro Falcão**")  # Nome da escola
+    cabecalho_escola()
     st.markdown("---")  # Linha separadora para organizar o layout
     st.write("Por favor, faça o login para acessar o sistema.")
     with st.form(key='login_form'):
@@ -52,14 +70,15 @@ def tela_login():
         if submitted:
             # Realizar autenticação
             try:
-                response = supabase.table('users').select('*').eq('email', email.strip()).execute()
+                # O índice único em (escola_id, email_normalizado) garante no máximo um usuário por email na escola
+                # Sem a última resposta boa: com o banco fora do ar, uma senha trocada ou um usuário
+                # excluído não podem entrar com dados antigos, e o hash da senha não fica guardado
+                response = supabase.table('users', guardar=False).select('*').eq('escola_id', escola_id()).eq('email_normalizado', normalizar_email(email)).limit(1).execute()
                 if response.data:
                     usuario = response.data[0]
+                    import bcrypt
                     if bcrypt.checkpw(senha.encode('utf-8'), usuario['password'].encode('utf-8')):
-                        st.session_state["autenticado"] = True
-                        st.session_state["tipo_usuario"] = usuario['tipo_usuario']
-                        st.session_state["email"] = usuario['email']
-                        st.session_state["usuario_id"] = usuario['id']
+                        estado_sessao().entrar(usuario)
 
                         st.success("Login realizado com sucesso!")
                         st.rerun()
@@ -71,8 +90,5 @@ def tela_login():
                 st.error(f"Erro ao realizar o login: {e}")
 
 def logout():
-    st.session_state["autenticado"] = False
-    st.session_state["tipo_usuario"] = None
-    st.session_state["email"] = None
-    st.session_state["usuario_id"] = None
+    estado_sessao().sair()
     st.rerun()
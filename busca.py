@@ -0,0 +1,149 @@
+# busca.py
+"""
+Busca nas descrições dos agendamentos e dos horários fixos.
+
+A busca roda no Postgres, na função buscar_agendamentos (migracoes/0009_busca_textual.sql). Ela
+combina a busca textual em português (tsvector, com radicais) e a semelhança por trigramas (termos
+parciais ou com erro de digitação) com os filtros de espaço, professor e período. Os resultados vêm
+ordenados por relevância, uma página por vez. Assim o custo de cada busca depende do tamanho da
+página, e não do tamanho do histórico, que inclui os agendamentos arquivados.
+"""
+import os
+from datetime import date
+from functools import partial
+import streamlit as st
+from database import supabase
+from carregamento import mapa_usuarios
+from cache_compartilhado import obter, chave_de
+from dados_sessao import carregar_sessao
+
+TAMANHO_PAGINA = int(os.getenv('BUSCA_TAMANHO_PAGINA', 20))
+DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+
+def buscar_agendamentos(escola_id, termo='', laboratorio_id=None, usuario_id=None, data_inicio=None, data_fim=None,
+                        pagina=0, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Retorna (resultados da página, se existe uma próxima página).
+
+    A página é pedida com uma linha a mais, que só indica se há uma próxima, em vez de contar todos
+    os resultados.
+    """
+    parametros = {
+        'p_escola_id': escola_id,
+        'p_termo': termo.strip() or None,
+        'p_laboratorio_id': laboratorio_id,
+        'p_usuario_id': usuario_id,
+        'p_data_inicio': data_inicio.isoformat() if data_inicio else None,
+        'p_data_fim': data_fim.isoformat() if data_fim else None,
+        'p_limite': tamanho_pagina + 1,
+        'p_deslocamento': pagina * tamanho_pagina,
+    }
+    # Guardada no cache compartilhado até uma gravação nos agendamentos do espaço ou do professor
+    etiquetas = []
+    if laboratorio_id is not None:
+        etiquetas += [f'agenda:{laboratorio_id}', f'pendentes:{laboratorio_id}', f'usuarios:{escola_id}']
+    if usuario_id is not None:
+        etiquetas += [f'agendamentos_usuario:{usuario_id}', f'laboratorios:{escola_id}']
+    executar = lambda: supabase.rpc('buscar_agendamentos', parametros).execute().data or []
+    linhas = obter(f'busca:{escola_id}:{chave_de(parametros)}', etiquetas, executar) if etiquetas else executar()
+    return linhas[:tamanho_pagina], len(linhas) > tamanho_pagina
+
+
+def buscar_professores(escola_id):
+    return supabase.table('users').select('id', 'name', 'email').eq('escola_id', escola_id).eq('tipo_usuario', 'professor').execute().data
+
+
+def exibir_busca(chave, escola_id, laboratorios, usuario_id=None):
+    """
+    Campos de busca, tabela de resultados e navegação entre as páginas.
+
+    Parâmetros:
+    chave (str): Prefixo das chaves dos widgets; distingue as buscas exibidas na mesma tela.
+    laboratorios (list): Espaços que podem ser buscados ({'id', 'nome'}); com um só, o filtro é fixo.
+    usuario_id (int): Restringe a busca aos agendamentos deste professor. Sem ele, o administrador
+        pode filtrar por professor.
+    """
+    nomes_laboratorios = {lab['id']: lab['nome'] for lab in laboratorios}
+    termo = st.text_input("Buscar na descrição", key=f'{chave}_termo', placeholder="Ex.: prática de química")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if len(laboratorios) == 1:
+            laboratorio_id = laboratorios[0]['id']
+        else:
+            opcoes = [None] + list(nomes_laboratorios)
+            laboratorio_id = st.selectbox("Espaço", options=opcoes, key=f'{chave}_espaco',
+                                          format_func=lambda lab_id: 'Todos' if lab_id is None else nomes_laboratorios[lab_id])
+    with col2:
+        data_inicio = st.date_input("De", value=None, key=f'{chave}_inicio', format="DD/MM/YYYY")
+    with col3:
+        data_fim = st.date_input("Até", value=None, key=f'{chave}_fim', format="DD/MM/YYYY")
+
+    professores = {}
+    filtrar_professor = usuario_id is None
+    if filtrar_professor:
+        # Lista guardada na sessão até uma gravação nos usuários da escola (ver dados_sessao.py)
+        dados = carregar_sessao({'professores': ([f'usuarios:{escola_id}'], partial(buscar_professores, escola_id))})
+        if dados.ok('professores'):
+            professores = {professor['id']: professor['name'] or professor['email'] for professor in dados['professores']}
+        usuario_id = st.selectbox("Professor(a)", options=[None] + list(professores), key=f'{chave}_professor',
+                                  format_func=lambda professor_id: 'Todos' if professor_id is None else professores[professor_id])
+
+    if data_inicio and data_fim and data_inicio > data_fim:
+        st.warning("A data de início não pode ser posterior à data de fim.")
+        return
+    # As abas são desenhadas a cada execução; a busca só roda depois que o usuário pede algo
+    filtro_escolhido = (len(laboratorios) > 1 and laboratorio_id is not None) or (filtrar_professor and usuario_id is not None)
+    if not (termo.strip() or data_inicio or data_fim or filtro_escolhido):
+        st.caption("Digite um termo ou escolha um filtro para buscar.")
+        return
+
+    # A página volta para a primeira sempre que um filtro muda
+    filtros = (termo.strip(), laboratorio_id, usuario_id, data_inicio, data_fim)
+    if st.session_state.get(f'{chave}_filtros') != filtros:
+        st.session_state[f'{chave}_filtros'] = filtros
+        st.session_state[f'{chave}_pagina'] = 0
+    pagina = st.session_state[f'{chave}_pagina']
+
+    try:
+        resultados, tem_proxima = buscar_agendamentos(escola_id, termo, laboratorio_id, usuario_id, data_inicio, data_fim, pagina)
+    except Exception as e:
+        st.error(f'Erro ao buscar os agendamentos: {e}')
+        return
+
+    if not resultados:
+        st.info("Nenhum resultado encontrado.")
+    else:
+        if not professores:
+            professores = {
+                uid: usuario.get('name') or usuario.get('email')
+                for uid, usuario in mapa_usuarios({r['usuario_id'] for r in resultados if r['usuario_id']}, escola_id, colunas=('id', 'name', 'email')).items()
+            }
+        tabela = []
+        for resultado in resultados:
+            fixo = resultado['origem'] == 'horario_fixo'
+            inicio, fim = date.fromisoformat(resultado['data_inicio']), date.fromisoformat(resultado['data_fim'])
+            tabela.append({
+                "Tipo": 'Horário fixo' if fixo else 'Agendamento',
+                "Data": f"{DIAS_SEMANA[resultado['dia_semana']]}s, de {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}" if fixo else f"{inicio:%d/%m/%Y}",
+                "Espaço": nomes_laboratorios.get(resultado['laboratorio_id'], 'Desconhecido'),
+                "Professor(a)": '' if fixo else professores.get(resultado['usuario_id'], 'Desconhecido'),
+                "Aulas": [f"{aula}ª Aula" for aula in sorted(resultado['aulas'])],
+                "Descrição": resultado.get('descricao') or '',
+                "Status": (resultado.get('status') or '').capitalize(),
+            })
+        st.dataframe(tabela, column_config={"Aulas": st.column_config.ListColumn("Aulas")}, hide_index=True)
+
+    col_anterior, col_pagina, col_proxima = st.columns([1, 2, 1])
+    with col_anterior:
+        st.button("◀ Anterior", key=f'{chave}_anterior', disabled=pagina == 0,
+                  on_click=_mudar_pagina, args=(chave, -1))
+    with col_pagina:
+        st.caption(f"Página {pagina + 1}")
+    with col_proxima:
+        st.button("Próxima ▶", key=f'{chave}_proxima', disabled=not tem_proxima,
+                  on_click=_mudar_pagina, args=(chave, 1))
+
+
+def _mudar_pagina(chave, passo):
+    st.session_state[f'{chave}_pagina'] = max(st.session_state[f'{chave}_pagina'] + passo, 0)
@@ -0,0 +1,259 @@
+# cache_compartilhado.py
+"""
+Cache e estado compartilhados entre as réplicas do aplicativo.
+
+Com CACHE_REDIS_URL (redis://... ou rediss://...), os valores ficam em um servidor compatível com
+o protocolo do Redis (Redis, Valkey, KeyDB etc.), e todas as réplicas atrás do balanceador
+enxergam o mesmo cache. O pacote redis é opcional e só é necessário nesse caso:
+    pip install redis
+Sem CACHE_REDIS_URL, um substituto em memória com a mesma interface atende ao processo atual. Ele
+é usado em testes e em implantações com uma única réplica. Cada invalidação muda as chaves de todos os
+valores dependentes, e as chaves antigas nunca mais são lidas. Por isso o substituto remove os valores
+expirados a cada CACHE_VARREDURA_S segundos e guarda no máximo CACHE_MAXIMO_ENTRADAS valores,
+descartando os menos usados. As versões das etiquetas e o estado compartilhado não expiram nem são
+descartados: perder uma versão faria as chaves antigas voltarem a valer.
+
+Invalidação por etiquetas: cada valor guardado por `obter` declara etiquetas como
+'agenda:<laboratorio_id>', e a versão atual de cada etiqueta faz parte da chave. As gravações chamam
+`invalidar`. Isso incrementa a versão no servidor, de modo que as chaves antigas deixam de ser lidas e
+expiram sozinhas. A mesma chamada publica as etiquetas no canal de invalidação. Cada réplica guarda as
+versões por até CACHE_TTL_VERSOES_S segundos e as descarta ao receber a mensagem, então uma
+gravação em uma réplica vale para as outras na hora.
+
+Os valores são calculados a partir do Supabase, e não do espelho local (espelho_local.py). Uma réplica
+com o espelho atrasado poderia guardar no cache compartilhado um valor já invalidado.
+
+Se o servidor de cache falhar, `obter` calcula o valor direto e o aplicativo continua funcionando.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_URL = os.getenv('CACHE_REDIS_URL')
+TTL_PADRAO_S = int(os.getenv('CACHE_TTL_S', 300))
+TTL_VERSOES_S = float(os.getenv('CACHE_TTL_VERSOES_S', 5))
+TIMEOUT_S = float(os.getenv('CACHE_TIMEOUT_S', 0.5))
+PREFIXO = os.getenv('CACHE_PREFIXO', 'agendamcpf:')
+CANAL_INVALIDACAO = PREFIXO + 'invalidacoes'
+MAXIMO_ENTRADAS = int(os.getenv('CACHE_MAXIMO_ENTRADAS', 10000))
+INTERVALO_VARREDURA_S = float(os.getenv('CACHE_VARREDURA_S', 60))
+
+
+class BackendMemoria:
+    """
+    Substituto em memória do servidor de cache, com expiração e publicação entre assinantes do processo.
+    """
+
+    def __init__(self, maximo_entradas=MAXIMO_ENTRADAS):
+        # Valores com TTL, do menos para o mais recentemente usado; versões e estado ficam à parte
+        self._valores = OrderedDict()
+        self._permanentes = {}
+        self._maximo_entradas = maximo_entradas
+        self._proxima_varredura = time.monotonic() + INTERVALO_VARREDURA_S
+        self._assinantes = []
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            if chave in self._permanentes:
+                return self._permanentes[chave]
+            valor, expira_em = self._valores.get(chave, (None, None))
+            if expira_em is None:
+                return None
+            if expira_em < time.monotonic():
+                del self._valores[chave]
+                return None
+            self._valores.move_to_end(chave)
+            return valor
+
+    def obter_varios(self, chaves):
+        return [self.obter(chave) for chave in chaves]
+
+    def gravar(self, chave, valor, ttl=None):
+        with self._lock:
+            if not ttl:
+                self._permanentes[chave] = valor
+                return
+            agora = time.monotonic()
+            self._valores[chave] = (valor, agora + ttl)
+            self._valores.move_to_end(chave)
+            if agora >= self._proxima_varredura:
+                self._varrer(agora)
+            while len(self._valores) > self._maximo_entradas:
+                self._valores.popitem(last=False)
+
+    def _varrer(self, agora):
+        # Chamado com o lock: remove os valores expirados, que em geral nunca mais seriam lidos
+        for chave in [chave for chave, (_, expira_em) in self._valores.items() if expira_em < agora]:
+            del self._valores[chave]
+        self._proxima_varredura = agora + INTERVALO_VARREDURA_S
+
+    def incrementar(self, chaves):
+        novas = []
+        with self._lock:
+            for chave in chaves:
+                novas.append(int(self._permanentes.get(chave, 0)) + 1)
+                self._permanentes[chave] = novas[-1]
+        return novas
+
+    def publicar(self, canal, mensagem):
+        for funcao in list(self._assinantes):
+            funcao(mensagem)
+
+    def assinar(self, canal, funcao):
+        self._assinantes.append(funcao)
+
+
+class BackendRedis:
+    def __init__(self, url):
+        import redis  # Opcional: só necessário com CACHE_REDIS_URL
+        self._url = url
+        self._redis = redis.Redis.from_url(url, socket_timeout=TIMEOUT_S, socket_connect_timeout=TIMEOUT_S)
+
+    def obter(self, chave):
+        return self._redis.get(chave)
+
+    def obter_varios(self, chaves):
+        return self._redis.mget(chaves)
+
+    def gravar(self, chave, valor, ttl=None):
+        self._redis.set(chave, valor, ex=ttl)
+
+    def incrementar(self, chaves):
+        pipeline = self._redis.pipeline()
+        for chave in chaves:
+            pipeline.incr(chave)
+        return pipeline.execute()
+
+    def publicar(self, canal, mensagem):
+        self._redis.publish(canal, mensagem)
+
+    def assinar(self, canal, funcao):
+        threading.Thread(target=self._escutar, args=(canal, funcao), name='cache-invalidacoes', daemon=True).start()
+
+    def _escutar(self, canal, funcao):
+        import redis
+        # A assinatura usa uma conexão própria, sem timeout de leitura, refeita se cair
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(self._url, socket_connect_timeout=TIMEOUT_S).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(canal)
+                for mensagem in pubsub.listen():
+                    funcao(mensagem['data'].decode())
+            except Exception as e:
+                logging.warning(f"Assinatura de invalidações do cache interrompida: {e}")
+                # Mensagens perdidas durante a queda não importam: as versões locais expiram sozinhas
+                _versoes_locais.clear()
+                time.sleep(1)
+
+
+backend = BackendRedis(CACHE_URL) if CACHE_URL else BackendMemoria()
+
+# Versões das etiquetas conhecidas por este processo: {etiqueta: (versão, validade)}
+_versoes_locais = {}
+_lock = threading.Lock()
+estatisticas = {'acertos': 0, 'faltas': 0, 'invalidacoes': 0, 'erros': 0}
+
+
+def _contar(chave):
+    with _lock:
+        estatisticas[chave] += 1
+
+
+def _receber_invalidacao(mensagem):
+    with _lock:
+        for etiqueta in mensagem.split('\n'):
+            _versoes_locais.pop(etiqueta, None)
+
+
+backend.assinar(CANAL_INVALIDACAO, _receber_invalidacao)
+
+
+def versoes(etiquetas):
+    # Versão atual de cada etiqueta, na mesma ordem
+    agora = time.monotonic()
+    with _lock:
+        atuais = {etiqueta: _versoes_locais.get(etiqueta) for etiqueta in etiquetas}
+    faltando = [etiqueta for etiqueta, versao in atuais.items() if versao is None or versao[1] < agora]
+    if faltando:
+        lidas = backend.obter_varios([PREFIXO + 'versao:' + etiqueta for etiqueta in faltando])
+        with _lock:
+            for etiqueta, versao in zip(faltando, lidas):
+                atuais[etiqueta] = _versoes_locais[etiqueta] = (int(versao or 0), agora + TTL_VERSOES_S)
+    return [atuais[etiqueta][0] for etiqueta in etiquetas]
+
+
+def chave_de(*partes):
+    # Resume partes longas (por exemplo listas de ids) em uma chave curta e estável
+    return hashlib.sha1(repr(partes).encode()).hexdigest()[:16]
+
+
+def obter(chave, etiquetas, calcular, ttl=TTL_PADRAO_S):
+    """
+    Retorna o valor guardado em `chave` ou o calcula com `calcular()` e o guarda por `ttl` segundos.
+
+    Parâmetros:
+    chave (str): Identifica o valor; deve incluir a escola e os parâmetros da consulta.
+    etiquetas (list): Etiquetas cuja invalidação descarta o valor.
+    calcular (callable): Função sem argumentos que produz o valor (picklable).
+    """
+    try:
+        chave_completa = PREFIXO + chave + '|' + ','.join(map(str, versoes(etiquetas)))
+        guardado = backend.obter(chave_completa)
+    except Exception as e:
+        _contar('erros')
+        logging.warning(f"Cache indisponível: {e}")
+        return calcular()
+    if guardado is not None:
+        _contar('acertos')
+        return pickle.loads(guardado)
+    _contar('faltas')
+    valor = calcular()
+    try:
+        backend.gravar(chave_completa, pickle.dumps(valor), ttl)
+    except Exception as e:
+        _contar('erros')
+        logging.warning(f"Erro ao gravar no cache: {e}")
+    return valor
+
+
+def invalidar(*etiquetas):
+    """
+    Descarta, em todas as réplicas, os valores guardados com qualquer uma das etiquetas.
+
+    Retorna {etiqueta: nova versão}, ou {} se o servidor de cache não respondeu.
+    """
+    etiquetas = sorted(set(etiquetas))
+    if not etiquetas:
+        return {}
+    _contar('invalidacoes')
+    with _lock:
+        for etiqueta in etiquetas:
+            _versoes_locais.pop(etiqueta, None)
+    try:
+        novas = backend.incrementar([PREFIXO + 'versao:' + etiqueta for etiqueta in etiquetas])
+        backend.publicar(CANAL_INVALIDACAO, '\n'.join(etiquetas))
+    except Exception as e:
+        # Sem o servidor os valores antigos também não são lidos; expiram pelo TTL
+        _contar('erros')
+        logging.error(f"Erro ao invalidar o cache ({', '.join(etiquetas)}): {e}")
+        return {}
+    return dict(zip(etiquetas, map(int, novas)))
+
+
+def ler_estado(chave, padrao=None):
+    # Estado compartilhado entre réplicas, sem expiração (por exemplo os usuários perfilados)
+    try:
+        valor = backend.obter(PREFIXO + 'estado:' + chave)
+    except Exception as e:
+        logging.warning(f"Cache indisponível: {e}")
+        return padrao
+    return padrao if valor is None else pickle.loads(valor)
+
+
+def gravar_estado(chave, valor):
+    backend.gravar(PREFIXO + 'estado:' + chave, pickle.dumps(valor))
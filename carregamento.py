@@ -0,0 +1,110 @@
+# carregamento.py
+"""
+Camada de carregamento de dados dos painéis.
+
+Cada painel declara suas consultas independentes como funções sem argumentos (sem chamadas ao
+Streamlit) e `carregar` executa todas ao mesmo tempo em um pool de threads compartilhado pelo processo,
+com limite de concorrência e tempo máximo por consulta. A latência do painel passa a ser próxima à da
+consulta mais lenta em vez da soma de todas.
+
+O pool tem CONSULTAS_SIMULTANEAS threads e uma fila sem limite de tamanho, mas com limite de espera:
+uma consulta que não consegue uma thread em CONSULTAS_ESPERA_FILA_S segundos sai da fila e falha com
+TimeoutError. O tempo máximo da consulta (CONSULTAS_TIMEOUT_S) conta a partir do momento em que ela
+começa a executar, e não do envio, então a espera na fila não é descontada de cada consulta.
+
+Uma consulta que já começou não pode ser interrompida: quando o prazo acaba o painel segue com o erro,
+mas a thread só é liberada quando a consulta termina. Isso tem limite, pois cada chamada ao Supabase
+tem o tempo máximo e as tentativas de resiliencia.py.
+
+Os erros não interrompem o carregamento: ficam guardados e são lançados quando o resultado da consulta
+é acessado, para que cada seção do painel trate o próprio erro como antes.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TempoEsgotado
+from database import supabase
+from cache_compartilhado import obter, chave_de
+
+# Limite global de consultas simultâneas do processo, somando todas as sessões
+CONSULTAS_SIMULTANEAS = int(os.getenv('CONSULTAS_SIMULTANEAS', 16))
+TIMEOUT_CONSULTA_S = float(os.getenv('CONSULTAS_TIMEOUT_S', 15))
+ESPERA_FILA_S = float(os.getenv('CONSULTAS_ESPERA_FILA_S', 10))
+
+_executor = ThreadPoolExecutor(max_workers=CONSULTAS_SIMULTANEAS, thread_name_prefix='consultas')
+
+
+class _Tarefa:
+    # Consulta enviada ao pool; guarda o instante em que uma thread começou a executá-la
+    def __init__(self, chave, funcao):
+        self.chave = chave
+        self.funcao = funcao
+        self.enviada = time.monotonic()
+        self.iniciada = threading.Event()
+        self.inicio = None
+
+    def __call__(self):
+        self.inicio = time.monotonic()
+        self.iniciada.set()
+        if self.inicio - self.enviada > ESPERA_FILA_S:
+            # Quem pediu pode ter desistido enquanto esperava outra consulta; não ocupa a thread à toa
+            raise _erro_fila(self.chave)
+        return self.funcao()
+
+
+def _erro_fila(chave):
+    return TimeoutError(f"A consulta '{chave}' esperou mais de {ESPERA_FILA_S:g} s por uma vaga.")
+
+
+class ResultadosCarregamento(dict):
+    def __getitem__(self, chave):
+        valor = super().__getitem__(chave)
+        if isinstance(valor, Exception):
+            raise valor
+        return valor
+
+    def ok(self, chave):
+        return not isinstance(self.get(chave), Exception)
+
+
+def carregar(consultas, timeout=TIMEOUT_CONSULTA_S):
+    """
+    Executa as consultas ao mesmo tempo e retorna um dicionário com o resultado de cada chave.
+
+    Parâmetros:
+    consultas (dict): Chave -> função sem argumentos que executa a consulta.
+    timeout (float): Tempo máximo, em segundos, de cada consulta a partir do seu início, sem contar a
+    espera na fila.
+    """
+    inicio = time.monotonic()
+    tarefas = {chave: _Tarefa(chave, funcao) for chave, funcao in consultas.items()}
+    futuros = {chave: _executor.submit(tarefa) for chave, tarefa in tarefas.items()}
+    resultados = ResultadosCarregamento()
+    for chave, futuro in futuros.items():
+        tarefa = tarefas[chave]
+        espera = max(0.0, ESPERA_FILA_S - (time.monotonic() - inicio))
+        # cancel() só tem efeito enquanto a consulta está na fila; se falhar, ela acabou de começar
+        if not tarefa.iniciada.wait(espera) and futuro.cancel():
+            resultados[chave] = _erro_fila(chave)
+            continue
+        tarefa.iniciada.wait()
+        restante = max(0.0, timeout - (time.monotonic() - tarefa.inicio))
+        try:
+            resultados[chave] = futuro.result(timeout=restante)
+        except TempoEsgotado as e:
+            # TempoEsgotado é o próprio TimeoutError: se a consulta terminou, o erro veio dela
+            resultados[chave] = e if futuro.done() else TimeoutError(f"A consulta '{chave}' excedeu {timeout:.0f} s.")
+        except Exception as e:
+            resultados[chave] = e
+    return resultados
+
+
+def mapa_usuarios(ids, escola_id, colunas=('id', 'name', 'email')):
+    # Busca vários usuários da escola em uma única consulta e retorna {id: usuário}
+    ids = list({id_ for id_ in ids if id_ is not None})
+    if not ids:
+        return {}
+    def buscar():
+        response = supabase.table('users').select(*colunas).eq('escola_id', escola_id).in_('id', ids).execute()
+        return {usuario['id']: usuario for usuario in response.data}
+    return obter(f'usuarios:{escola_id}:{chave_de(sorted(ids), colunas)}', [f'usuarios:{escola_id}'], buscar)
@@ -1,9 +1,19 @@
 import streamlit as st
+from database import supabase
+from estado_sessao import estado_sessao
 
 def logout_button():
     if st.button("Logout"):
-        st.session_state["autenticado"] = False
-        st.session_state["tipo_usuario"] = None
-        st.session_state["email"] = None
-        st.session_state["usuario_id"] = None
+        estado_sessao().sair()
         st.rerun()
+
+def botao_atualizar():
+    # As telas mostram os dados guardados na sessão (ver dados_sessao.py); o botão força uma nova leitura.
+    # Só aparece depois do login: o import fica aqui para não pesar na tela de login
+    from dados_sessao import recarregar
+    st.button("🔄 Atualizar dados", on_click=recarregar)
+
+def aviso_instabilidade():
+    # Com o disjuntor aberto as telas podem estar exibindo a última resposta guardada (ver resiliencia.py)
+    if supabase.disjuntor.aberto:
+        st.warning("O banco de dados está instável no momento. Algumas informações podem estar desatualizadas.")
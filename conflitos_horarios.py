@@ -0,0 +1,101 @@
+# conflitos_horarios.py
+"""
+Detecção de conflitos de horários fixos.
+
+Antes de gravar um horário fixo novo ou editado, o período é comparado com os horários fixos existentes
+do espaço e com os agendamentos aprovados, buscados em uma consulta de cada. Os intervalos de datas
+ficam em um índice por (dia da semana, aula), e cada sobreposição é expandida nas datas e aulas exatas
+em conflito.
+"""
+from bisect import bisect_right
+from datetime import date, timedelta
+from database import supabase
+
+
+class IndiceIntervalos:
+    """
+    Intervalos de datas agrupados por chave e ordenados pelo início, para consultar sobreposições com
+    busca binária em vez de percorrer todos os registros.
+    """
+
+    def __init__(self):
+        self._inicios = {}
+        self._intervalos = {}
+
+    def adicionar(self, chave, inicio, fim, origem):
+        inicios = self._inicios.setdefault(chave, [])
+        intervalos = self._intervalos.setdefault(chave, [])
+        posicao = bisect_right(inicios, inicio)
+        inicios.insert(posicao, inicio)
+        intervalos.insert(posicao, (inicio, fim, origem))
+
+    def sobrepostos(self, chave, inicio, fim):
+        # Só os intervalos que começam até `fim` podem se sobrepor; desses, ficam os que terminam depois de `inicio`
+        limite = bisect_right(self._inicios.get(chave, []), fim)
+        return [intervalo for intervalo in self._intervalos.get(chave, [])[:limite] if intervalo[1] >= inicio]
+
+
+def _datas_no_dia(inicio, fim, dia_semana):
+    primeira = inicio + timedelta(days=(dia_semana - inicio.weekday()) % 7)
+    return [primeira + timedelta(days=7 * semana) for semana in range((fim - primeira).days // 7 + 1)] if primeira <= fim else []
+
+
+def montar_indice(horarios_fixos, agendamentos_aprovados, ignorar_horario_id=None):
+    indice = IndiceIntervalos()
+    for horario in horarios_fixos:
+        if horario['id'] == ignorar_horario_id:
+            continue
+        origem = f"Horário fixo: {horario.get('descricao') or 'sem descrição'} ({horario['data_inicio']} até {horario['data_fim']})"
+        for aula in horario['aulas']:
+            indice.adicionar(
+                (horario['dia_semana'], aula),
+                date.fromisoformat(horario['data_inicio']),
+                date.fromisoformat(horario['data_fim']),
+                origem,
+            )
+    for agendamento in agendamentos_aprovados:
+        data_agendamento = date.fromisoformat(agendamento['data_agendamento'])
+        origem = f"Agendamento aprovado: {agendamento.get('descricao') or 'sem descrição'}"
+        for aula in agendamento['aulas']:
+            indice.adicionar((data_agendamento.weekday(), aula), data_agendamento, data_agendamento, origem)
+    return indice
+
+
+def listar_conflitos(indice, dia_semana, aulas, data_inicio, data_fim):
+    """
+    Retorna cada data e aula do novo horário fixo que já está ocupada, com a origem do conflito.
+    """
+    conflitos = []
+    for aula in sorted(aulas):
+        for inicio, fim, origem in indice.sobrepostos((dia_semana, aula), data_inicio, data_fim):
+            for data_conflito in _datas_no_dia(max(inicio, data_inicio), min(fim, data_fim), dia_semana):
+                conflitos.append({'Data': data_conflito.isoformat(), 'Aula': f"{aula}ª Aula", 'Conflito com': origem})
+    conflitos.sort(key=lambda conflito: (conflito['Data'], conflito['Aula']))
+    return conflitos
+
+
+def verificar_conflitos_horario_fixo(laboratorio_id, dia_semana, aulas, data_inicio, data_fim, escola_id, ignorar_horario_id=None):
+    # Consulta o Supabase diretamente, sem o espelho local nem a última resposta boa (resiliencia.py): a
+    # verificação antecede uma gravação e não pode usar dados atrasados
+    horarios_fixos = (
+        supabase.table('horarios_fixos', guardar=False)
+        .select('id', 'dia_semana', 'aulas', 'data_inicio', 'data_fim', 'descricao')
+        .eq('escola_id', escola_id)
+        .eq('laboratorio_id', laboratorio_id)
+        .eq('dia_semana', dia_semana)
+        .lte('data_inicio', data_fim.isoformat())
+        .gte('data_fim', data_inicio.isoformat())
+        .execute()
+    ).data
+    agendamentos_aprovados = (
+        supabase.table('agendamentos', guardar=False)
+        .select('id', 'data_agendamento', 'aulas', 'descricao')
+        .eq('escola_id', escola_id)
+        .eq('laboratorio_id', laboratorio_id)
+        .eq('status', 'aprovado')
+        .gte('data_agendamento', data_inicio.isoformat())
+        .lte('data_agendamento', data_fim.isoformat())
+        .execute()
+    ).data
+    indice = montar_indice(horarios_fixos, agendamentos_aprovados, ignorar_horario_id)
+    return listar_conflitos(indice, dia_semana, aulas, data_inicio, data_fim)
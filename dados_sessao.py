@@ -0,0 +1,124 @@
+# dados_sessao.py
+"""
+Dados dos painéis guardados na sessão e corrigidos no lugar depois de cada gravação.
+
+Antes, toda gravação terminava com st.rerun(). Isso reexecutava o painel inteiro e todas as suas
+consultas só para mostrar uma linha alterada. Agora:
+
+- `carregar_sessao` guarda na sessão o resultado de cada consulta dos painéis junto com a versão das
+  etiquetas do cache compartilhado (ver cache_compartilhado.py) no momento da leitura. A consulta só
+  é refeita quando alguma etiqueta muda, ou seja, quando outra sessão ou réplica gravou algo
+  relacionado.
+- As gravações rodam em callbacks (on_click), antes da execução do script. Elas chamam `aplicar` com
+  as linhas devolvidas pelo Supabase. `aplicar` publica a invalidação para as outras sessões e corrige
+  as listas desta sessão, então a execução que segue ao clique já mostra o resultado, sem st.rerun()
+  e sem recarregar o que não mudou.
+- Se a versão de uma etiqueta avançou além da gravação desta sessão (outra gravação concorrente), a
+  lista não é corrigida: é descartada e recarregada.
+- O botão "Atualizar dados" (components.botao_atualizar) descarta tudo e recarrega.
+
+Os dados pertencem ao usuário logado e são descartados quando outro usuário entra na mesma sessão.
+"""
+import logging
+import streamlit as st
+from carregamento import carregar, ResultadosCarregamento
+from cache_compartilhado import versoes, invalidar
+from estado_sessao import estado_sessao
+
+CHAVE = 'dados'
+
+
+def _dados():
+    usuario_id = estado_sessao().usuario_id
+    dados = st.session_state.get(CHAVE)
+    if dados is None or dados.get('usuario_id') != usuario_id:
+        dados = st.session_state[CHAVE] = {'usuario_id': usuario_id, 'itens': {}}
+    return dados['itens']
+
+
+def _versoes(etiquetas):
+    try:
+        return versoes(etiquetas)
+    except Exception as e:
+        # Sem as versões não há como saber se os dados mudaram: a consulta é refeita
+        logging.warning(f"Cache indisponível: {e}")
+        return None
+
+
+def carregar_sessao(consultas):
+    """
+    Retorna os dados das consultas, lendo da sessão os que continuam válidos e executando os demais
+    ao mesmo tempo (ver carregamento.carregar).
+
+    Parâmetros:
+    consultas (dict): {chave: (etiquetas, função sem argumentos)}.
+    """
+    itens = _dados()
+    etiquetas = sorted({etiqueta for lista, _ in consultas.values() for etiqueta in lista})
+    atuais = dict(zip(etiquetas, _versoes(etiquetas) or [None] * len(etiquetas)))
+    resultados = ResultadosCarregamento()
+    pendentes = {}
+    for chave, (lista, funcao) in consultas.items():
+        versoes_item = [atuais[etiqueta] for etiqueta in lista]
+        item = itens.get(chave)
+        if item is not None and None not in versoes_item and item['versoes'] == versoes_item:
+            resultados[chave] = item['linhas']
+        else:
+            pendentes[chave] = funcao
+    for chave, valor in carregar(pendentes).items():
+        resultados[chave] = valor
+        if not isinstance(valor, Exception):
+            itens[chave] = {'etiquetas': list(consultas[chave][0]), 'versoes': [atuais[etiqueta] for etiqueta in consultas[chave][0]], 'linhas': valor}
+    return resultados
+
+
+def aplicar(etiquetas, correcoes=None):
+    """
+    Publica uma gravação e corrige os dados desta sessão.
+
+    Parâmetros:
+    etiquetas (list): Etiquetas afetadas, invalidadas em todas as sessões e réplicas.
+    correcoes (dict): {chave: função(linhas) -> linhas}. Os dados da sessão com alguma dessas
+        etiquetas e sem correção são descartados e recarregados na próxima execução.
+    """
+    novas = invalidar(*etiquetas)
+    correcoes = correcoes or {}
+    itens = _dados()
+    for chave, item in list(itens.items()):
+        afetadas = [indice for indice, etiqueta in enumerate(item['etiquetas']) if etiqueta in novas or etiqueta in etiquetas]
+        if not afetadas:
+            continue
+        # Só corrige se a gravação desta sessão foi a única desde a leitura
+        concorrente = any(
+            item['versoes'][indice] is None or novas.get(item['etiquetas'][indice]) != item['versoes'][indice] + 1
+            for indice in afetadas
+        )
+        if chave not in correcoes or concorrente:
+            del itens[chave]
+            continue
+        item['linhas'] = correcoes[chave](item['linhas'])
+        for indice in afetadas:
+            item['versoes'][indice] += 1
+
+
+def recarregar():
+    _dados().clear()
+
+
+# Correções usadas com `aplicar`
+def atualizar_linhas(novas, acrescentar=True):
+    # Substitui as linhas de mesmo id e, com `acrescentar`, acrescenta as que não existiam
+    def corrigir(linhas):
+        por_id = {linha['id']: linha for linha in novas}
+        resultado = [dict(linha, **por_id.pop(linha['id'])) if linha['id'] in por_id else linha for linha in linhas]
+        return resultado + list(por_id.values()) if acrescentar else resultado
+    return corrigir
+
+
+def remover_linhas(ids):
+    ids = set(ids)
+    return lambda linhas: [linha for linha in linhas if linha['id'] not in ids]
+
+
+def manter(linhas):
+    return linhas
@@ -1,7 +1,8 @@
 # database.py
 import os
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
+from resiliencia import ClienteResiliente, TIMEOUT_ESCRITA_S
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -10,4 +11,13 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+if os.getenv('SUPABASE_LOCAL'):
+    # Substituto em memória usado pelos testes de carga (ver teste_carga.py)
+    from supabase_local import criar_cliente_local
+    cliente = criar_cliente_local()
+else:
+    # Limite padrão do cliente HTTP; cada requisição recebe o tempo máximo da sua operação (resiliencia.py)
+    cliente: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(postgrest_client_timeout=TIMEOUT_ESCRITA_S))
+
+# Timeouts, novas tentativas, disjuntor e última resposta boa em todas as chamadas
+supabase = ClienteResiliente(cliente)
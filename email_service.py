@@ -1,6 +1,5 @@
 # email_service.py
 import os
-import smtplib
 import logging
 from email.mime.text import MIMEText
 from dotenv import load_dotenv
@@ -8,6 +7,11 @@ from dotenv import load_dotenv
 # Carrega as variáveis definidas no arquivo .env
 load_dotenv()
 
+# 'imediato' envia cada notificação na hora; 'resumo' enfileira as notificações dos professores
+# para serem agrupadas por destinatário pelo job de resumo_notificacoes.py
+NOTIFICACOES_MODO = os.getenv("NOTIFICACOES_MODO", "imediato")
+TABELA_FILA = "emails_pendentes"
+
 def send_email(subject: str, body: str, to_email: str) -> None:
     """
     Envia um e-mail com o assunto e corpo especificados para o destinatário informado.
@@ -22,6 +26,7 @@ def send_email(subject: str, body: str, to_email: str) -> None:
     smtp_username = os.getenv("SMTP_USERNAME")
     smtp_password = os.getenv("SMTP_PASSWORD")
     from_email = os.getenv("FROM_EMAIL")
+    import smtplib  # Carregado só no primeiro envio
     
     # Cria o objeto de mensagem de e-mail
     msg = MIMEText(body, 'plain', 'utf-8')
@@ -42,3 +47,59 @@ def send_email(subject: str, body: str, to_email: str) -> None:
     except Exception as e:
         # Registra erro no log
         logging.error(f"Erro ao enviar e-mail para {to_email}: {e}")
+
+
+def send_emails(messages: list) -> list:
+    """
+    Envia vários e-mails reaproveitando uma única conexão SMTP.
+
+    Parâmetros:
+    messages (list): Tuplas (subject, body, to_email).
+
+    Retorna os índices das mensagens enviadas com sucesso.
+    """
+    if not messages:
+        return []
+    smtp_server = os.getenv("SMTP_SERVER")
+    smtp_port = int(os.getenv("SMTP_PORT", 587))
+    smtp_username = os.getenv("SMTP_USERNAME")
+    smtp_password = os.getenv("SMTP_PASSWORD")
+    from_email = os.getenv("FROM_EMAIL")
+    import smtplib
+
+    enviados = []
+    try:
+        with smtplib.SMTP(smtp_server, smtp_port) as server:
+            server.starttls()
+            server.login(smtp_username, smtp_password)
+            for indice, (subject, body, to_email) in enumerate(messages):
+                msg = MIMEText(body, 'plain', 'utf-8')
+                msg['Subject'] = subject
+                msg['From'] = from_email
+                msg['To'] = to_email
+                try:
+                    server.sendmail(from_email, [to_email], msg.as_string())
+                    enviados.append(indice)
+                    logging.info(f"E-mail enviado com sucesso para {to_email} | Assunto: {subject}")
+                except smtplib.SMTPRecipientsRefused as e:
+                    logging.error(f"Erro ao enviar e-mail para {to_email}: {e}")
+    except Exception as e:
+        logging.error(f"Erro ao enviar lote de e-mails: {e}")
+    return enviados
+
+
+def notify(subject: str, body: str, to_email: str) -> None:
+    """
+    Envia uma notificação ao professor ou, no modo 'resumo', coloca-a na fila para ser agrupada
+    com as demais notificações do mesmo destinatário.
+    """
+    if NOTIFICACOES_MODO != "resumo":
+        send_email(subject, body, to_email)
+        return
+    from database import supabase
+    try:
+        supabase.table(TABELA_FILA).insert({'destinatario': to_email, 'assunto': subject, 'corpo': body}).execute()
+    except Exception as e:
+        # Sem a fila a notificação não pode se perder: envia imediatamente
+        logging.error(f"Erro ao enfileirar e-mail para {to_email}: {e}")
+        send_email(subject, body, to_email)
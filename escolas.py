@@ -0,0 +1,63 @@
+# escolas.py
+"""
+Escolas atendidas pela mesma implantação.
+
+Usuários, espaços, horários fixos e agendamentos pertencem a uma escola (coluna `escola_id`, ver
+migracoes/0007_escolas.sql) e as consultas das telas sempre filtram pela escola da sessão. A escola
+é escolhida pelo endereço (?escola=<slug>) ou, sem ele, pela variável ESCOLA_PADRAO; o login só
+aceita usuários dessa escola.
+
+A sessão guarda só o id da escola; o registro vem do cache do processo. Os dados guardados em
+memória pelo processo são separados pelo id da escola, para que uma escola nunca veja dados de outra.
+"""
+import os
+import threading
+import streamlit as st
+from database import supabase
+from estado_sessao import estado_sessao
+
+ESCOLA_PADRAO = os.getenv('ESCOLA_PADRAO', 'mcpf')
+
+# Escolas já consultadas, por slug e por id; o cadastro de escolas muda raramente
+_escolas = {}
+_escolas_por_id = {}
+_lock = threading.Lock()
+
+
+def _buscar(coluna, valor, cache):
+    with _lock:
+        if valor in cache:
+            return cache[valor]
+    response = supabase.table('escolas').select('id', 'slug', 'nome').eq(coluna, valor).limit(1).execute()
+    if not response.data:
+        return None
+    escola = response.data[0]
+    with _lock:
+        _escolas[escola['slug']] = escola
+        _escolas_por_id[escola['id']] = escola
+    return escola
+
+
+def buscar_escola(slug):
+    return _buscar('slug', slug, _escolas)
+
+
+def escola_da_sessao():
+    """
+    Retorna a escola da sessão ({'id', 'slug', 'nome'}), identificada pelo endereço na primeira execução,
+    ou None se o slug não corresponder a nenhuma escola.
+    """
+    estado = estado_sessao()
+    if estado.escola_id is None:
+        escola = buscar_escola(st.query_params.get('escola', ESCOLA_PADRAO))
+        estado.escola_id = escola['id'] if escola else None
+        return escola
+    return _buscar('id', estado.escola_id, _escolas_por_id)
+
+
+def escola_id():
+    return estado_sessao().escola_id
+
+
+def cabecalho_escola():
+    st.write(f"**{escola_da_sessao()['nome']}**")  # Nome da escola
@@ -0,0 +1,308 @@
+# espelho_local.py
+"""
+Espelho local em SQLite para as telas de leitura.
+
+Quando ESPELHO_LOCAL=1, as tabelas `laboratorios`, `users` (sem o hash da senha), `horarios_fixos` e
+`agendamentos` são copiadas para um arquivo SQLite e mantidas atualizadas por sincronização
+incremental a partir da coluna `updated_at`. Leem do espelho, por meio de `leitura()`, que aceita o
+mesmo encadeamento de filtros do cliente Supabase: a lista de agendamentos do professor e os nomes de
+usuários e espaços usados nas notificações (professor.py e admlab.py). As gravações continuam indo ao
+Supabase e as linhas devolvidas são aplicadas ao espelho na hora com `registrar`/`registrar_remocao`.
+Se o Supabase estiver lento ou fora do ar, essas leituras continuam com a última cópia sincronizada.
+
+Os pendentes, os horários fixos e a agenda do administrador são lidos do Supabase pelo cache
+compartilhado (cache_compartilhado.py): um valor calculado a partir de um espelho atrasado ficaria no
+cache de todas as réplicas mesmo depois de invalidado.
+
+As verificações que antecedem uma gravação (disponibilidade e pedido duplicado) continuam consultando
+o Supabase, pois não podem se basear em uma cópia atrasada.
+
+Cada tabela espelhada precisa de uma coluna `updated_at` mantida pelo banco
+(migracoes/0002_updated_at.sql).
+
+Cada sincronização relê as linhas com `updated_at` até ESPELHO_MARGEM_S segundos antes da marca. O
+`updated_at` é o instante da gravação, e não o da confirmação da transação: uma transação longa pode
+ser confirmada depois que a marca já passou do seu `updated_at`. A releitura é idempotente. As
+páginas seguem a chave (`updated_at`, `id`), e não um deslocamento, então gravações feitas durante a
+sincronização não fazem linhas serem puladas.
+
+Remoções não alteram `updated_at`; por isso os ids são conferidos com o Supabase a cada
+ESPELHO_RECONCILIACAO_S segundos. Os ids locais são lidos antes dos remotos: uma linha que chega ao
+espelho durante a listagem remota não é tomada por removida.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from database import supabase
+
+ESPELHO_ATIVO = os.getenv('ESPELHO_LOCAL', '') not in ('', '0')
+CAMINHO = os.getenv('ESPELHO_LOCAL_CAMINHO', 'espelho_local.sqlite3')
+INTERVALO_SINCRONIZACAO_S = float(os.getenv('ESPELHO_INTERVALO_S', 5))
+INTERVALO_RECONCILIACAO_S = float(os.getenv('ESPELHO_RECONCILIACAO_S', 300))
+MARGEM_S = float(os.getenv('ESPELHO_MARGEM_S', 60))
+TAMANHO_PAGINA = 1000
+
+# Colunas espelhadas por tabela; colunas de lista (aulas) são guardadas como JSON
+TABELAS = {
+    'laboratorios': ['id', 'escola_id', 'nome', 'descricao', 'capacidade', 'administrador_id', 'nome_normalizado', 'updated_at'],
+    'users': ['id', 'escola_id', 'name', 'email', 'email_normalizado', 'tipo_usuario', 'updated_at'],
+    'horarios_fixos': ['id', 'escola_id', 'laboratorio_id', 'dia_semana', 'aulas', 'data_inicio', 'data_fim', 'descricao', 'updated_at'],
+    'agendamentos': ['id', 'escola_id', 'usuario_id', 'laboratorio_id', 'data_agendamento', 'aulas', 'descricao', 'status', 'created_at', 'updated_at'],
+}
+COLUNAS_LISTA = {'aulas'}
+
+_local = threading.local()
+_lock_sincronizacao = threading.Lock()
+_lock_inicio = threading.Lock()
+_ultima_sincronizacao = 0.0
+_ultima_reconciliacao = 0.0
+_thread = None
+
+
+def _conexao():
+    conexao = getattr(_local, 'conexao', None)
+    if conexao is None:
+        conexao = sqlite3.connect(CAMINHO, timeout=30)
+        conexao.row_factory = sqlite3.Row
+        conexao.execute('pragma journal_mode=wal')
+        conexao.execute('pragma synchronous=normal')
+        _local.conexao = conexao
+    return conexao
+
+
+def _criar_tabelas(conexao):
+    conexao.execute('create table if not exists _marcas (tabela text primary key, updated_at text)')
+    for tabela, colunas in TABELAS.items():
+        existentes = [linha['name'] for linha in conexao.execute(f'pragma table_info({tabela})')]
+        if existentes and existentes != colunas:
+            # As colunas espelhadas mudaram desde a criação do arquivo: recria a tabela e copia tudo de novo
+            conexao.execute(f'drop table {tabela}')
+            conexao.execute('delete from _marcas where tabela = ?', (tabela,))
+        definicoes = ', '.join('id integer primary key' if coluna == 'id' else coluna for coluna in colunas)
+        conexao.execute(f'create table if not exists {tabela} ({definicoes})')
+    conexao.execute('create index if not exists agendamentos_lab_data on agendamentos (laboratorio_id, data_agendamento, status)')
+    conexao.execute('create index if not exists agendamentos_usuario_data on agendamentos (usuario_id, data_agendamento)')
+    conexao.execute('create index if not exists horarios_fixos_lab_dia on horarios_fixos (laboratorio_id, dia_semana)')
+    conexao.commit()
+
+
+def _para_sqlite(coluna, valor):
+    return json.dumps(valor) if coluna in COLUNAS_LISTA and valor is not None else valor
+
+
+def _de_sqlite(linha):
+    return {coluna: json.loads(valor) if coluna in COLUNAS_LISTA and valor is not None else valor for coluna, valor in dict(linha).items()}
+
+
+def registrar(tabela, linhas):
+    # Aplica ao espelho as linhas devolvidas por uma gravação no Supabase
+    if not ESPELHO_ATIVO or tabela not in TABELAS or not linhas:
+        return
+    colunas = TABELAS[tabela]
+    conexao = _conexao()
+    conexao.executemany(
+        f"insert or replace into {tabela} ({', '.join(colunas)}) values ({', '.join('?' for _ in colunas)})",
+        [[_para_sqlite(coluna, linha.get(coluna)) for coluna in colunas] for linha in linhas],
+    )
+    conexao.commit()
+
+
+def registrar_remocao(tabela, ids):
+    if not ESPELHO_ATIVO or tabela not in TABELAS or not ids:
+        return
+    conexao = _conexao()
+    conexao.executemany(f'delete from {tabela} where id = ?', [(id_,) for id_ in ids])
+    conexao.commit()
+
+
+def _sincronizar_tabela(conexao, tabela):
+    linha_marca = conexao.execute('select updated_at from _marcas where tabela = ?', (tabela,)).fetchone()
+    marca = linha_marca['updated_at'] if linha_marca else None
+    nova_marca = marca
+    ultima = None  # (updated_at, id) da última linha lida
+    while True:
+        # Sem a última resposta boa (resiliencia.py): cada página é lida uma única vez
+        consulta = supabase.table(tabela, guardar=False).select(*TABELAS[tabela])
+        if ultima:
+            consulta = consulta.or_(f'updated_at.gt."{ultima[0]}",and(updated_at.eq."{ultima[0]}",id.gt.{ultima[1]})')
+        elif marca:
+            # Margem antes da marca para as transações confirmadas depois da última sincronização
+            consulta = consulta.gte('updated_at', (datetime.fromisoformat(marca) - timedelta(seconds=MARGEM_S)).isoformat())
+        linhas = consulta.order('updated_at').order('id').limit(TAMANHO_PAGINA).execute().data
+        if linhas:
+            registrar(tabela, linhas)
+            nova_marca = max(nova_marca or '', max(linha['updated_at'] for linha in linhas))
+        if len(linhas) < TAMANHO_PAGINA:
+            break
+        ultima = (linhas[-1]['updated_at'], linhas[-1]['id'])
+    if nova_marca != marca:
+        conexao.execute('insert or replace into _marcas (tabela, updated_at) values (?, ?)', (tabela, nova_marca))
+        conexao.commit()
+
+
+def _reconciliar_tabela(conexao, tabela):
+    # Ids locais primeiro: o que for gravado no espelho depois disso fica de fora da comparação.
+    # Páginas pela chave (id > último lido): uma remoção durante a leitura não desloca as páginas seguintes
+    ids_locais = {linha['id'] for linha in conexao.execute(f'select id from {tabela}')}
+    ids_remotos = set()
+    ultimo_id = 0
+    while True:
+        linhas = supabase.table(tabela, guardar=False).select('id').gt('id', ultimo_id).order('id').limit(TAMANHO_PAGINA).execute().data
+        ids_remotos.update(linha['id'] for linha in linhas)
+        if len(linhas) < TAMANHO_PAGINA:
+            break
+        ultimo_id = linhas[-1]['id']
+    registrar_remocao(tabela, list(ids_locais - ids_remotos))
+
+
+def sincronizar(reconciliar=False):
+    """
+    Traz do Supabase as linhas alteradas desde a última sincronização de cada tabela.
+
+    Com reconciliar=True também remove do espelho as linhas apagadas no Supabase.
+    """
+    global _ultima_sincronizacao, _ultima_reconciliacao
+    with _lock_sincronizacao:
+        conexao = _conexao()
+        _criar_tabelas(conexao)
+        for tabela in TABELAS:
+            _sincronizar_tabela(conexao, tabela)
+            if reconciliar:
+                _reconciliar_tabela(conexao, tabela)
+        _ultima_sincronizacao = time.monotonic()
+        if reconciliar:
+            _ultima_reconciliacao = _ultima_sincronizacao
+
+
+def _laco_sincronizacao():
+    while True:
+        time.sleep(INTERVALO_SINCRONIZACAO_S)
+        try:
+            sincronizar(reconciliar=time.monotonic() - _ultima_reconciliacao >= INTERVALO_RECONCILIACAO_S)
+        except Exception as e:
+            logging.error(f"Erro ao sincronizar o espelho local: {e}")
+
+
+def iniciar():
+    # Faz a carga inicial e inicia a sincronização em segundo plano uma única vez por processo
+    global _thread
+    with _lock_inicio:
+        if _thread is not None:
+            return
+        try:
+            sincronizar(reconciliar=True)
+        except Exception as e:
+            # Sem o Supabase, o espelho segue com a última cópia gravada em disco
+            logging.error(f"Erro na carga inicial do espelho local: {e}")
+            _criar_tabelas(_conexao())
+        _thread = threading.Thread(target=_laco_sincronizacao, name='espelho-local', daemon=True)
+        _thread.start()
+
+
+class RespostaEspelho:
+    def __init__(self, data):
+        self.data = data
+
+
+class ConsultaEspelho:
+    """
+    Consulta de leitura sobre o espelho com a mesma interface encadeada do cliente Supabase
+    (select, filtros de comparação, in_, order, limit, range).
+    """
+
+    def __init__(self, tabela):
+        if tabela not in TABELAS:
+            raise ValueError(f"A tabela {tabela} não é espelhada.")
+        self._tabela = tabela
+        self._colunas = TABELAS[tabela]
+        self._condicoes = []
+        self._parametros = []
+        self._ordem = []
+        self._limite = -1
+        self._inicio = 0
+
+    def select(self, *colunas, count=None):
+        pedidas = [c.strip() for coluna in colunas for c in coluna.split(',')]
+        if pedidas and '*' not in pedidas:
+            self._colunas = [coluna for coluna in pedidas if coluna in TABELAS[self._tabela]]
+        return self
+
+    def _comparar(self, coluna, operador, valor):
+        if coluna in COLUNAS_LISTA and isinstance(valor, str):
+            # Literal de array do PostgREST, como '{1,2}'
+            valor = [int(item) for item in valor.strip('{}').split(',') if item.strip()]
+        self._condicoes.append(f'{coluna} {operador} ?')
+        self._parametros.append(_para_sqlite(coluna, valor))
+        return self
+
+    def eq(self, coluna, valor):
+        return self._comparar(coluna, '=', valor)
+
+    def neq(self, coluna, valor):
+        return self._comparar(coluna, '!=', valor)
+
+    def gt(self, coluna, valor):
+        return self._comparar(coluna, '>', valor)
+
+    def gte(self, coluna, valor):
+        return self._comparar(coluna, '>=', valor)
+
+    def lt(self, coluna, valor):
+        return self._comparar(coluna, '<', valor)
+
+    def lte(self, coluna, valor):
+        return self._comparar(coluna, '<=', valor)
+
+    def in_(self, coluna, valores):
+        valores = list(valores)
+        if not valores:
+            self._condicoes.append('0')
+            return self
+        self._condicoes.append(f"{coluna} in ({', '.join('?' for _ in valores)})")
+        self._parametros.extend(valores)
+        return self
+
+    def order(self, coluna, desc=False):
+        self._ordem.append(f"{coluna} {'desc' if desc else 'asc'}")
+        return self
+
+    def limit(self, quantidade):
+        self._limite = quantidade
+        return self
+
+    def range(self, inicio, fim):
+        self._inicio = inicio
+        self._limite = fim - inicio + 1
+        return self
+
+    def execute(self):
+        sql = f"select {', '.join(self._colunas)} from {self._tabela}"
+        if self._condicoes:
+            sql += ' where ' + ' and '.join(self._condicoes)
+        if self._ordem:
+            sql += ' order by ' + ', '.join(self._ordem)
+        sql += ' limit ? offset ?'
+        linhas = _conexao().execute(sql, [*self._parametros, self._limite, self._inicio]).fetchall()
+        return RespostaEspelho([_de_sqlite(linha) for linha in linhas])
+
+
+class ClienteEspelho:
+    def table(self, nome):
+        return ConsultaEspelho(nome)
+
+
+_cliente_espelho = ClienteEspelho()
+
+
+def leitura():
+    """
+    Cliente para as telas de consulta: o espelho local quando ativo, senão o próprio Supabase.
+    """
+    if not ESPELHO_ATIVO:
+        return supabase
+    iniciar()
+    return _cliente_espelho
@@ -0,0 +1,97 @@
+# estado_sessao.py
+"""
+Estado da sessão do usuário.
+
+O que o sistema guarda entre execuções fica em um único objeto `EstadoSessao` dentro de
+`st.session_state`, com campos tipados, __slots__ e apenas ids. Os registros em edição ou exclusão
+são localizados a cada execução nas listas que a tela acabou de carregar, em vez de cópias guardadas
+na sessão que ocupam memória e podem estar desatualizadas. O Streamlit mantém o estado de cada aba
+aberta na memória do servidor, então o custo por sessão fica pequeno e previsível.
+
+`relatorio_memoria` estima a memória do estado de cada sessão ativa (aba Diagnóstico do superadministrador).
+"""
+import sys
+from dataclasses import dataclass, fields
+from typing import Optional
+import streamlit as st
+
+CHAVE = 'estado'
+
+
+@dataclass(slots=True)
+class EstadoSessao:
+    escola_id: Optional[int] = None
+    autenticado: bool = False
+    usuario_id: Optional[int] = None
+    tipo_usuario: Optional[str] = None
+    email: Optional[str] = None
+    # Registros selecionados nas telas do superadministrador
+    editar_usuario_id: Optional[int] = None
+    excluir_usuario_id: Optional[int] = None
+    editar_laboratorio_id: Optional[int] = None
+    excluir_laboratorio_id: Optional[int] = None
+
+    def entrar(self, usuario):
+        self.autenticado = True
+        self.usuario_id = usuario['id']
+        self.tipo_usuario = usuario['tipo_usuario']
+        self.email = usuario['email']
+
+    def sair(self):
+        # Volta ao estado inicial, mantendo a escola do endereço de acesso
+        escola_id = self.escola_id
+        for campo in fields(self):
+            setattr(self, campo.name, campo.default)
+        self.escola_id = escola_id
+
+
+def estado_sessao() -> EstadoSessao:
+    if CHAVE not in st.session_state:
+        st.session_state[CHAVE] = EstadoSessao()
+    return st.session_state[CHAVE]
+
+
+def tamanho_profundo(objeto, vistos=None):
+    # Soma o tamanho do objeto e de tudo o que ele referencia (dicts, listas, slots), sem repetir objetos
+    vistos = set() if vistos is None else vistos
+    if id(objeto) in vistos:
+        return 0
+    vistos.add(id(objeto))
+    tamanho = sys.getsizeof(objeto)
+    if isinstance(objeto, dict):
+        tamanho += sum(tamanho_profundo(chave, vistos) + tamanho_profundo(valor, vistos) for chave, valor in objeto.items())
+    elif isinstance(objeto, (list, tuple, set, frozenset)):
+        tamanho += sum(tamanho_profundo(item, vistos) for item in objeto)
+    elif hasattr(objeto, '__slots__'):
+        tamanho += sum(tamanho_profundo(getattr(objeto, nome), vistos) for nome in objeto.__slots__ if hasattr(objeto, nome))
+    elif hasattr(objeto, '__dict__'):
+        tamanho += tamanho_profundo(vars(objeto), vistos)
+    return tamanho
+
+
+def _estados_ativos():
+    # Estado de todas as sessões ativas do processo; usa a API interna do runtime do Streamlit e, se
+    # ela não estiver disponível, relata só a sessão atual
+    try:
+        from streamlit.runtime import Runtime
+        sessoes = Runtime.instance()._session_mgr.list_active_sessions()
+        return [info.session.session_state.filtered_state for info in sessoes]
+    except Exception:
+        return [st.session_state.to_dict()]
+
+
+def relatorio_memoria():
+    """
+    Retorna uma linha por sessão ativa com o usuário e o tamanho estimado do estado, do maior para o menor.
+    """
+    linhas = []
+    for estado in _estados_ativos():
+        dados = estado.get(CHAVE)
+        linhas.append({
+            'Usuário': getattr(dados, 'email', None) or '(sem login)',
+            'Perfil': getattr(dados, 'tipo_usuario', None) or '',
+            'Estado do sistema (bytes)': tamanho_profundo(dados) if dados is not None else 0,
+            'Estado total da sessão (bytes)': tamanho_profundo(estado),
+        })
+    linhas.sort(key=lambda linha: linha['Estado total da sessão (bytes)'], reverse=True)
+    return linhas
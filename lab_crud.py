@@ -1,11 +1,13 @@
 import streamlit as st
-import re
 from database import supabase
+from validacao import nome_laboratorio_em_uso, violacao_unicidade
+from escolas import escola_id
+from estado_sessao import estado_sessao
+from dados_sessao import aplicar, atualizar_linhas, remover_linhas
 
 def adicionar_novo_laboratorio():
     with st.expander("Adicionar Novo Espaço", expanded=True):
         with st.form(key='add_lab_form'):
-            import re  # Import necessário para manipulação de strings
             col1, col2 = st.columns(2)
             with col1:
                 nome = st.text_input("Nome do Espaço", help="Digite o nome do Espaço")
@@ -14,7 +16,7 @@ def adicionar_novo_laboratorio():
             descricao = st.text_area("Descrição", help="Descrição opcional do laboratório")
             # Selecionar um administrador
             try:
-                response_admins = supabase.table('users').select('id','name', 'email').eq('tipo_usuario', 'admlab').execute()
+                response_admins = supabase.table('users').select('id','name', 'email').eq('escola_id', escola_id()).eq('tipo_usuario', 'admlab').execute()
                 admin_options = {admin['name'] or admin['email']: admin['id'] for admin in response_admins.data} if response_admins.data else {}
             except Exception as e:
                 st.error(f'Erro ao carregar administradores: {e}')
@@ -26,12 +28,9 @@ def adicionar_novo_laboratorio():
                 if nome.strip() == '':
                     st.warning('O nome do Espaço é obrigatório.')
                 else:
-                    # Normalizar o nome para comparação
-                    nome_normalizado = re.sub(' +', ' ', nome.strip().lower())
                     try:
-                        response = supabase.table('laboratorios').select('nome').execute()
-                        nomes_existentes = [re.sub(' +', ' ', lab['nome'].strip().lower()) for lab in response.data]
-                        if nome_normalizado in nomes_existentes:
+                        # Busca de uma única linha pelo índice único do nome normalizado
+                        if nome_laboratorio_em_uso(nome, escola_id()):
                             st.warning('Já existe um Espaço com este nome. Por favor, escolha outro nome.')
                         else:
                             administrador_id = admin_options.get(administrador_email) if administrador_email != 'Não atribuído' else None
@@ -39,29 +38,35 @@ def adicionar_novo_laboratorio():
                                 'nome': nome.strip(),
                                 'descricao': descricao.strip(),
                                 'capacidade': int(capacidade),
-                                'administrador_id': administrador_id
+                                'administrador_id': administrador_id,
+                                'escola_id': escola_id()
                             }
                             try:
                                 response = supabase.table('laboratorios').insert(novo_laboratorio).execute()
+                                # A lista de espaços é desenhada depois do formulário e já recebe a nova linha
+                                aplicar([f'laboratorios:{escola_id()}'], {'laboratorios': atualizar_linhas(response.data)})
                                 st.success('Espaço adicionado com sucesso!')
-                                st.rerun()
                             except Exception as e:
-                                st.error(f'Erro ao adicionar o Espaço: {e}')
+                                if violacao_unicidade(e):
+                                    st.warning('Já existe um Espaço com este nome. Por favor, escolha outro nome.')
+                                else:
+                                    st.error(f'Erro ao adicionar o Espaço: {e}')
                     except Exception as e:
                         st.error(f'Erro ao verificar a existência do Espaço: {e}')
 
 def editar_laboratorio(lab):
     st.subheader(f"Editar Espaço: {lab['nome']}")
+    prefixo = f'laboratorio_{lab["id"]}'
     with st.form(key=f'edit_lab_form_{lab["id"]}'):
         col1, col2 = st.columns(2)
         with col1:
-            nome = st.text_input("Nome do Espaço", value=lab['nome'], help="Atualize o nome do espaço")
+            st.text_input("Nome do Espaço", value=lab['nome'], help="Atualize o nome do espaço", key=f'{prefixo}_nome')
         with col2:
-            capacidade = st.number_input("Capacidade", min_value=0, step=1, value=lab.get('capacidade') or 0, help="Atualize a capacidade do espaço")
-        descricao = st.text_area("Descrição", value=lab.get('descricao', ''), help="Atualize a descrição do espaço")
+            st.number_input("Capacidade", min_value=0, step=1, value=lab.get('capacidade') or 0, help="Atualize a capacidade do espaço", key=f'{prefixo}_capacidade')
+        st.text_area("Descrição", value=lab.get('descricao', ''), help="Atualize a descrição do espaço", key=f'{prefixo}_descricao')
         # Selecionar um administrador
         try:
-            response_admins = supabase.table('users').select('id', 'name', 'email').eq('tipo_usuario', 'admlab').execute()
+            response_admins = supabase.table('users').select('id', 'name', 'email').eq('escola_id', escola_id()).eq('tipo_usuario', 'admlab').execute()
             admin_options = {admin['name'] or admin['email']: admin['id'] for admin in response_admins.data} if response_admins.data else {}
         except Exception as e:
             st.error(f'Erro ao carregar administradores: {e}')
@@ -70,91 +75,94 @@ def editar_laboratorio(lab):
         current_admin_email = 'Não atribuído'
         if lab['administrador_id']:
             try:
-                response_admin = supabase.table('users').select('email').eq('id', lab['administrador_id']).execute()
+                response_admin = supabase.table('users').select('email').eq('escola_id', escola_id()).eq('id', lab['administrador_id']).execute()
                 if response_admin.data:
                     current_admin_email = response_admin.data[0]['email']
             except Exception as e:
                 st.error(f'Erro ao obter o administrador atual: {e}')
         admin_emails = ['Não atribuído'] + list(admin_options.keys())
         admin_index = admin_emails.index(current_admin_email) if current_admin_email in admin_emails else 0
-        administrador_email = st.selectbox("Administrador do Espaço (opcional)", options=admin_emails, index=admin_index, help="Selecione o administrador do Espaço")
-        submitted = st.form_submit_button("💾 Atualizar Dados")
-        if submitted:
-            if nome.strip() == '':
-                st.warning('O nome do laboratório é obrigatório.')
+        st.selectbox("Administrador do Espaço (opcional)", options=admin_emails, index=admin_index, help="Selecione o administrador do Espaço", key=f'{prefixo}_administrador')
+        # Gravado em um callback: a lista de espaços já aparece corrigida na próxima execução
+        st.form_submit_button("💾 Atualizar Dados", on_click=salvar_laboratorio_editado, args=(lab['id'], prefixo, admin_options))
+
+def salvar_laboratorio_editado(lab_id, prefixo, admin_options):
+    nome, capacidade, descricao, administrador_email = (
+        st.session_state[f'{prefixo}_{campo}'] for campo in ('nome', 'capacidade', 'descricao', 'administrador')
+    )
+    if nome.strip() == '':
+        st.warning('O nome do laboratório é obrigatório.')
+    else:
+        administrador_id = admin_options.get(administrador_email) if administrador_email != 'Não atribuído' else None
+        lab_atualizado = {
+            'nome': nome.strip(),
+            'descricao': descricao.strip(),
+            'capacidade': int(capacidade),
+            'administrador_id': administrador_id
+        }
+        try:
+            if nome_laboratorio_em_uso(nome, escola_id(), ignorar_id=lab_id):
+                st.warning('Já existe um Espaço com este nome. Por favor, escolha outro nome.')
+            else:
+                response = supabase.table('laboratorios').update(lab_atualizado).eq('escola_id', escola_id()).eq('id', lab_id).execute()
+                aplicar([f'laboratorios:{escola_id()}'], {'laboratorios': atualizar_linhas(response.data)})
+                st.success('Espaço atualizado com sucesso!')
+                estado_sessao().editar_laboratorio_id = None  # Fecha o formulário de edição
+        except Exception as e:
+            if violacao_unicidade(e):
+                st.warning('Já existe um Espaço com este nome. Por favor, escolha outro nome.')
             else:
-                administrador_id = admin_options.get(administrador_email) if administrador_email != 'Não atribuído' else None
-                lab_atualizado = {
-                    'nome': nome.strip(),
-                    'descricao': descricao.strip(),
-                    'capacidade': int(capacidade),
-                    'administrador_id': administrador_id
-                }
-                try:
-                    response = supabase.table('laboratorios').update(lab_atualizado).eq('id', lab['id']).execute()
-                    st.success('Espaço atualizado com sucesso!')
-                    st.rerun()
-                except Exception as e:
-                    st.error(f'Erro ao atualizar o espaço: {e}')
+                st.error(f'Erro ao atualizar o espaço: {e}')
 
 
 
 def confirmar_exclusao_laboratorio(lab_id):
     try:
         # Obter o laboratório pelo ID
-        response = supabase.table('laboratorios').select('nome').eq('id', lab_id).execute()
+        response = supabase.table('laboratorios').select('nome').eq('escola_id', escola_id()).eq('id', lab_id).execute()
         if not response.data:
             st.error('Espaço não encontrado.')
-            st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
+            estado_sessao().excluir_laboratorio_id = None  # Resetar o estado
             return
         lab = response.data[0]
         st.warning(f"Tem certeza que deseja excluir o Espaço **{lab['nome']}**? Esta ação não pode ser desfeita.")
         col1, col2 = st.columns(2)
         with col1:
-            if st.button('❌ Confirmar Exclusão', key=f'confirm_delete_lab_{lab_id}'):
-                try:
-                    response = supabase.table('laboratorios').delete().eq('id', lab_id).execute()
-                    st.success('Espaço excluído com sucesso!')
-                    st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
-                    st.rerun()
-                except Exception as e:
-                    st.error(f'Erro ao excluir o Espaço: {e}')
-                    st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
+            st.button('❌ Confirmar Exclusão', key=f'confirm_delete_lab_{lab_id}', on_click=excluir_laboratorio, args=(lab_id,))
         with col2:
-            if st.button('Cancelar', key=f'cancel_delete_lab_{lab_id}'):
-                st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
-                st.rerun()
+            # Resetar o estado
+            st.button('Cancelar', key=f'cancel_delete_lab_{lab_id}', on_click=setattr, args=(estado_sessao(), 'excluir_laboratorio_id', None))
     except Exception as e:
         st.error(f'Erro ao obter o Espaço: {e}')
-        st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
+        estado_sessao().excluir_laboratorio_id = None  # Resetar o estado
 
 
 
 def confirmar_exclusao_laboratorio(lab_id):
     try:
         # Obter o laboratório pelo ID
-        response = supabase.table('laboratorios').select('nome').eq('id', lab_id).execute()
+        response = supabase.table('laboratorios').select('nome').eq('escola_id', escola_id()).eq('id', lab_id).execute()
         if not response.data:
             st.error('Espaço não encontrado.')
-            st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
+            estado_sessao().excluir_laboratorio_id = None  # Resetar o estado
             return
         lab = response.data[0]
         st.warning(f"Tem certeza que deseja excluir o Espaço **{lab['nome']}**? Esta ação não pode ser desfeita.")
         col1, col2 = st.columns(2)
         with col1:
-            if st.button('❌ Confirmar Exclusão', key=f'confirm_delete_lab_{lab_id}'):
-                try:
-                    response = supabase.table('laboratorios').delete().eq('id', lab_id).execute()
-                    st.success('Espaço excluído com sucesso!')
-                    st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
-                    st.rerun()
-                except Exception as e:
-                    st.error(f'Erro ao excluir o espaço: {e}')
-                    st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
+            st.button('❌ Confirmar Exclusão', key=f'confirm_delete_lab_{lab_id}', on_click=excluir_laboratorio, args=(lab_id,))
         with col2:
-            if st.button('Cancelar', key=f'cancel_delete_lab_{lab_id}'):
-                st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
-                st.rerun()
+            # Resetar o estado
+            st.button('Cancelar', key=f'cancel_delete_lab_{lab_id}', on_click=setattr, args=(estado_sessao(), 'excluir_laboratorio_id', None))
     except Exception as e:
         st.error(f'Erro ao obter o espaço: {e}')
-        st.session_state['confirm_delete_lab_id'] = None  # Resetar o estado
+        estado_sessao().excluir_laboratorio_id = None  # Resetar o estado
+
+def excluir_laboratorio(lab_id):
+    try:
+        response = supabase.table('laboratorios').delete().eq('escola_id', escola_id()).eq('id', lab_id).execute()
+        aplicar([f'laboratorios:{escola_id()}', f'agenda:{lab_id}', f'pendentes:{lab_id}'], {'laboratorios': remover_linhas([lab_id])})
+        st.success('Espaço excluído com sucesso!')
+    except Exception as e:
+        st.error(f'Erro ao excluir o Espaço: {e}')
+    estado_sessao().excluir_laboratorio_id = None  # Resetar o estado
@@ -1,34 +1,61 @@
 # main.py
 import streamlit as st
-from auth import verificar_superadmin, criar_superadmin, tela_login
-from components import logout_button
-from superadmin import painel_superadmin
-from admlab import painel_admin_laboratorio
-from professor import painel_professor
-
-# Inicialização da sessão
-if "autenticado" not in st.session_state:
-    st.session_state["autenticado"] = False
-    st.session_state["tipo_usuario"] = None
-    st.session_state["email"] = None
-    st.session_state["usuario_id"] = None
+from tempo_inicializacao import iniciar_execucao, importar, registrar_primeira_renderizacao
+
+iniciar_execucao()
+
+from escolas import escola_da_sessao
+from estado_sessao import estado_sessao
+
+# Apenas o necessário para a tela de login; cada painel (e suas dependências) é importado
+# somente quando um usuário daquele perfil se autentica
+auth = importar('auth')
+components = importar('components')
+
+PAINEIS = {
+    'superadmin': ('superadmin', 'painel_superadmin'),
+    'admlab': ('admlab', 'painel_admin_laboratorio'),
+    'professor': ('professor', 'painel_professor'),
+}
+
+# Inicialização da sessão (ver estado_sessao.py)
+estado = estado_sessao()
+
+# Escola da sessão, identificada pelo endereço de acesso (ver escolas.py)
+try:
+    escola = escola_da_sessao()
+except Exception as e:
+    st.error(f"Erro ao identificar a escola: {e}")
+    st.stop()
+if escola is None:
+    st.error("Escola não encontrada. Verifique o endereço de acesso.")
+    st.stop()
+
+components.aviso_instabilidade()
 
 # Exibir tela de login ou o painel apropriado
-if not st.session_state["autenticado"]:
-    if not verificar_superadmin():
+if not estado.autenticado:
+    if not auth.verificar_superadmin():
         st.info('Nenhum superadministrador encontrado. Por favor, crie um agora.')
-        criar_superadmin()
+        auth.criar_superadmin()
     else:
-        tela_login()
+        auth.tela_login()
 else:
-    tipo_usuario = st.session_state["tipo_usuario"]
-    if tipo_usuario == "superadmin":
-        painel_superadmin()
-    elif tipo_usuario == "admlab":
-        painel_admin_laboratorio()
-    elif tipo_usuario == "professor":
-        painel_professor()
+    tipo_usuario = estado.tipo_usuario
+    if tipo_usuario in PAINEIS:
+        nome_modulo, nome_painel = PAINEIS[tipo_usuario]
+        painel = getattr(importar(nome_modulo), nome_painel)
+        perfilamento = importar('perfilamento')
+        if perfilamento.deve_perfilar(estado.email):
+            # Perfilamento sob demanda (ver perfilamento.py)
+            with perfilamento.perfilar(nome_painel):
+                painel()
+        else:
+            painel()
     else:
         st.error("Tipo de usuário desconhecido.")
     
-    logout_button()
+    components.botao_atualizar()
+    components.logout_button()
+
+registrar_primeira_renderizacao()
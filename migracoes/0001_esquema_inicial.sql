@@ -0,0 +1,42 @@
+-- Esquema base usado pelo aplicativo: usuários, espaços, horários fixos e agendamentos.
+
+create table if not exists users (
+    id bigint generated by default as identity primary key,
+    name text,
+    email text not null,
+    password text not null,
+    tipo_usuario text not null check (tipo_usuario in ('superadmin', 'admlab', 'professor')),
+    created_at timestamptz not null default now()
+);
+
+create table if not exists laboratorios (
+    id bigint generated by default as identity primary key,
+    nome text not null,
+    descricao text,
+    capacidade integer,
+    administrador_id bigint references users (id) on delete set null,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists horarios_fixos (
+    id bigint generated by default as identity primary key,
+    laboratorio_id bigint not null references laboratorios (id) on delete cascade,
+    dia_semana smallint not null check (dia_semana between 0 and 6),
+    aulas integer[] not null,
+    data_inicio date not null,
+    data_fim date not null,
+    descricao text,
+    created_at timestamptz not null default now(),
+    check (data_inicio <= data_fim)
+);
+
+create table if not exists agendamentos (
+    id bigint generated by default as identity primary key,
+    usuario_id bigint not null references users (id) on delete cascade,
+    laboratorio_id bigint not null references laboratorios (id) on delete cascade,
+    data_agendamento date not null,
+    aulas integer[] not null,
+    descricao text,
+    status text not null default 'pendente' check (status in ('pendente', 'aprovado', 'rejeitado')),
+    created_at timestamptz not null default now()
+);
@@ -0,0 +1,24 @@
+-- Coluna updated_at mantida pelo banco, usada pela sincronização incremental do espelho local
+-- (espelho_local.py).
+
+create or replace function definir_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+alter table users add column if not exists updated_at timestamptz not null default now();
+alter table laboratorios add column if not exists updated_at timestamptz not null default now();
+alter table horarios_fixos add column if not exists updated_at timestamptz not null default now();
+alter table agendamentos add column if not exists updated_at timestamptz not null default now();
+
+create or replace trigger users_updated_at before update on users
+    for each row execute function definir_updated_at();
+create or replace trigger laboratorios_updated_at before update on laboratorios
+    for each row execute function definir_updated_at();
+create or replace trigger horarios_fixos_updated_at before update on horarios_fixos
+    for each row execute function definir_updated_at();
+create or replace trigger agendamentos_updated_at before update on agendamentos
+    for each row execute function definir_updated_at();
@@ -0,0 +1,10 @@
+-- Unicidade de e-mails e nomes de espaços por colunas normalizadas (validacao.py).
+-- Duplicatas já existentes precisam ser resolvidas antes desta migração.
+
+alter table users add column if not exists email_normalizado text
+    generated always as (lower(btrim(email))) stored;
+create unique index if not exists users_email_normalizado_key on users (email_normalizado);
+
+alter table laboratorios add column if not exists nome_normalizado text
+    generated always as (regexp_replace(lower(btrim(nome)), ' +', ' ', 'g')) stored;
+create unique index if not exists laboratorios_nome_normalizado_key on laboratorios (nome_normalizado);
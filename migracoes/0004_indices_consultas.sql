@@ -0,0 +1,36 @@
+-- Índices para os filtros usados pelas telas e rotinas. Nos índices compostos as colunas comparadas
+-- por igualdade vêm antes da coluna comparada por intervalo, para que o intervalo seja lido em sequência.
+
+-- Disponibilidade, agenda do espaço e pendentes do administrador:
+-- laboratorio_id = ? and status = ? [and data_agendamento = ? | between ? and ?]
+create index if not exists agendamentos_laboratorio_status_data
+    on agendamentos (laboratorio_id, status, data_agendamento);
+-- Histórico do espaço: laboratorio_id = ? and data_agendamento < ?
+create index if not exists agendamentos_laboratorio_data
+    on agendamentos (laboratorio_id, data_agendamento);
+-- Meus agendamentos e pedido duplicado: usuario_id = ? [and ...] order by data_agendamento
+create index if not exists agendamentos_usuario_data
+    on agendamentos (usuario_id, data_agendamento);
+-- Resumo de pendentes dos administradores: status = 'pendente'
+create index if not exists agendamentos_pendentes_criacao
+    on agendamentos (created_at) where status = 'pendente';
+-- Arquivamento: data_agendamento < ?
+create index if not exists agendamentos_data on agendamentos (data_agendamento);
+-- Sobreposição de aulas: aulas && '{...}'
+create index if not exists agendamentos_aulas on agendamentos using gin (aulas);
+
+-- Disponibilidade e conflitos: laboratorio_id = ? and dia_semana = ? [and período]
+create index if not exists horarios_fixos_laboratorio_dia
+    on horarios_fixos (laboratorio_id, dia_semana, data_inicio);
+create index if not exists horarios_fixos_aulas on horarios_fixos using gin (aulas);
+
+-- Verificação de superadministrador e lista de administradores: tipo_usuario = ?
+create index if not exists users_tipo_usuario on users (tipo_usuario);
+-- Painel do administrador: administrador_id = ?
+create index if not exists laboratorios_administrador on laboratorios (administrador_id);
+
+-- Sincronização incremental do espelho local: updated_at >= ? order by updated_at, id
+create index if not exists users_updated_at on users (updated_at, id);
+create index if not exists laboratorios_updated_at on laboratorios (updated_at, id);
+create index if not exists horarios_fixos_updated_at on horarios_fixos (updated_at, id);
+create index if not exists agendamentos_updated_at on agendamentos (updated_at, id);
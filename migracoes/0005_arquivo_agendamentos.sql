@@ -0,0 +1,4 @@
+-- Tabela de arquivo dos agendamentos antigos (arquivamento.py). Criada depois dos índices para
+-- herdar, com "including all", os mesmos índices, padrões e restrições da tabela principal.
+
+create table if not exists agendamentos_arquivo (like agendamentos including all);
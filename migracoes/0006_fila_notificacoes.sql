@@ -0,0 +1,14 @@
+-- Fila de e-mails agrupados e marcas de controle dos resumos (email_service.py, resumo_notificacoes.py).
+
+create table if not exists emails_pendentes (
+    id bigint generated by default as identity primary key,
+    destinatario text not null,
+    assunto text not null,
+    corpo text not null,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists notificacoes_controle (
+    chave text primary key,
+    valor text
+);
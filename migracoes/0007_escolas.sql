@@ -0,0 +1,45 @@
+-- Várias escolas na mesma implantação. Cada usuário, espaço, horário fixo e agendamento pertence a
+-- uma escola; os dados existentes ficam com a escola que usava o sistema até aqui. Novas escolas são
+-- cadastradas com um insert em `escolas` e acessadas pelo endereço ?escola=<slug> (escolas.py).
+
+create table if not exists escolas (
+    id bigint generated by default as identity primary key,
+    slug text not null unique,
+    nome text not null,
+    created_at timestamptz not null default now()
+);
+
+insert into escolas (slug, nome) values ('mcpf', 'EEEP Professora Maria Célia Pinheiro Falcão')
+    on conflict (slug) do nothing;
+
+alter table users add column if not exists escola_id bigint references escolas (id);
+alter table laboratorios add column if not exists escola_id bigint references escolas (id);
+alter table horarios_fixos add column if not exists escola_id bigint references escolas (id);
+alter table agendamentos add column if not exists escola_id bigint references escolas (id);
+alter table agendamentos_arquivo add column if not exists escola_id bigint references escolas (id);
+
+update users set escola_id = (select id from escolas where slug = 'mcpf') where escola_id is null;
+update laboratorios set escola_id = (select id from escolas where slug = 'mcpf') where escola_id is null;
+update horarios_fixos set escola_id = (select id from escolas where slug = 'mcpf') where escola_id is null;
+update agendamentos set escola_id = (select id from escolas where slug = 'mcpf') where escola_id is null;
+update agendamentos_arquivo set escola_id = (select id from escolas where slug = 'mcpf') where escola_id is null;
+
+alter table users alter column escola_id set not null;
+alter table laboratorios alter column escola_id set not null;
+alter table horarios_fixos alter column escola_id set not null;
+alter table agendamentos alter column escola_id set not null;
+alter table agendamentos_arquivo alter column escola_id set not null;
+
+-- E-mails e nomes de espaços passam a ser únicos dentro de cada escola
+drop index if exists users_email_normalizado_key;
+create unique index if not exists users_escola_email_normalizado_key on users (escola_id, email_normalizado);
+drop index if exists laboratorios_nome_normalizado_key;
+create unique index if not exists laboratorios_escola_nome_normalizado_key on laboratorios (escola_id, nome_normalizado);
+
+-- Consultas que não partem de um espaço ou usuário começam pela escola, para que o custo de cada
+-- escola não dependa de quantas compartilham o banco. As demais já filtram por laboratorio_id ou
+-- usuario_id, que pertencem a uma única escola, e continuam usando os índices de 0004.
+drop index if exists users_tipo_usuario;
+create index if not exists users_escola_tipo_usuario on users (escola_id, tipo_usuario);
+create index if not exists users_escola_email on users (escola_id, email);
+create index if not exists laboratorios_escola on laboratorios (escola_id);
@@ -0,0 +1,26 @@
+-- Tarefas do agendador (agendador.py): expiração de pedidos vencidos e lembretes do dia seguinte.
+
+-- Pedidos pendentes cuja data já passou passam a 'expirado'. A tabela de arquivo foi criada com
+-- "like including all" e tem a mesma restrição, com o mesmo nome.
+alter table agendamentos drop constraint if exists agendamentos_status_check;
+alter table agendamentos add constraint agendamentos_status_check
+    check (status in ('pendente', 'aprovado', 'rejeitado', 'expirado'));
+alter table agendamentos_arquivo drop constraint if exists agendamentos_status_check;
+alter table agendamentos_arquivo add constraint agendamentos_status_check
+    check (status in ('pendente', 'aprovado', 'rejeitado', 'expirado'));
+
+-- Marca de lembrete enviado, para que uma tarefa repetida não envie o mesmo lembrete duas vezes
+alter table agendamentos add column if not exists lembrete_enviado_em timestamptz;
+alter table agendamentos_arquivo add column if not exists lembrete_enviado_em timestamptz;
+
+-- Uma linha por execução de tarefa; a chave primária garante que cada (tarefa, referência) seja
+-- executada uma única vez, mesmo com vários agendadores rodando
+create table if not exists tarefas_agendadas (
+    tarefa text not null,
+    referencia text not null,
+    status text not null default 'executando' check (status in ('executando', 'concluida')),
+    iniciada_em timestamptz not null default now(),
+    concluida_em timestamptz,
+    resultado text,
+    primary key (tarefa, referencia)
+);
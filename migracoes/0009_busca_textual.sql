@@ -0,0 +1,106 @@
+-- Busca textual nas descrições dos agendamentos (inclusive os arquivados) e dos horários fixos
+-- (busca.py). Os índices são de expressão, e não de uma coluna tsvector gerada, porque o
+-- arquivamento e o espelho local copiam as linhas com select * e não poderiam gravar uma coluna gerada.
+
+create extension if not exists pg_trgm;
+
+-- Palavras em português, com radicais (prática, práticas, praticar)
+create index if not exists agendamentos_descricao_busca
+    on agendamentos using gin (to_tsvector('portuguese', coalesce(descricao, '')));
+create index if not exists agendamentos_arquivo_descricao_busca
+    on agendamentos_arquivo using gin (to_tsvector('portuguese', coalesce(descricao, '')));
+create index if not exists horarios_fixos_descricao_busca
+    on horarios_fixos using gin (to_tsvector('portuguese', coalesce(descricao, '')));
+
+-- Trigramas, para termos parciais, sem acento ou com erro de digitação (quimica, quím)
+create index if not exists agendamentos_descricao_trgm
+    on agendamentos using gin (descricao gin_trgm_ops);
+create index if not exists agendamentos_arquivo_descricao_trgm
+    on agendamentos_arquivo using gin (descricao gin_trgm_ops);
+create index if not exists horarios_fixos_descricao_trgm
+    on horarios_fixos using gin (descricao gin_trgm_ops);
+
+-- Retorna uma página dos agendamentos e horários fixos da escola que atendem aos filtros, da maior
+-- para a menor relevância e, em seguida, do mais recente para o mais antigo. Sem termo, retorna só
+-- os filtrados, do mais recente para o mais antigo. Os horários fixos não têm professor e ficam de
+-- fora quando p_usuario_id é informado; entram quando o período deles cruza o período pedido.
+--
+-- Cada parte da consulta é montada só com os filtros informados, para que o planejador use os
+-- índices de cada filtro em vez de um plano genérico com "parâmetro is null or ...".
+create or replace function buscar_agendamentos(
+    p_escola_id bigint,
+    p_termo text default null,
+    p_laboratorio_id bigint default null,
+    p_usuario_id bigint default null,
+    p_data_inicio date default null,
+    p_data_fim date default null,
+    p_limite integer default 20,
+    p_deslocamento integer default 0
+)
+returns table (
+    origem text,
+    id bigint,
+    laboratorio_id bigint,
+    usuario_id bigint,
+    data_inicio date,
+    data_fim date,
+    dia_semana smallint,
+    aulas integer[],
+    descricao text,
+    status text,
+    relevancia real
+)
+language plpgsql stable
+as $$
+declare
+    termo text := nullif(btrim(p_termo), '');
+    texto constant text := 'to_tsvector(''portuguese'', coalesce(descricao, ''''))';
+    filtro_termo text := '';
+    expressao_relevancia text := '0::real';
+    tabela text;
+    filtros_agendamentos text := '';
+    filtros_horarios text := '';
+    partes text[] := array[]::text[];
+begin
+    if termo is not null then
+        filtro_termo := format(' and (%s @@ websearch_to_tsquery(''portuguese'', $2) or $2 <%% descricao)', texto);
+        expressao_relevancia := format('greatest(ts_rank(%s, websearch_to_tsquery(''portuguese'', $2)), word_similarity($2, descricao))::real', texto);
+    end if;
+    if p_laboratorio_id is not null then
+        filtros_agendamentos := filtros_agendamentos || ' and laboratorio_id = $3';
+        filtros_horarios := filtros_horarios || ' and laboratorio_id = $3';
+    end if;
+    if p_usuario_id is not null then
+        filtros_agendamentos := filtros_agendamentos || ' and usuario_id = $4';
+    end if;
+    if p_data_inicio is not null then
+        filtros_agendamentos := filtros_agendamentos || ' and data_agendamento >= $5';
+        filtros_horarios := filtros_horarios || ' and data_fim >= $5';
+    end if;
+    if p_data_fim is not null then
+        filtros_agendamentos := filtros_agendamentos || ' and data_agendamento <= $6';
+        filtros_horarios := filtros_horarios || ' and data_inicio <= $6';
+    end if;
+
+    foreach tabela in array array['agendamentos', 'agendamentos_arquivo'] loop
+        partes := partes || format(
+            'select ''agendamento''::text, id, laboratorio_id, usuario_id, data_agendamento, data_agendamento,'
+            ' null::smallint, aulas, descricao, status, %s from %I where escola_id = $1%s%s',
+            expressao_relevancia, tabela, filtros_agendamentos, filtro_termo
+        );
+    end loop;
+    if p_usuario_id is null then
+        partes := partes || format(
+            'select ''horario_fixo''::text, id, laboratorio_id, null::bigint, data_inicio, data_fim,'
+            ' dia_semana, aulas, descricao, null::text, %s from horarios_fixos where escola_id = $1%s%s',
+            expressao_relevancia, filtros_horarios, filtro_termo
+        );
+    end if;
+
+    return query execute
+        array_to_string(partes, ' union all ')
+        || ' order by 11 desc, 5 desc, 2 desc limit $7 offset $8'
+        using p_escola_id, termo, p_laboratorio_id, p_usuario_id, p_data_inicio, p_data_fim,
+              least(greatest(p_limite, 1), 100), greatest(p_deslocamento, 0);
+end;
+$$;
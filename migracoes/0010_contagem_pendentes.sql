@@ -0,0 +1,12 @@
+-- Total de pedidos pendentes de vários espaços em uma única chamada (resumo_notificacoes.py), pelo
+-- índice agendamentos_laboratorio_status_data.
+
+create or replace function contar_pendentes(p_laboratorio_ids bigint[])
+returns table (laboratorio_id bigint, total bigint)
+language sql stable
+as $$
+    select laboratorio_id, count(*)
+    from agendamentos
+    where status = 'pendente' and laboratorio_id = any(p_laboratorio_ids)
+    group by laboratorio_id
+$$;
@@ -0,0 +1,166 @@
+# migrar.py
+"""
+Migrações versionadas do esquema.
+
+Cada arquivo `migracoes/NNNN_descricao.sql` é aplicado uma única vez, em ordem, dentro de uma
+transação, e registrado na tabela `schema_migracoes`. A conexão vai direto ao Postgres pela
+DATABASE_URL (a string de conexão do projeto no Supabase ou um Postgres local) e usa o pacote
+opcional psycopg, que não faz parte das dependências do aplicativo:
+    pip install "psycopg[binary]"
+
+A verificação de planos executa EXPLAIN de cada consulta frequente do aplicativo com
+`enable_seqscan = off` e falha se alguma ainda precisar ler a tabela inteira, ou seja, se nenhum
+índice atende ao filtro. Com o planejador proibido de escolher Seq Scan quando há um índice
+utilizável, o resultado não depende da quantidade de dados do banco local. Sem Seq Scan, o planejador
+pode percorrer um índice inteiro (por exemplo o da chave primária, por causa de um ORDER BY id) e
+aplicar o filtro linha a linha; varreduras de índice com `Filter` e sem `Index Cond` também falham.
+
+Uso:
+    python migrar.py                     # aplica as migrações pendentes
+    python migrar.py --status            # lista as migrações aplicadas e pendentes
+    python migrar.py --verificar-planos  # código de saída 1 se alguma consulta ler a tabela inteira
+"""
+import argparse
+import logging
+import os
+import sys
+
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migracoes')
+
+# Consultas frequentes do aplicativo, com valores de exemplo no lugar dos parâmetros. Os filtros são os
+# mesmos das chamadas no código (inclusive escola_id nas telas); as tarefas do agendador percorrem
+# todas as escolas e não filtram por escola.
+CONSULTAS_FREQUENTES = {
+    'disponibilidade': "select * from agendamentos where escola_id = 1 and laboratorio_id = 1 and data_agendamento = '2025-03-10' and status = 'aprovado'",
+    'agenda do espaço': "select * from agendamentos where escola_id = 1 and laboratorio_id = 1 and data_agendamento between '2025-03-10' and '2025-03-17' and status = 'aprovado'",
+    'pendentes do espaço': "select * from agendamentos where escola_id = 1 and laboratorio_id = 1 and status = 'pendente'",
+    'contagem de pendentes': "select laboratorio_id, count(*) from agendamentos where status = 'pendente' and laboratorio_id = any('{1,2,3}') group by laboratorio_id",
+    'histórico do espaço': "select * from agendamentos where escola_id = 1 and laboratorio_id = 1 and data_agendamento < '2025-03-10'",
+    'histórico arquivado': "select * from agendamentos_arquivo where escola_id = 1 and laboratorio_id = 1 and data_agendamento < '2025-03-10'",
+    'meus agendamentos': "select * from agendamentos where escola_id = 1 and usuario_id = 1 order by data_agendamento",
+    'pedido duplicado': "select * from agendamentos where escola_id = 1 and usuario_id = 1 and laboratorio_id = 1 and data_agendamento = '2025-03-10' and aulas = '{1,2}' and status = 'pendente'",
+    'sobreposição de aulas': "select id from agendamentos where escola_id = 1 and laboratorio_id = 1 and aulas && '{1,2}'",
+    'resumo de pendentes': "select * from agendamentos where status = 'pendente' and created_at > '2025-03-10T08:00:00+00:00'",
+    'arquivamento': "select * from agendamentos where data_agendamento < '2024-03-10' order by id limit 1000",
+    'horários fixos do dia': "select * from horarios_fixos where escola_id = 1 and laboratorio_id = 1 and dia_semana = 0",
+    'horários fixos do espaço': "select * from horarios_fixos where escola_id = 1 and laboratorio_id = 1",
+    'conflitos de horário fixo': "select * from horarios_fixos where escola_id = 1 and laboratorio_id = 1 and dia_semana = 0 and data_inicio <= '2025-06-30' and data_fim >= '2025-03-10'",
+    'conflitos com agendamentos': "select * from agendamentos where escola_id = 1 and laboratorio_id = 1 and status = 'aprovado' and data_agendamento between '2025-03-10' and '2025-06-30'",
+    'login': "select * from users where escola_id = 1 and email_normalizado = 'professor@escola.ce.gov.br' limit 1",
+    'superadministrador': "select id from users where escola_id = 1 and tipo_usuario = 'superadmin' limit 1",
+    'administradores da escola': "select id, name, email from users where escola_id = 1 and tipo_usuario = 'admlab'",
+    'espaços da escola': "select id, nome from laboratorios where escola_id = 1",
+    'laboratórios do administrador': "select * from laboratorios where escola_id = 1 and administrador_id = 1",
+    'expiração de pendentes': "select id from agendamentos where status = 'pendente' and data_agendamento < '2025-03-10'",
+    'lembretes do dia seguinte': "select * from agendamentos where data_agendamento = '2025-03-11' and status = 'aprovado' and lembrete_enviado_em is null",
+    'reserva de tarefa': "select * from tarefas_agendadas where tarefa = 'lembretes' and referencia = '2025-03-10T00:00'",
+    'busca textual': "select id from agendamentos where escola_id = 1 and (to_tsvector('portuguese', coalesce(descricao, '')) @@ websearch_to_tsquery('portuguese', 'prática química') or 'prática química' <% descricao)",
+    'busca textual arquivada': "select id from agendamentos_arquivo where escola_id = 1 and (to_tsvector('portuguese', coalesce(descricao, '')) @@ websearch_to_tsquery('portuguese', 'prática química') or 'prática química' <% descricao)",
+    'busca por trigramas': "select id from horarios_fixos where escola_id = 1 and (to_tsvector('portuguese', coalesce(descricao, '')) @@ websearch_to_tsquery('portuguese', 'quimica') or 'quimica' <% descricao)",
+    'relatório em lotes': "select * from agendamentos where escola_id = 1 and id > 1000 and data_agendamento between '2025-01-01' and '2025-06-30' and status in ('aprovado') order by id limit 1000",
+    'relatório em lotes arquivado': "select * from agendamentos_arquivo where escola_id = 1 and id > 1000 and data_agendamento between '2025-01-01' and '2025-06-30' and status in ('aprovado') order by id limit 1000",
+    'espelho local': "select * from agendamentos where updated_at >= '2025-03-10T07:59:00+00:00' order by updated_at, id limit 1000",
+    'espelho local, página seguinte': "select * from agendamentos where (updated_at > '2025-03-10T08:00:00+00:00' or (updated_at = '2025-03-10T08:00:00+00:00' and id > 1000)) order by updated_at, id limit 1000",
+    'reconciliação do espelho': "select id from agendamentos where id > 1000 order by id limit 1000",
+}
+
+
+def conectar(url=None):
+    try:
+        import psycopg
+    except ImportError:
+        raise SystemExit('O pacote psycopg é necessário para as migrações: pip install "psycopg[binary]"')
+    url = url or os.getenv('DATABASE_URL')
+    if not url:
+        raise SystemExit('Defina DATABASE_URL com a string de conexão do Postgres.')
+    # Em autocommit cada bloco `transaction()` é uma transação própria, confirmada ao terminar
+    return psycopg.connect(url, autocommit=True)
+
+
+def listar_migracoes():
+    return sorted(nome for nome in os.listdir(DIRETORIO_MIGRACOES) if nome.endswith('.sql'))
+
+
+def migracoes_aplicadas(conexao):
+    with conexao.transaction():
+        conexao.execute('create table if not exists schema_migracoes (versao text primary key, aplicada_em timestamptz not null default now())')
+    return {linha[0] for linha in conexao.execute('select versao from schema_migracoes').fetchall()}
+
+
+def aplicar_migracoes(conexao):
+    # Aplica as migrações pendentes em ordem e retorna os nomes aplicados
+    aplicadas = migracoes_aplicadas(conexao)
+    novas = []
+    for nome in listar_migracoes():
+        if nome in aplicadas:
+            continue
+        with open(os.path.join(DIRETORIO_MIGRACOES, nome), encoding='utf-8') as arquivo:
+            sql = arquivo.read()
+        with conexao.transaction():
+            conexao.execute(sql)
+            conexao.execute('insert into schema_migracoes (versao) values (%s)', (nome,))
+        logging.info(f"Migração aplicada: {nome}")
+        novas.append(nome)
+    return novas
+
+
+VARREDURAS_INDICE = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+
+
+def _leituras_completas(no):
+    # Percorre o plano em JSON e retorna as leituras da tabela inteira: Seq Scan e varreduras de
+    # índice que só filtram (Filter sem Index Cond)
+    tipo = no.get('Node Type')
+    leituras = []
+    if tipo == 'Seq Scan':
+        leituras.append(f"Seq Scan em {no['Relation Name']}")
+    elif tipo in VARREDURAS_INDICE and 'Filter' in no and 'Index Cond' not in no:
+        leituras.append(f"{tipo} sem condição em {no.get('Relation Name', no.get('Index Name'))} ({no.get('Index Name')})")
+    for filho in no.get('Plans', []):
+        leituras.extend(_leituras_completas(filho))
+    return leituras
+
+
+def verificar_planos(conexao, consultas=CONSULTAS_FREQUENTES):
+    """
+    Retorna {consulta: [leituras da tabela inteira]} para as consultas sem índice utilizável.
+    """
+    falhas = {}
+    with conexao.transaction():
+        conexao.execute('set local enable_seqscan = off')
+        for nome, sql in consultas.items():
+            plano = conexao.execute(f'explain (format json) {sql}').fetchone()[0][0]['Plan']
+            leituras = _leituras_completas(plano)
+            if leituras:
+                falhas[nome] = leituras
+    return falhas
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Migrações versionadas do esquema do AgendaMCPF.')
+    parser.add_argument('--database-url', help='String de conexão (padrão: variável DATABASE_URL)')
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--status', action='store_true', help='Lista as migrações aplicadas e pendentes')
+    grupo.add_argument('--verificar-planos', action='store_true', help='Falha se alguma consulta frequente ler a tabela inteira')
+    args = parser.parse_args(argv)
+
+    with conectar(args.database_url) as conexao:
+        if args.status:
+            aplicadas = migracoes_aplicadas(conexao)
+            for nome in listar_migracoes():
+                print(f"{'aplicada' if nome in aplicadas else 'pendente':<9} {nome}")
+            return 0
+        if args.verificar_planos:
+            falhas = verificar_planos(conexao)
+            for nome, leituras in falhas.items():
+                print(f"{'; '.join(leituras)}: {nome}")
+            print(f"{len(CONSULTAS_FREQUENTES) - len(falhas)} de {len(CONSULTAS_FREQUENTES)} consultas usam índice.")
+            return 1 if falhas else 0
+        novas = aplicar_migracoes(conexao)
+        print(f"{len(novas)} migração(ões) aplicada(s).")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+# orcamento_consultas.py
+"""
+Orçamento de consultas ao Supabase por fluxo de uso.
+
+Executa cada fluxo dos painéis (login, agendar, agenda, aprovar, histórico, listas do
+superadministrador) com o AppTest do Streamlit contra o substituto local (supabase_local.py), com
+dados semeados em vários tamanhos. Conta as idas ao Supabase de cada etapa e falha quando uma etapa:
+- passa do orçamento declarado em ORCAMENTO, ou
+- faz mais consultas com mais dados do que com o menor tamanho. Uma consulta por linha (N+1) aparece
+  assim mesmo que ainda caiba no orçamento.
+
+As etapas que gravam (agendar, aprovar) conferem a mensagem de sucesso e a linha no banco: uma etapa
+que para em um aviso de conflito não mede o caminho de gravação, e falha.
+
+Nas falhas, as chamadas da etapa são listadas por origem, ou seja, pela linha do código que montou
+cada consulta (ver ClienteResiliente.registrar_origens em resiliencia.py).
+
+Cada tamanho roda em um processo próprio, para que o cache compartilhado e o cache do Streamlit de um
+tamanho não sirvam o seguinte.
+
+Uso:
+    python orcamento_consultas.py                    # código de saída 1 se alguma etapa estourar
+    python orcamento_consultas.py --tamanhos pequeno grande --detalhar
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+# O substituto local precisa estar ativo antes de qualquer import de database.py
+os.environ['SUPABASE_LOCAL'] = '1'
+os.environ['SMTP_SERVER'] = ''
+
+# Etapa: máximo de idas ao Supabase, igual para todos os tamanhos. Os valores são os atuais: uma
+# consulta nova em um fluxo exige aumentar o orçamento no mesmo commit, de propósito.
+ORCAMENTO = {
+    'login do professor': 5,
+    'agendar': 6,
+    'agenda': 3,
+    'reexecução do professor': 0,
+    'login do administrador': 8,
+    'aprovar': 3,
+    'histórico': 6,
+    'busca': 1,
+    'reexecução do administrador': 0,
+    'login do superadministrador': 6,
+}
+
+# Tamanho: (espaços, professores, agendamentos por espaço, agendamentos arquivados por espaço, horários fixos por espaço)
+TAMANHOS = {
+    'pequeno': (2, 3, 10, 5, 2),
+    'medio': (5, 30, 200, 100, 10),
+    'grande': (12, 150, 1500, 1000, 40),
+}
+
+
+def semear(cliente, tamanho, rounds_bcrypt):
+    import teste_carga
+    laboratorios, professores, agendamentos, arquivados, horarios = TAMANHOS[tamanho]
+    teste_carga.semear_dados(cliente, professores, laboratorios, rounds_bcrypt)
+    escola_id = cliente._tabelas['escolas'][0]['id']
+    usuarios = [usuario['id'] for usuario in cliente._tabelas['users'] if usuario['tipo_usuario'] == 'professor']
+    hoje = date.today()
+    # Agendamentos e horários fixos ocupam só as aulas 1 a 8: a aula 9 fica livre em todas as datas,
+    # para que o fluxo de agendar chegue à gravação em vez de parar no aviso de conflito
+    for lab in [lab['id'] for lab in cliente._tabelas['laboratorios']]:
+        # Metade no passado (histórico), metade no futuro; no futuro, um terço ainda pendente
+        cliente.semear('agendamentos', [
+            {
+                'usuario_id': usuarios[i % len(usuarios)], 'laboratorio_id': lab, 'escola_id': escola_id,
+                'data_agendamento': (hoje + timedelta(days=i // 9 - agendamentos // 18)).isoformat(),
+                'aulas': [1 + i % 8], 'descricao': f'Atividade {i} de química',
+                'status': 'pendente' if i % 3 == 0 and i // 9 >= agendamentos // 18 else 'aprovado',
+            }
+            for i in range(agendamentos)
+        ])
+        cliente.semear('agendamentos_arquivo', [
+            {
+                'usuario_id': usuarios[i % len(usuarios)], 'laboratorio_id': lab, 'escola_id': escola_id,
+                'data_agendamento': (hoje - timedelta(days=400 + i)).isoformat(),
+                'aulas': [1 + i % 8], 'descricao': f'Atividade arquivada {i}', 'status': 'aprovado',
+            }
+            for i in range(arquivados)
+        ])
+        cliente.semear('horarios_fixos', [
+            {
+                'laboratorio_id': lab, 'escola_id': escola_id, 'dia_semana': i % 5, 'aulas': [1 + i % 8],
+                'data_inicio': (hoje - timedelta(days=30)).isoformat(), 'data_fim': (hoje + timedelta(days=150)).isoformat(),
+                'descricao': f'Horário fixo {i}',
+            }
+            for i in range(horarios)
+        ])
+
+
+def fluxos(etapa):
+    """
+    Executa os fluxos em ordem, chamando `etapa(nome, funcao)` para cada etapa medida.
+    """
+    from database import supabase
+    from teste_carga import botao, login, nova_sessao, Medicoes
+    medicoes = Medicoes()
+    agendamentos = supabase.cliente._tabelas['agendamentos']
+
+    def executar(app):
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+
+    def exigir_sucesso(app, texto):
+        # Uma etapa que termina em aviso ou erro não passou pelo caminho medido
+        if not any(texto in mensagem.value for mensagem in app.success):
+            avisos = [mensagem.value for mensagem in [*app.error, *app.warning]]
+            raise RuntimeError(f"mensagem de sucesso ausente ({texto}); avisos: {avisos}")
+
+    professor = nova_sessao(120)
+    etapa('login do professor', lambda: login(professor, 'professor0@carga.local', medicoes))
+
+    def agendar():
+        professor.multiselect(key='agendar_aulas').set_value([9])
+        professor.text_input(key='agendar_descricao').input('Atividade do orçamento')
+        botao(professor, 'Confirmar Agendamento').click()
+        executar(professor)
+        exigir_sucesso(professor, 'Agendamento solicitado com sucesso')
+        if not any(linha['descricao'] == 'Atividade do orçamento' and linha['status'] == 'pendente' for linha in agendamentos):
+            raise RuntimeError("o agendamento não foi gravado")
+    etapa('agendar', agendar)
+
+    def agenda():
+        botao(professor, 'Consultar Agenda').click()
+        executar(professor)
+    etapa('agenda', agenda)
+    etapa('reexecução do professor', lambda: executar(professor))
+
+    administrador = nova_sessao(120)
+    etapa('login do administrador', lambda: login(administrador, 'admin0@carga.local', medicoes))
+
+    def aprovar():
+        pendentes = 0
+        for tabela in administrador.dataframe:
+            if tabela.key and tabela.key.startswith('pendentes_'):
+                administrador.session_state[tabela.key] = {'selection': {'rows': list(range(len(tabela.value))), 'columns': []}}
+                pendentes += len(tabela.value)
+        if not pendentes:
+            raise RuntimeError("nenhum agendamento pendente para aprovar")
+        executar(administrador)
+        botao(administrador, 'Aprovar').click()
+        executar(administrador)
+        exigir_sucesso(administrador, f'{pendentes} agendamento(s) aprovado(s)')
+        if not any(linha['descricao'] == 'Atividade do orçamento' and linha['status'] == 'aprovado' for linha in agendamentos):
+            raise RuntimeError("o agendamento do professor não foi aprovado")
+    etapa('aprovar', aprovar)
+
+    def historico():
+        # Descarta os dados da sessão: pendentes, horários fixos e histórico são lidos de novo
+        botao(administrador, 'Atualizar dados').click()
+        executar(administrador)
+    etapa('histórico', historico)
+
+    def busca():
+        termo = next(campo for campo in administrador.text_input if campo.key and campo.key.endswith('_termo'))
+        termo.input('química')
+        executar(administrador)
+    etapa('busca', busca)
+    etapa('reexecução do administrador', lambda: executar(administrador))
+
+    superadministrador = nova_sessao(120)
+    etapa('login do superadministrador', lambda: login(superadministrador, 'superadmin@carga.local', medicoes))
+
+
+def medir(tamanho, rounds_bcrypt):
+    """
+    Semeia os dados de `tamanho`, executa os fluxos e retorna
+    {etapa: {'total': n, 'origens': [[origem, consulta, n], ...], 'erro': mensagem ou None}}.
+    """
+    from database import supabase
+    semear(supabase.cliente, tamanho, rounds_bcrypt)
+    medidas = {}
+
+    def etapa(nome, funcao):
+        supabase.registrar_origens()
+        supabase.cliente.zerar_contadores()
+        try:
+            funcao()
+            erro = None
+        except Exception as e:
+            erro = str(e) or type(e).__name__
+        origens = sorted(([origem, consulta, n] for (origem, consulta), n in supabase.origens.items()), key=lambda item: -item[2])
+        medidas[nome] = {'total': supabase.cliente.total_consultas, 'origens': origens, 'erro': erro}
+
+    fluxos(etapa)
+    return medidas
+
+
+def medir_em_processo(tamanho, rounds_bcrypt):
+    processo = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--medir', tamanho, '--rounds-bcrypt', str(rounds_bcrypt)],
+        capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise SystemExit(f"Falha ao medir o tamanho {tamanho}:\n{processo.stderr[-4000:]}")
+    return json.loads(processo.stdout.splitlines()[-1])
+
+
+def verificar(resultados):
+    """
+    Retorna [(etapa, tamanho, motivo)] das etapas que estouraram o orçamento ou cresceram com os dados.
+
+    O crescimento é medido por origem: uma linha que monta a mesma consulta mais de uma vez, e mais
+    vezes do que com o menor tamanho, está consultando por linha. Uma origem que aparece uma única
+    vez só em um dos tamanhos é um acerto ou uma falta do cache compartilhado, e não conta.
+    """
+    falhas = []
+    menor = next(iter(resultados))
+    for etapa, limite in ORCAMENTO.items():
+        base = {(origem, consulta): n for origem, consulta, n in resultados[menor].get(etapa, {}).get('origens', [])}
+        for tamanho, medidas in resultados.items():
+            medida = medidas.get(etapa)
+            if medida is None or medida['erro']:
+                falhas.append((etapa, tamanho, f"a etapa falhou: {medida['erro'] if medida else 'não executada'}"))
+                continue
+            if medida['total'] > limite:
+                falhas.append((etapa, tamanho, f"{medida['total']} consultas, orçamento de {limite}"))
+            for origem, consulta, n in medida['origens']:
+                if n > max(1, base.get((origem, consulta), 0)):
+                    falhas.append((etapa, tamanho, f"{consulta} em {origem} executada {n} vezes, "
+                                                   f"contra {base.get((origem, consulta), 0)} com o tamanho {menor}"))
+    return falhas
+
+
+def imprimir_origens(medida):
+    for origem, consulta, n in medida['origens']:
+        print(f"    {n:>4}  {consulta:<32} {origem}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Verifica o orçamento de consultas ao Supabase de cada fluxo.')
+    parser.add_argument('--tamanhos', nargs='+', choices=list(TAMANHOS), default=list(TAMANHOS),
+                        help='Tamanhos dos dados semeados')
+    parser.add_argument('--rounds-bcrypt', type=int, default=4, help='Custo do bcrypt das senhas semeadas')
+    parser.add_argument('--detalhar', action='store_true', help='Lista as consultas por origem de todas as etapas')
+    parser.add_argument('--json', metavar='ARQUIVO', help='Grava as medidas em JSON')
+    parser.add_argument('--medir', choices=list(TAMANHOS), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.medir:
+        # Processo filho: mede um tamanho e devolve o resultado na última linha da saída
+        print(json.dumps(medir(args.medir, args.rounds_bcrypt), ensure_ascii=False))
+        return 0
+
+    inicio = time.perf_counter()
+    # Do menor para o maior, qualquer que seja a ordem pedida: o primeiro é a base do crescimento
+    tamanhos = [tamanho for tamanho in TAMANHOS if tamanho in args.tamanhos]
+    resultados = {tamanho: medir_em_processo(tamanho, args.rounds_bcrypt) for tamanho in tamanhos}
+    falhas = verificar(resultados)
+
+    print(f"{'Etapa':<30} {'orçamento':>9} " + ' '.join(f'{tamanho:>8}' for tamanho in resultados))
+    for etapa, limite in ORCAMENTO.items():
+        totais = ' '.join(f"{resultados[tamanho].get(etapa, {}).get('total', '-'):>8}" for tamanho in resultados)
+        marca = ' ✗' if any(falha[0] == etapa for falha in falhas) else ''
+        print(f"{etapa:<30} {limite:>9} {totais}{marca}")
+        if args.detalhar:
+            imprimir_origens(resultados[tamanhos[-1]][etapa])
+
+    estouros = {}
+    for etapa, tamanho, motivo in falhas:
+        estouros.setdefault((etapa, tamanho), []).append(motivo)
+    for (etapa, tamanho), motivos in estouros.items():
+        print(f"\nEstouro em '{etapa}' ({tamanho}):")
+        for motivo in motivos:
+            print(f"  {motivo}")
+        imprimir_origens(resultados[tamanho][etapa])
+    print(f"\n{len(ORCAMENTO) * len(resultados) - len(estouros)} de {len(ORCAMENTO) * len(resultados)} medidas dentro do orçamento "
+          f"({time.perf_counter() - inicio:.1f} s).")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump({'orcamento': ORCAMENTO, 'resultados': resultados, 'falhas': falhas}, arquivo, ensure_ascii=False, indent=2)
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# perfilamento.py
+"""
+Perfilamento de CPU sob demanda das execuções dos painéis.
+
+Com PERFILAMENTO=1 todas as sessões são perfiladas; sem ele, só as sessões dos usuários marcados
+pelo superadministrador na aba "Diagnóstico" (a marcação vale para todas as réplicas, ver
+cache_compartilhado.py). Cada execução perfilada do painel gera, em PERFILAMENTO_DIRETORIO, dois
+arquivos com o nome do painel e o instante:
+
+- `<painel>_<instante>.pstats`: perfil determinístico do cProfile, para `python -m pstats` ou snakeviz;
+- `<painel>_<instante>.collapsed`: pilhas amostradas a cada PERFILAMENTO_INTERVALO_MS no formato
+  "quadro;quadro;quadro contagem", aceito por flamegraph.pl e speedscope.
+
+A amostragem mostra também o tempo parado em rede (por exemplo esperando `carregar` ou o Supabase),
+que o cProfile só registra como tempo da chamada. As consultas executadas no pool de carregamento.py
+rodam em outras threads e aparecem como espera dentro de `carregar`.
+"""
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from cache_compartilhado import ler_estado, gravar_estado
+
+PERFILAMENTO_GLOBAL = os.getenv('PERFILAMENTO', '') not in ('', '0')
+DIRETORIO = os.getenv('PERFILAMENTO_DIRETORIO', 'perfis')
+INTERVALO_AMOSTRAGEM_S = float(os.getenv('PERFILAMENTO_INTERVALO_MS', 5)) / 1000
+
+def usuarios_perfilados():
+    # E-mails cujas sessões são perfiladas, marcados pelo superadministrador
+    return ler_estado('usuarios_perfilados', set())
+
+
+def definir_usuarios_perfilados(emails):
+    gravar_estado('usuarios_perfilados', set(emails))
+
+
+def deve_perfilar(email):
+    return PERFILAMENTO_GLOBAL or email in usuarios_perfilados()
+
+
+def _rotulo(frame):
+    codigo = frame.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+class Amostrador(threading.Thread):
+    """
+    Registra periodicamente a pilha de chamadas de uma thread e conta quantas vezes cada pilha apareceu.
+    """
+
+    def __init__(self, id_thread, intervalo=INTERVALO_AMOSTRAGEM_S):
+        super().__init__(name='perfilamento', daemon=True)
+        self.id_thread = id_thread
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.id_thread)
+            pilha = []
+            while frame is not None:
+                pilha.append(_rotulo(frame))
+                frame = frame.f_back
+            if pilha:
+                self.pilhas[';'.join(reversed(pilha))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+def _gravar(nome, perfil, pilhas):
+    os.makedirs(DIRETORIO, exist_ok=True)
+    base = os.path.join(DIRETORIO, f"{nome}_{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}")
+    if perfil is not None:
+        perfil.dump_stats(f'{base}.pstats')
+    with open(f'{base}.collapsed', 'w', encoding='utf-8') as arquivo:
+        for pilha, contagem in pilhas.most_common():
+            arquivo.write(f'{pilha} {contagem}\n')
+    return base
+
+
+@contextmanager
+def perfilar(nome):
+    """
+    Perfila o bloco (uma execução do painel `nome`) e grava os arquivos ao final, mesmo que o bloco
+    termine com st.rerun() ou com erro.
+    """
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Só um cProfile pode estar ativo por vez; com outra sessão sendo perfilada, fica só a amostragem
+        perfil = None
+    amostrador = Amostrador(threading.get_ident())
+    amostrador.start()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if perfil is not None:
+            perfil.disable()
+        amostrador.parar()
+        duracao_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        try:
+            base = _gravar(nome, perfil, amostrador.pilhas)
+            logging.info(f"Perfil de {nome} ({duracao_ms} ms) gravado em {base}.pstats/.collapsed")
+        except OSError as e:
+            logging.error(f"Erro ao gravar o perfil de {nome}: {e}")
@@ -1,80 +1,139 @@
-from email_service import send_email  # Importe o módulo de e-mail
+from email_service import notify  # Importe o módulo de e-mail
 from database import supabase
+from espelho_local import leitura, registrar
+from carregamento import carregar, mapa_usuarios
+from escolas import cabecalho_escola, escola_id
+from estado_sessao import estado_sessao
+from cache_compartilhado import obter
+from dados_sessao import carregar_sessao, aplicar, atualizar_linhas
 import streamlit as st
 from datetime import date, datetime, timedelta
-import pandas as pd
+from functools import partial
+from busca import exibir_busca
 
 def painel_professor():
     st.title("🦉AgendaMCPF")  # Título do sistema
     st.subheader("Painel de Administração do Professor")
-    st.write("**EEEP Professora Maria Célia Pinheiro Falcão**")
+    cabecalho_escola()
     st.markdown("---")  # Linha separadora para organizar o layout
 
-    tab1, tab2, tab3 = st.tabs(["Agendar Espaço", "Meus Agendamentos", "Agenda dos Espaços"])
+    # As consultas das abas são independentes e rodam ao mesmo tempo (ver carregamento.py); os
+    # resultados ficam na sessão até uma gravação nas suas etiquetas (ver dados_sessao.py)
+    usuario_id = estado_sessao().usuario_id
+    dados = carregar_sessao({
+        'laboratorios': ([f'laboratorios:{escola_id()}'], partial(buscar_laboratorios, escola_id())),
+        'meus_agendamentos': (
+            [f'agendamentos_usuario:{usuario_id}', f'laboratorios:{escola_id()}'],
+            partial(buscar_agendamentos_professor, usuario_id, escola_id())
+        ),
+    })
+
+    tab1, tab2, tab3, tab4 = st.tabs(["Agendar Espaço", "Meus Agendamentos", "Agenda dos Espaços", "Buscar"])
 
     with tab1:
-        agendar_laboratorio()
+        agendar_laboratorio(dados)
 
     with tab2:
-        listar_agendamentos_professor()
+        listar_agendamentos_professor(dados)
 
     with tab3:
-        visualizar_agenda_laboratorio()
+        visualizar_agenda_laboratorio(dados)
+
+    with tab4:
+        buscar_meus_agendamentos(dados, usuario_id)
+
+def buscar_meus_agendamentos(dados, usuario_id):
+    st.subheader("Buscar nos Meus Agendamentos")
+    try:
+        # Busca paginada no servidor, inclusive nos agendamentos arquivados (ver busca.py)
+        exibir_busca('busca_professor', escola_id(), dados['laboratorios'], usuario_id=usuario_id)
+    except Exception as e:
+        st.error(f'Erro ao carregar a busca: {e}')
 
-def agendar_laboratorio():
+def buscar_laboratorios(escola_id):
+    # Dado de referência compartilhado entre as réplicas (ver cache_compartilhado.py)
+    return obter(
+        f'laboratorios:{escola_id}', [f'laboratorios:{escola_id}'],
+        lambda: supabase.table('laboratorios').select('id', 'nome').eq('escola_id', escola_id).execute().data
+    )
+
+def buscar_agendamentos_professor(usuario_id, escola_id):
+    return leitura().table('agendamentos').select('*').eq('escola_id', escola_id).eq('usuario_id', usuario_id).order('data_agendamento', desc=False).execute().data
+
+def agendar_laboratorio(dados):
     st.subheader("Agendar um Espaço")
     try:
         # Obter laboratórios disponíveis
-        response = supabase.table('laboratorios').select('id', 'nome').execute()
-        laboratorios = response.data
+        laboratorios = dados['laboratorios']
         if not laboratorios:
             st.error('Nenhum espaço disponível.')
             return
 
         lab_options = {lab['nome']: lab['id'] for lab in laboratorios}
-        lab_nome = st.selectbox("Escolha o Espaço", options=list(lab_options.keys()))
-        laboratorio_id = lab_options[lab_nome]
+        st.selectbox("Escolha o Espaço", options=list(lab_options.keys()), key='agendar_espaco')
 
-        data_agendamento = st.date_input("Data do Agendamento", min_value=date.today())
+        st.date_input("Data do Agendamento", min_value=date.today(), key='agendar_data')
         aulas_opcoes = list(range(1, 10))  # Aulas de 1 a 9
-        aulas_selecionadas = st.multiselect("Selecione a(s) aula(s) para agendamento", aulas_opcoes)
+        st.multiselect("Selecione a(s) aula(s) para agendamento", aulas_opcoes, key='agendar_aulas')
 
         # Campo para descrição da atividade
-        descricao = st.text_input("Descrição da Atividade", help="Insira uma breve descrição da atividade a ser realizada")
+        st.text_input("Descrição da Atividade", help="Insira uma breve descrição da atividade a ser realizada", key='agendar_descricao')
+
+        # O pedido é gravado em um callback, antes da próxima execução, que já o mostra em "Meus Agendamentos"
+        st.button("Confirmar Agendamento", on_click=solicitar_agendamento, args=(lab_options,))
+    except Exception as e:
+        st.error(f'Erro ao agendar espaço: {e}')
 
-        if st.button("Confirmar Agendamento"):
-            if len(aulas_selecionadas) < 1:
-                st.warning("Por favor, selecione pelo menos uma aula para agendamento.")
-            elif descricao.strip() == '':
-                st.warning("Por favor, coloque uma descrição da atividade a ser feita no laboratório.")
+def solicitar_agendamento(lab_options):
+    try:
+        laboratorio_id = lab_options[st.session_state['agendar_espaco']]
+        data_agendamento = st.session_state['agendar_data']
+        aulas_selecionadas = st.session_state['agendar_aulas']
+        descricao = st.session_state['agendar_descricao']
+        if len(aulas_selecionadas) < 1:
+            st.warning("Por favor, selecione pelo menos uma aula para agendamento.")
+        elif descricao.strip() == '':
+            st.warning("Por favor, coloque uma descrição da atividade a ser feita no laboratório.")
+        else:
+            conflito, aulas_conflito = verificar_disponibilidade(laboratorio_id, data_agendamento, aulas_selecionadas)
+            if not conflito:
+                confirmar_agendamento_professor(laboratorio_id, data_agendamento, aulas_selecionadas, descricao)
             else:
-                conflito, aulas_conflito = verificar_disponibilidade(laboratorio_id, data_agendamento, aulas_selecionadas)
-                if not conflito:
-                    confirmar_agendamento_professor(laboratorio_id, data_agendamento, aulas_selecionadas, descricao)
-                else:
-                    aulas_conflito_str = ', '.join([f"{aula}ª Aula" for aula in aulas_conflito])
-                    st.error(f'O espaço não está disponível nas seguintes aulas: {aulas_conflito_str}')
+                aulas_conflito_str = ', '.join([f"{aula}ª Aula" for aula in aulas_conflito])
+                st.error(f'O espaço não está disponível nas seguintes aulas: {aulas_conflito_str}')
     except Exception as e:
         st.error(f'Erro ao agendar espaço: {e}')
 
+def aulas_ocupadas(laboratorio_id, data_agendamento, escola_id):
+    # Máscara de disponibilidade do dia: aulas ocupadas por horários fixos e agendamentos aprovados.
+    # Sem a última resposta boa (resiliencia.py): a verificação antecede uma gravação
+    aulas_indisponiveis = set()
+    dia_semana = data_agendamento.weekday()  # 0 (Segunda-feira) a 6 (Domingo)
+    response_horarios_fixos = supabase.table('horarios_fixos', guardar=False).select('*').eq('escola_id', escola_id).eq('laboratorio_id', laboratorio_id).eq('dia_semana', dia_semana).execute()
+    horarios_fixos = response_horarios_fixos.data
+    for horario_fixo in horarios_fixos:
+        data_inicio = datetime.strptime(horario_fixo['data_inicio'], '%Y-%m-%d').date()
+        data_fim = datetime.strptime(horario_fixo['data_fim'], '%Y-%m-%d').date()
+        if data_inicio <= data_agendamento <= data_fim:
+            aulas_fixas = horario_fixo['aulas']
+            aulas_indisponiveis.update(aulas_fixas)
+
+    response_agendamentos = supabase.table('agendamentos', guardar=False).select('*').eq('escola_id', escola_id).eq('laboratorio_id', laboratorio_id).eq('data_agendamento', data_agendamento.isoformat()).eq('status', 'aprovado').execute()
+    agendamentos_existentes = response_agendamentos.data
+    for agendamento in agendamentos_existentes:
+        aulas_agendadas = agendamento['aulas']
+        aulas_indisponiveis.update(aulas_agendadas)
+    return aulas_indisponiveis
+
 def verificar_disponibilidade(laboratorio_id, data_agendamento, aulas_numeros):
     try:
-        aulas_indisponiveis = set()
-        dia_semana = data_agendamento.weekday()  # 0 (Segunda-feira) a 6 (Domingo)
-        response_horarios_fixos = supabase.table('horarios_fixos').select('*').eq('laboratorio_id', laboratorio_id).eq('dia_semana', dia_semana).execute()
-        horarios_fixos = response_horarios_fixos.data
-        for horario_fixo in horarios_fixos:
-            data_inicio = datetime.strptime(horario_fixo['data_inicio'], '%Y-%m-%d').date()
-            data_fim = datetime.strptime(horario_fixo['data_fim'], '%Y-%m-%d').date()
-            if data_inicio <= data_agendamento <= data_fim:
-                aulas_fixas = horario_fixo['aulas']
-                aulas_indisponiveis.update(aulas_fixas)
-
-        response_agendamentos = supabase.table('agendamentos').select('*').eq('laboratorio_id', laboratorio_id).eq('data_agendamento', data_agendamento.isoformat()).eq('status', 'aprovado').execute()
-        agendamentos_existentes = response_agendamentos.data
-        for agendamento in agendamentos_existentes:
-            aulas_agendadas = agendamento['aulas']
-            aulas_indisponiveis.update(aulas_agendadas)
+        # Toda gravação que muda a ocupação do espaço invalida a etiqueta agenda:<laboratorio_id>; a
+        # exclusão de um usuário, que remove os agendamentos dele, invalida usuarios:<escola_id>
+        aulas_indisponiveis = obter(
+            f'disponibilidade:{escola_id()}:{laboratorio_id}:{data_agendamento.isoformat()}',
+            [f'agenda:{laboratorio_id}', f'usuarios:{escola_id()}'],
+            partial(aulas_ocupadas, laboratorio_id, data_agendamento, escola_id())
+        )
 
         conflito = set(aulas_numeros) & aulas_indisponiveis
         if conflito:
@@ -88,7 +147,8 @@ def verificar_disponibilidade(laboratorio_id, data_agendamento, aulas_numeros):
 def verificar_duplo_agendamento(usuario_id,laboratorio_id, data_agendamento, aulas_selecionadas):
     aulas_selecionadas_pg = '{' + ','.join(map(str, aulas_selecionadas)) + '}' # convertendo [] para {} para a requisição no PostGres
     try:
-        ocorrencia = supabase.table('agendamentos').select('*').eq('usuario_id', usuario_id).eq('laboratorio_id', laboratorio_id).eq('data_agendamento', data_agendamento.isoformat()).eq('aulas', aulas_selecionadas_pg).eq('status', 'pendente').execute()
+        # Sem a última resposta boa: com o banco fora do ar a verificação falha em vez de usar dados antigos
+        ocorrencia = supabase.table('agendamentos', guardar=False).select('*').eq('escola_id', escola_id()).eq('usuario_id', usuario_id).eq('laboratorio_id', laboratorio_id).eq('data_agendamento', data_agendamento.isoformat()).eq('aulas', aulas_selecionadas_pg).eq('status', 'pendente').execute()
         # essa ocorrencia se refere a ocorrencia de algum registro igual e pendente no banco de dados, que caso seja encontrado, retorna um erro.
         if (ocorrencia.data):
             return 0
@@ -99,21 +159,21 @@ def verificar_duplo_agendamento(usuario_id,laboratorio_id, data_agendamento, aul
     
 
 # professor.py
-from email_service import send_email  # Importa o módulo de e-mail
+from email_service import notify  # Importa o módulo de e-mail
 from database import supabase
 import streamlit as st
 from datetime import date
 
 def confirmar_agendamento_professor(laboratorio_id, data_agendamento, aulas_selecionadas, descricao):
-    usuario_id = st.session_state["usuario_id"]
+    usuario_id = estado_sessao().usuario_id
 
-    # Obter o e-mail do usuário a partir do Supabase
-    response_user = supabase.table('users').select('email').eq('id', usuario_id).execute()
-    email_usuario = response_user.data[0]['email'] if response_user.data else None
-
-    # Obter o nome do laboratório pelo ID
-    response_lab = supabase.table('laboratorios').select('nome').eq('id', laboratorio_id).execute()
-    nome_laboratorio = response_lab.data[0]['nome'] if response_lab.data else "Laboratório Desconhecido"
+    # Obter o e-mail do usuário e o nome do laboratório ao mesmo tempo
+    dados = carregar({
+        'usuario': leitura().table('users').select('email').eq('escola_id', escola_id()).eq('id', usuario_id).execute,
+        'laboratorio': leitura().table('laboratorios').select('nome').eq('escola_id', escola_id()).eq('id', laboratorio_id).execute,
+    })
+    email_usuario = dados['usuario'].data[0]['email'] if dados.ok('usuario') and dados['usuario'].data else None
+    nome_laboratorio = dados['laboratorio'].data[0]['nome'] if dados.ok('laboratorio') and dados['laboratorio'].data else "Laboratório Desconhecido"
 
     novo_agendamento = {
         'usuario_id': usuario_id,
@@ -121,7 +181,8 @@ def confirmar_agendamento_professor(laboratorio_id, data_agendamento, aulas_sele
         'data_agendamento': data_agendamento.isoformat(),
         'aulas': aulas_selecionadas,
         'descricao': descricao,
-        'status': 'pendente'
+        'status': 'pendente',
+        'escola_id': escola_id()
     }
     
     verificacao = verificar_duplo_agendamento(usuario_id, laboratorio_id, data_agendamento, aulas_selecionadas)
@@ -129,6 +190,10 @@ def confirmar_agendamento_professor(laboratorio_id, data_agendamento, aulas_sele
     if verificacao == 1:
         try:
             response = supabase.table('agendamentos').insert(novo_agendamento).execute()
+            registrar('agendamentos', response.data)
+            aplicar([f'pendentes:{laboratorio_id}', f'agendamentos_usuario:{usuario_id}'], {
+                'meus_agendamentos': lambda linhas: sorted(atualizar_linhas(response.data)(linhas), key=lambda a: a['data_agendamento']),
+            })
             st.success('Agendamento solicitado com sucesso! Aguardando aprovação.')
 
             # Envio de e-mail de confirmação da solicitação com o nome do laboratório
@@ -141,36 +206,45 @@ def confirmar_agendamento_professor(laboratorio_id, data_agendamento, aulas_sele
                     "Caso necessite de esclarecimentos adicionais ou tenha dúvidas, por favor, entre em contato conosco.\n\n"
                     "Atenciosamente,\nEquipe 🦉AgendaMCPF"
                 )
-                send_email(subject, body, email_usuario)
+                notify(subject, body, email_usuario)
         except Exception as e:
             st.error(f'Erro ao salvar o agendamento: {e}')
     else:
         st.error("Você já requisitou esse agendamento. Espere a revisão do administrador.")
 
 
-def listar_agendamentos_professor():
+def listar_agendamentos_professor(dados):
     st.subheader("Meus Agendamentos")
-    usuario_id = st.session_state["usuario_id"]
     try:
-        response = supabase.table('agendamentos').select('*').eq('usuario_id', usuario_id).order('data_agendamento', desc=False).execute()
-        agendamentos = response.data
+        agendamentos = dados['meus_agendamentos']
         if not agendamentos:
             st.info('Você não possui agendamentos.')
         else:
-            for agendamento in agendamentos:
-                response_lab = supabase.table('laboratorios').select('nome').eq('id', agendamento['laboratorio_id']).execute()
-                lab_nome = response_lab.data[0]['nome'] if response_lab.data else 'Desconhecido'
-                aulas = [f"{aula}ª Aula" for aula in sorted(agendamento['aulas'])]
-                descricao = agendamento.get('descricao', 'Sem descrição')
-                st.write(f"📅 **Data:** {agendamento['data_agendamento']} | **Espaço:** {lab_nome} | **Aulas:** {', '.join(aulas)} | **Status:** {agendamento['status']} | **Descrição:** {descricao}")
+            nomes_laboratorios = {lab['id']: lab['nome'] for lab in dados['laboratorios']}
+            # Uma única tabela para todos os agendamentos, em vez de um texto por agendamento
+            tabela = [{
+                "Data": date.fromisoformat(agendamento['data_agendamento']),
+                "Espaço": nomes_laboratorios.get(agendamento['laboratorio_id'], 'Desconhecido'),
+                "Aulas": [f"{aula}ª Aula" for aula in sorted(agendamento['aulas'])],
+                "Status": agendamento['status'].capitalize(),
+                "Descrição": agendamento.get('descricao') or 'Sem descrição',
+            } for agendamento in agendamentos]
+            st.dataframe(
+                tabela,
+                column_config={
+                    "Data": st.column_config.DateColumn("📅 Data", format="DD/MM/YYYY"),
+                    "Aulas": st.column_config.ListColumn("Aulas"),
+                },
+                hide_index=True,
+                use_container_width=True
+            )
     except Exception as e:
         st.error(f'Erro ao carregar seus agendamentos: {e}')
 
-def visualizar_agenda_laboratorio():
+def visualizar_agenda_laboratorio(dados):
     st.subheader("Agenda do Espaço")
     try:
-        response_labs = supabase.table('laboratorios').select('id', 'nome').execute()
-        laboratorios = response_labs.data
+        laboratorios = dados['laboratorios']
         if not laboratorios:
             st.error('Nenhum espaço disponível.')
             return
@@ -186,33 +260,16 @@ def visualizar_agenda_laboratorio():
             return
 
         if st.button("Consultar Agenda"):
+            import pandas as pd  # Carregado só quando a agenda é consultada
             delta = data_fim - data_inicio
             datas = [data_inicio + timedelta(days=i) for i in range(delta.days + 1)]
 
-            agenda = {}
-            for data in datas:
-                agenda[data] = {'Horários Fixos': [], 'Agendamentos': []}
-
-            response_horarios_fixos = supabase.table('horarios_fixos').select('*').eq('laboratorio_id', laboratorio_id).execute()
-            horarios_fixos = response_horarios_fixos.data
-            for horario in horarios_fixos:
-                data_inicio_fixo = datetime.strptime(horario['data_inicio'], '%Y-%m-%d').date()
-                data_fim_fixo = datetime.strptime(horario['data_fim'], '%Y-%m-%d').date()
-                for data in datas:
-                    if data_inicio_fixo <= data <= data_fim_fixo:
-                        dia_semana = data.weekday()
-                        if dia_semana == horario['dia_semana']:
-                            aulas = ', '.join([f"{aula}ª Aula" for aula in sorted(horario['aulas'])])
-                            agenda[data]['Horários Fixos'].append({'Aulas': aulas, 'Descrição': horario.get('descricao', '')})
-
-            response_agendamentos = supabase.table('agendamentos').select('*').eq('laboratorio_id', laboratorio_id).gte('data_agendamento', data_inicio.isoformat()).lte('data_agendamento', data_fim.isoformat()).eq('status', 'aprovado').execute()
-            agendamentos = response_agendamentos.data
-            for agendamento in agendamentos:
-                data_ag = datetime.strptime(agendamento['data_agendamento'], '%Y-%m-%d').date()
-                aulas = ', '.join([f"{aula}ª Aula" for aula in sorted(agendamento['aulas'])])
-                response_user = supabase.table('users').select('email').eq('id', agendamento['usuario_id']).execute()
-                professor_email = response_user.data[0]['email'] if response_user.data else 'Desconhecido'
-                agenda[data_ag]['Agendamentos'].append({'Aulas': aulas, 'Professor': professor_email, 'Descrição': agendamento.get('descricao', '')})
+            # A agenda montada fica no cache compartilhado até uma gravação no espaço ou nos usuários
+            agenda = obter(
+                f'agenda:{escola_id()}:{laboratorio_id}:{data_inicio.isoformat()}:{data_fim.isoformat()}',
+                [f'agenda:{laboratorio_id}', f'usuarios:{escola_id()}'],
+                partial(montar_agenda, laboratorio_id, datas, escola_id())
+            )
 
             for data in datas:
                 st.write(f"### 📅 {data.strftime('%d/%m/%Y')}")
@@ -227,3 +284,38 @@ def visualizar_agenda_laboratorio():
                 st.markdown("---")
     except Exception as e:
         st.error(f'Erro ao carregar a agenda do espaço: {e}')
+
+def montar_agenda(laboratorio_id, datas, escola_id):
+    # Retorna {data: {'Horários Fixos': [...], 'Agendamentos': [...]}} com as linhas de cada tabela
+    data_inicio, data_fim = datas[0], datas[-1]
+    agenda = {}
+    for data in datas:
+        agenda[data] = {'Horários Fixos': [], 'Agendamentos': []}
+
+    # Horários fixos e agendamentos do período são buscados ao mesmo tempo
+    dados_agenda = carregar({
+        'horarios_fixos': supabase.table('horarios_fixos').select('*').eq('escola_id', escola_id).eq('laboratorio_id', laboratorio_id)
+            .lte('data_inicio', data_fim.isoformat()).gte('data_fim', data_inicio.isoformat()).execute,
+        'agendamentos': supabase.table('agendamentos').select('*').eq('escola_id', escola_id).eq('laboratorio_id', laboratorio_id)
+            .gte('data_agendamento', data_inicio.isoformat()).lte('data_agendamento', data_fim.isoformat()).eq('status', 'aprovado').execute,
+    })
+    horarios_fixos = dados_agenda['horarios_fixos'].data
+    agendamentos = dados_agenda['agendamentos'].data
+    # Um único select com in_ para os professores de todos os agendamentos
+    usuarios = mapa_usuarios([agendamento['usuario_id'] for agendamento in agendamentos], escola_id, colunas=('id', 'email'))
+    for horario in horarios_fixos:
+        data_inicio_fixo = datetime.strptime(horario['data_inicio'], '%Y-%m-%d').date()
+        data_fim_fixo = datetime.strptime(horario['data_fim'], '%Y-%m-%d').date()
+        for data in datas:
+            if data_inicio_fixo <= data <= data_fim_fixo:
+                dia_semana = data.weekday()
+                if dia_semana == horario['dia_semana']:
+                    aulas = ', '.join([f"{aula}ª Aula" for aula in sorted(horario['aulas'])])
+                    agenda[data]['Horários Fixos'].append({'Aulas': aulas, 'Descrição': horario.get('descricao', '')})
+
+    for agendamento in agendamentos:
+        data_ag = datetime.strptime(agendamento['data_agendamento'], '%Y-%m-%d').date()
+        aulas = ', '.join([f"{aula}ª Aula" for aula in sorted(agendamento['aulas'])])
+        professor_email = usuarios.get(agendamento['usuario_id'], {}).get('email', 'Desconhecido')
+        agenda[data_ag]['Agendamentos'].append({'Aulas': aulas, 'Professor': professor_email, 'Descrição': agendamento.get('descricao', '')})
+    return agenda
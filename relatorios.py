@@ -0,0 +1,247 @@
+# relatorios.py
+"""
+Relatórios de uso dos espaços exportados em CSV, XLSX ou Parquet.
+
+Os agendamentos são lidos em lotes de RELATORIO_TAMANHO_LOTE linhas, primeiro da tabela de arquivo
+(ver arquivamento.py) e depois da principal. A paginação usa a chave (`id > último id lido`), e não
+um deslocamento, então cada lote custa o mesmo do início ao fim da exportação. Cada lote recebe os
+nomes dos professores e dos espaços e é gravado no arquivo antes que o próximo seja lido, então só um
+lote de linhas fica em memória. Os nomes são lidos uma única vez por exportação, pois a escola tem
+poucos usuários e espaços perto do histórico.
+
+Formatos:
+- csv: separado por ponto e vírgula, em UTF-8 com BOM, para abrir direto no Excel.
+- xlsx: requer o pacote opcional openpyxl (pip install openpyxl), usado no modo de gravação
+  contínua (write_only).
+- parquet: requer o pacote opcional pyarrow (pip install pyarrow). Cada lote vira um row group.
+
+Na tela, o arquivo é gerado só quando o botão de download é clicado. O Streamlit entrega o download
+inteiro de uma vez, então o arquivo pronto fica em memória até ser enviado; relatórios de vários
+anos devem ser gerados pela linha de comando, que grava direto no disco:
+    python relatorios.py --formato parquet --inicio 2024-01-01 --fim 2025-12-31 --saida uso.parquet
+    python relatorios.py --escola mcpf --laboratorio 3 --status aprovado --saida quimica.csv
+"""
+import argparse
+import csv
+import importlib.util
+import io
+import os
+from datetime import date
+from functools import partial
+import streamlit as st
+from database import supabase
+from arquivamento import TABELA_ARQUIVO
+
+TAMANHO_LOTE = int(os.getenv('RELATORIO_TAMANHO_LOTE', 1000))
+STATUS = ['pendente', 'aprovado', 'rejeitado', 'expirado']
+COLUNAS = ['Data', 'Espaço', 'Professor(a)', 'E-mail', 'Aulas', 'Quantidade de aulas', 'Descrição', 'Status']
+
+# formato: (tipo MIME, pacote opcional necessário)
+FORMATOS = {
+    'csv': ('text/csv', None),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'openpyxl'),
+    'parquet': ('application/vnd.apache.parquet', 'pyarrow'),
+}
+
+
+def formatos_disponiveis():
+    return [formato for formato, (_, pacote) in FORMATOS.items() if pacote is None or importlib.util.find_spec(pacote)]
+
+
+def lotes_agendamentos(escola_id, data_inicio=None, data_fim=None, laboratorio_id=None, status=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Gera as linhas do relatório em listas de até `tamanho_lote` dicionários com as COLUNAS.
+
+    Parâmetros:
+    data_inicio, data_fim (date): Período dos agendamentos, inclusive; sem eles, todo o histórico.
+    laboratorio_id (int): Só os agendamentos deste espaço.
+    status (list): Só os agendamentos com estes status; None para todos, vazio para nenhum.
+    """
+    if status is not None and not status:
+        return
+    laboratorios = {
+        lab['id']: lab['nome']
+        for lab in supabase.table('laboratorios').select('id', 'nome').eq('escola_id', escola_id).execute().data
+    }
+    usuarios = {
+        usuario['id']: usuario
+        for usuario in supabase.table('users').select('id', 'name', 'email').eq('escola_id', escola_id).execute().data
+    }
+    for tabela in (TABELA_ARQUIVO, 'agendamentos'):
+        ultimo_id = 0
+        while True:
+            # Sem guardar a resposta em resiliencia.py: cada lote é lido uma única vez
+            consulta = (
+                supabase.table(tabela, guardar=False)
+                .select('id', 'usuario_id', 'laboratorio_id', 'data_agendamento', 'aulas', 'descricao', 'status')
+                .eq('escola_id', escola_id)
+                .gt('id', ultimo_id)
+            )
+            if data_inicio:
+                consulta = consulta.gte('data_agendamento', data_inicio.isoformat())
+            if data_fim:
+                consulta = consulta.lte('data_agendamento', data_fim.isoformat())
+            if laboratorio_id is not None:
+                consulta = consulta.eq('laboratorio_id', laboratorio_id)
+            if status is not None:
+                consulta = consulta.in_('status', list(status))
+            lote = consulta.order('id').limit(tamanho_lote).execute().data
+            if not lote:
+                break
+            linhas = []
+            for agendamento in lote:
+                professor = usuarios.get(agendamento['usuario_id'], {})
+                linhas.append({
+                    'Data': date.fromisoformat(agendamento['data_agendamento']),
+                    'Espaço': laboratorios.get(agendamento['laboratorio_id'], 'Desconhecido'),
+                    'Professor(a)': professor.get('name') or '',
+                    'E-mail': professor.get('email') or '',
+                    'Aulas': sorted(agendamento['aulas']),
+                    'Quantidade de aulas': len(agendamento['aulas']),
+                    'Descrição': agendamento.get('descricao') or '',
+                    'Status': agendamento['status'].capitalize(),
+                })
+            yield linhas
+            if len(lote) < tamanho_lote:
+                break
+            ultimo_id = lote[-1]['id']
+
+
+def _texto(linha):
+    # Linha com as aulas em texto, para CSV e XLSX
+    return [', '.join(f"{aula}ª" for aula in linha['Aulas']) if coluna == 'Aulas' else linha[coluna] for coluna in COLUNAS]
+
+
+def escrever_csv(lotes, arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    escritor = csv.writer(texto, delimiter=';')
+    escritor.writerow(COLUNAS)
+    for lote in lotes:
+        escritor.writerows([[valor.strftime('%d/%m/%Y') if isinstance(valor, date) else valor for valor in _texto(linha)] for linha in lote])
+        texto.flush()
+    texto.detach()  # Mantém o arquivo aberto para quem chamou
+
+
+def escrever_xlsx(lotes, arquivo):
+    from openpyxl import Workbook  # Opcional: só necessário para XLSX
+    from openpyxl.cell import WriteOnlyCell
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet('Agendamentos')
+    aba.append(COLUNAS)
+    for lote in lotes:
+        for linha in lote:
+            valores = _texto(linha)
+            data = WriteOnlyCell(aba, value=valores[0])
+            data.number_format = 'DD/MM/YYYY'
+            aba.append([data] + valores[1:])
+    planilha.save(arquivo)
+
+
+def escrever_parquet(lotes, arquivo):
+    import pyarrow as pa  # Opcional: só necessário para Parquet
+    import pyarrow.parquet as pq
+    esquema = pa.schema([
+        ('Data', pa.date32()),
+        ('Espaço', pa.string()),
+        ('Professor(a)', pa.string()),
+        ('E-mail', pa.string()),
+        ('Aulas', pa.list_(pa.int16())),
+        ('Quantidade de aulas', pa.int16()),
+        ('Descrição', pa.string()),
+        ('Status', pa.string()),
+    ])
+    with pq.ParquetWriter(arquivo, esquema) as escritor:
+        for lote in lotes:
+            escritor.write_table(pa.Table.from_pylist(lote, schema=esquema))
+
+
+ESCRITORES = {'csv': escrever_csv, 'xlsx': escrever_xlsx, 'parquet': escrever_parquet}
+
+
+def exportar(formato, arquivo, escola_id, **filtros):
+    # Grava o relatório no arquivo binário aberto `arquivo`; os filtros são os de lotes_agendamentos
+    ESCRITORES[formato](lotes_agendamentos(escola_id, **filtros), arquivo)
+
+
+def gerar_arquivo(formato, escola_id, **filtros):
+    # Chamado pelo botão de download, fora da execução do script: tudo chega por parâmetro. O
+    # Streamlit só aceita o conteúdo inteiro (bytes), e não um arquivo temporário.
+    arquivo = io.BytesIO()
+    exportar(formato, arquivo, escola_id, **filtros)
+    return arquivo.getvalue()
+
+
+def semestre_atual(hoje=None):
+    hoje = hoje or date.today()
+    if hoje.month <= 6:
+        return date(hoje.year, 1, 1), date(hoje.year, 6, 30)
+    return date(hoje.year, 7, 1), date(hoje.year, 12, 31)
+
+
+def exibir_exportacao(chave, escola_id, laboratorios):
+    """
+    Filtros e botão de download do relatório.
+
+    Parâmetros:
+    chave (str): Prefixo das chaves dos widgets.
+    laboratorios (list): Espaços que podem entrar no relatório ({'id', 'nome'}); com um só, o filtro é fixo.
+    """
+    nomes_laboratorios = {lab['id']: lab['nome'] for lab in laboratorios}
+    inicio, fim = semestre_atual()
+    col1, col2 = st.columns(2)
+    with col1:
+        data_inicio = st.date_input("De", value=inicio, key=f'{chave}_inicio', format="DD/MM/YYYY")
+    with col2:
+        data_fim = st.date_input("Até", value=fim, key=f'{chave}_fim', format="DD/MM/YYYY")
+    if len(laboratorios) == 1:
+        laboratorio_id = laboratorios[0]['id']
+    else:
+        laboratorio_id = st.selectbox("Espaço", options=[None] + list(nomes_laboratorios), key=f'{chave}_espaco',
+                                      format_func=lambda lab_id: 'Todos' if lab_id is None else nomes_laboratorios[lab_id])
+    status = st.multiselect("Status", options=STATUS, default=['aprovado'], key=f'{chave}_status', format_func=str.capitalize)
+    formatos = formatos_disponiveis()
+    formato = st.radio("Formato", options=formatos, key=f'{chave}_formato', horizontal=True, format_func=str.upper)
+    if len(formatos) < len(FORMATOS):
+        ausentes = [pacote for formato_ausente, (_, pacote) in FORMATOS.items() if formato_ausente not in formatos]
+        st.caption(f"Outros formatos exigem os pacotes: {', '.join(ausentes)}.")
+
+    if data_inicio and data_fim and data_inicio > data_fim:
+        st.warning("A data de início não pode ser posterior à data de fim.")
+        return
+    if not status:
+        st.warning("Selecione ao menos um status.")
+        return
+
+    # O relatório só é gerado no clique, e não a cada execução da tela
+    nome = f"agendamentos_{data_inicio or 'inicio'}_{data_fim or 'hoje'}.{formato}"
+    st.download_button(
+        "⬇️ Baixar relatório",
+        data=partial(gerar_arquivo, formato, escola_id, data_inicio=data_inicio, data_fim=data_fim,
+                     laboratorio_id=laboratorio_id, status=status),
+        file_name=nome,
+        mime=FORMATOS[formato][0],
+        key=f'{chave}_baixar',
+        on_click='ignore'
+    )
+
+
+if __name__ == '__main__':
+    from escolas import buscar_escola, ESCOLA_PADRAO
+    parser = argparse.ArgumentParser(description='Exporta o relatório de agendamentos de uma escola.')
+    parser.add_argument('--escola', default=ESCOLA_PADRAO, help='Slug da escola')
+    parser.add_argument('--formato', choices=list(FORMATOS), default='csv')
+    parser.add_argument('--inicio', type=date.fromisoformat, help='Data inicial (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=date.fromisoformat, help='Data final (AAAA-MM-DD)')
+    parser.add_argument('--laboratorio', type=int, help='Id do espaço')
+    parser.add_argument('--status', nargs='+', choices=STATUS, help='Status incluídos (padrão: todos)')
+    parser.add_argument('--saida', required=True, help='Arquivo de saída')
+    args = parser.parse_args()
+    escola = buscar_escola(args.escola)
+    if escola is None:
+        raise SystemExit(f"Escola não encontrada: {args.escola}")
+    if args.formato not in formatos_disponiveis():
+        raise SystemExit(f"O formato {args.formato} exige o pacote {FORMATOS[args.formato][1]}: pip install {FORMATOS[args.formato][1]}")
+    with open(args.saida, 'wb') as saida:
+        exportar(args.formato, saida, escola['id'], data_inicio=args.inicio, data_fim=args.fim,
+                 laboratorio_id=args.laboratorio, status=args.status)
+    print(f"Relatório gravado em {args.saida}.")
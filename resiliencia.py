@@ -0,0 +1,335 @@
+# resiliencia.py
+"""
+Camada de chamadas resilientes ao Supabase.
+
+`ClienteResiliente` envolve o cliente do Supabase (database.py), então todas as consultas do sistema
+passam por aqui sem mudar as chamadas encadeadas (`supabase.table(...).select(...).eq(...).execute()`
+e `supabase.rpc(...).execute()`):
+
+- Tempo máximo por operação: leituras esperam até RESILIENCIA_TIMEOUT_LEITURA_S e gravações até
+  RESILIENCIA_TIMEOUT_ESCRITA_S, em vez dos 120 s padrão do cliente HTTP. O limite é passado ao
+  próprio cliente HTTP, que encerra a requisição e libera a thread. O tempo de espera por uma thread
+  livre do pool (RESILIENCIA_CHAMADAS_SIMULTANEAS) não é descontado da operação, mas também tem esse
+  limite.
+- Novas tentativas com espera exponencial e aleatória (full jitter), só para leituras e só para falhas
+  transitórias (rede, tempo esgotado, 5xx, conexão com o Postgres). Gravações não são repetidas, pois
+  poderiam ser aplicadas duas vezes. Com o pool cheio também não há nova tentativa, pois ela só
+  ocuparia mais uma thread.
+- Disjuntor: depois de RESILIENCIA_FALHAS_PARA_ABRIR falhas transitórias seguidas, as chamadas falham
+  na hora com `ServicoIndisponivel` durante RESILIENCIA_PAUSA_S segundos; em seguida uma chamada de
+  teste decide se o circuito fecha de novo.
+- Última resposta boa: cada leitura bem-sucedida fica guardada (os filtros, inclusive a escola, fazem
+  parte da chave) e é devolvida quando o circuito está aberto ou as tentativas se esgotam. Leituras
+  que não podem ser respondidas com dados antigos (login, verificações antes de gravar) usam
+  `table(..., guardar=False)` e falham com o banco fora do ar.
+- Origem das chamadas: com `registrar_origens()`, cada chamada é contada pela linha do código que
+  montou a consulta (usado por orcamento_consultas.py). Desligado, não custa nada.
+
+Erros de negócio (por exemplo violação de unicidade) não contam como falha e são repassados direto.
+"""
+import copy
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TempoEsgotado
+import httpx
+from postgrest.exceptions import APIError
+
+TIMEOUT_LEITURA_S = float(os.getenv('RESILIENCIA_TIMEOUT_LEITURA_S', 5))
+TIMEOUT_ESCRITA_S = float(os.getenv('RESILIENCIA_TIMEOUT_ESCRITA_S', 10))
+TENTATIVAS_LEITURA = int(os.getenv('RESILIENCIA_TENTATIVAS', 3))
+ESPERA_BASE_S = float(os.getenv('RESILIENCIA_ESPERA_BASE_S', 0.2))
+ESPERA_MAXIMA_S = float(os.getenv('RESILIENCIA_ESPERA_MAXIMA_S', 2))
+FALHAS_PARA_ABRIR = int(os.getenv('RESILIENCIA_FALHAS_PARA_ABRIR', 5))
+PAUSA_S = float(os.getenv('RESILIENCIA_PAUSA_S', 30))
+TAMANHO_CACHE = int(os.getenv('RESILIENCIA_TAMANHO_CACHE', 512))
+CHAMADAS_SIMULTANEAS = int(os.getenv('RESILIENCIA_CHAMADAS_SIMULTANEAS', 32))
+# Folga da espera no pool sobre o limite passado ao cliente HTTP, que deve encerrar a requisição antes
+FOLGA_S = 1.0
+
+OPERACOES_ESCRITA = {'insert', 'upsert', 'update', 'delete'}
+# Códigos de erro transitórios: HTTP do gateway, conexão do PostgREST e classes do Postgres
+# de conexão (08), recursos (53), cancelamento/desligamento (57) e conflito de transação (40)
+CODIGOS_TRANSITORIOS = {'500', '502', '503', '504', 'PGRST000', 'PGRST001', 'PGRST002'}
+PREFIXOS_TRANSITORIOS = ('08', '53', '57', '40')
+OPERACOES = OPERACOES_ESCRITA | {'select', 'rpc'}
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+# Módulos que só repassam as consultas dos painéis; na origem aparece também quem os chamou
+MODULOS_APOIO = {'carregamento.py', 'cache_compartilhado.py', 'dados_sessao.py', 'espelho_local.py'}
+
+
+class ServicoIndisponivel(Exception):
+    pass
+
+
+class PoolEsgotado(TimeoutError):
+    # A chamada não conseguiu uma thread livre a tempo; nada foi enviado ao Supabase
+    pass
+
+
+class _SessaoComLimite:
+    """
+    Repassa as requisições ao cliente HTTP (httpx) do construtor de consultas com o tempo máximo da
+    operação, que o construtor não permite informar por requisição.
+    """
+
+    def __init__(self, sessao, timeout):
+        self.sessao = sessao
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        return self.sessao.request(*args, timeout=self.timeout, **kwargs)
+
+    def __getattr__(self, nome):
+        return getattr(self.sessao, nome)
+
+
+def _limitar_requisicao(consulta, timeout):
+    # Só o cliente real tem `request.session`; o substituto local (supabase_local.py) não usa HTTP
+    requisicao = getattr(consulta, 'request', None)
+    sessao = getattr(requisicao, 'session', None)
+    if sessao is None:
+        return
+    if isinstance(sessao, _SessaoComLimite):
+        sessao = sessao.sessao
+    requisicao.session = _SessaoComLimite(sessao, timeout)
+
+
+def falha_transitoria(erro):
+    if isinstance(erro, APIError):
+        codigo = str(erro.code or '')
+        return codigo in CODIGOS_TRANSITORIOS or (len(codigo) == 5 and codigo.startswith(PREFIXOS_TRANSITORIOS))
+    # Tempo esgotado e erros de rede (sockets e httpx)
+    return isinstance(erro, OSError) or type(erro).__module__.startswith('httpx')
+
+
+class Disjuntor:
+    def __init__(self, falhas_para_abrir=FALHAS_PARA_ABRIR, pausa=PAUSA_S):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.pausa = pausa
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    @property
+    def aberto(self):
+        return self._falhas >= self.falhas_para_abrir
+
+    def permitir(self):
+        # Fechado: tudo passa. Aberto: nada passa até o fim da pausa, depois uma chamada de teste por vez
+        with self._lock:
+            if not self.aberto:
+                return True
+            if time.monotonic() < self._aberto_ate or self._teste_em_andamento:
+                return False
+            self._teste_em_andamento = True
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            if self.aberto:
+                logging.warning("Supabase respondeu: circuito fechado.")
+            self._falhas = 0
+            self._teste_em_andamento = False
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._teste_em_andamento = False
+            if self.aberto:
+                if self._falhas == self.falhas_para_abrir:
+                    logging.warning(f"Supabase instável: circuito aberto por {self.pausa:.0f} s.")
+                self._aberto_ate = time.monotonic() + self.pausa
+
+
+class ConsultaResiliente:
+    """
+    Acompanha o encadeamento do construtor de consultas e executa `execute()` pela camada resiliente.
+    """
+
+    def __init__(self, cliente, tabela, consulta, passos=(), guardar=True, origem=None):
+        self._cliente = cliente
+        self._tabela = tabela
+        self._consulta = consulta
+        self._passos = passos
+        self._guardar = guardar
+        self._origem = origem
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._consulta, nome)
+        if not callable(atributo):
+            return atributo
+
+        def encadear(*args, **kwargs):
+            passo = (nome, args, tuple(sorted(kwargs.items())))
+            return ConsultaResiliente(self._cliente, self._tabela, atributo(*args, **kwargs), self._passos + (passo,),
+                                      self._guardar, self._origem)
+        return encadear
+
+    def execute(self):
+        leitura = not any(nome in OPERACOES_ESCRITA for nome, _, _ in self._passos)
+        chave = (self._tabela, repr(self._passos)) if leitura and self._guardar else None
+        if self._origem is not None:
+            # Mesmos nomes dos contadores do substituto local: agendamentos.select, rpc.buscar_agendamentos
+            operacao = next((nome for nome, _, _ in self._passos if nome in OPERACOES), 'select')
+            consulta = self._tabela.replace(':', '.') if operacao == 'rpc' else f'{self._tabela}.{operacao}'
+            self._cliente._contar_origem(self._origem, consulta)
+        _limitar_requisicao(self._consulta, TIMEOUT_LEITURA_S if leitura else TIMEOUT_ESCRITA_S)
+        return self._cliente._executar(self._consulta.execute, leitura, chave, self._tabela)
+
+
+class ClienteResiliente:
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.disjuntor = Disjuntor()
+        self._executor = ThreadPoolExecutor(max_workers=CHAMADAS_SIMULTANEAS, thread_name_prefix='supabase')
+        self._ocupadas = 0  # Chamadas no pool, executando ou na fila
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.estatisticas = {'chamadas': 0, 'repeticoes': 0, 'falhas': 0, 'tempo_esgotado': 0, 'recusadas': 0, 'respostas_guardadas': 0}
+        # {(origem, consulta): chamadas}; None enquanto registrar_origens() não for chamado
+        self.origens = None
+
+    def table(self, nome, guardar=True):
+        # guardar=False: a leitura não entra na última resposta boa nem é respondida por ela. Usado nas
+        # leituras de segurança e de consistência (auth.py, validacao.py) e nas leituras grandes e
+        # únicas (os lotes de relatorios.py)
+        return ConsultaResiliente(self, nome, self.cliente.table(nome), guardar=guardar, origem=self._origem())
+
+    def rpc(self, nome, parametros=None):
+        # Funções do banco chamadas pelo aplicativo só leem dados (ver migracoes/0009_busca_textual.sql),
+        # então recebem as mesmas novas tentativas e a última resposta boa das leituras
+        parametros = parametros or {}
+        passo = ('rpc', (nome, tuple(sorted(parametros.items()))), ())
+        return ConsultaResiliente(self, f'rpc:{nome}', self.cliente.rpc(nome, parametros), (passo,), origem=self._origem())
+
+    def registrar_origens(self):
+        # Liga (ou zera) a contagem das chamadas por origem
+        with self._lock:
+            self.origens = {}
+
+    def _origem(self):
+        """
+        Linha que montou a consulta e, se ela estiver em um módulo de apoio, a primeira linha dos
+        painéis acima dela (por exemplo "carregamento.py:66 (buscar) ← admlab.py:120 (visualizar)").
+        A origem é lida aqui, na thread de quem chama, porque a execução vai para outro pool de threads.
+        """
+        if self.origens is None:
+            return None
+        partes = []
+        quadro = sys._getframe(2)
+        while quadro is not None and len(partes) < 2:
+            arquivo = quadro.f_code.co_filename
+            nome = os.path.basename(arquivo)
+            if arquivo.startswith(DIRETORIO) and nome != 'resiliencia.py':
+                if not partes or partes[-1][0] in MODULOS_APOIO and nome not in MODULOS_APOIO:
+                    partes.append((nome, f"{nome}:{quadro.f_lineno} ({quadro.f_code.co_name})"))
+            if partes and partes[-1][0] not in MODULOS_APOIO:
+                break
+            quadro = quadro.f_back
+        return ' ← '.join(texto for _, texto in partes) or 'desconhecida'
+
+    def _contar_origem(self, origem, consulta):
+        with self._lock:
+            if self.origens is not None:
+                self.origens[(origem, consulta)] = self.origens.get((origem, consulta), 0) + 1
+
+    def __getattr__(self, nome):
+        # Demais atributos (auth, storage, contadores do substituto local) vão direto ao cliente
+        return getattr(self.cliente, nome)
+
+    def _contar(self, chave):
+        with self._lock:
+            self.estatisticas[chave] += 1
+
+    def _guardar(self, chave, resposta):
+        # Cópia, pois as telas podem alterar as listas recebidas (por exemplo ao ordenar)
+        resposta = copy.deepcopy(resposta)
+        with self._lock:
+            self._cache[chave] = resposta
+            self._cache.move_to_end(chave)
+            while len(self._cache) > TAMANHO_CACHE:
+                self._cache.popitem(last=False)
+
+    def _guardada(self, chave):
+        with self._lock:
+            return self._cache.get(chave)
+
+    @property
+    def saturado(self):
+        return self._ocupadas >= CHAMADAS_SIMULTANEAS
+
+    def _liberar(self, _futuro):
+        with self._lock:
+            self._ocupadas -= 1
+
+    def _chamar(self, executar, timeout):
+        # O prazo conta a partir do início da execução; a espera na fila tem o mesmo limite, à parte
+        iniciada = threading.Event()
+        inicio = []
+
+        def tarefa():
+            inicio.append(time.monotonic())
+            iniciada.set()
+            return executar()
+
+        with self._lock:
+            self._ocupadas += 1
+        futuro = self._executor.submit(tarefa)
+        futuro.add_done_callback(self._liberar)
+        if not iniciada.wait(timeout) and futuro.cancel():
+            self._contar('tempo_esgotado')
+            raise PoolEsgotado(f"Nenhuma conexão livre com o Supabase em {timeout:g} s.")
+        iniciada.wait()
+        try:
+            return futuro.result(timeout=max(0.0, timeout + FOLGA_S - (time.monotonic() - inicio[0])))
+        except httpx.TimeoutException:
+            self._contar('tempo_esgotado')
+            raise
+        except TempoEsgotado as e:
+            if futuro.done():
+                raise  # O próprio cliente HTTP esgotou o tempo
+            self._contar('tempo_esgotado')
+            raise TimeoutError(f"O Supabase não respondeu em {timeout:g} s.") from e
+
+    def _executar(self, executar, leitura, chave, tabela):
+        self._contar('chamadas')
+        tentativas = TENTATIVAS_LEITURA if leitura else 1
+        timeout = TIMEOUT_LEITURA_S if leitura else TIMEOUT_ESCRITA_S
+        for tentativa in range(tentativas):
+            if not self.disjuntor.permitir():
+                self._contar('recusadas')
+                return self._resposta_guardada(chave, ServicoIndisponivel(
+                    'O banco de dados está temporariamente indisponível. Tente novamente em instantes.'))
+            try:
+                resposta = self._chamar(executar, timeout)
+            except Exception as e:
+                if not falha_transitoria(e):
+                    self.disjuntor.sucesso()  # O servidor respondeu; o erro é da própria operação
+                    raise
+                self.disjuntor.falha()
+                self._contar('falhas')
+                logging.warning(f"Falha transitória em {tabela} (tentativa {tentativa + 1}/{tentativas}): {e}")
+                if tentativa + 1 == tentativas or self.saturado:
+                    return self._resposta_guardada(chave, e)
+                self._contar('repeticoes')
+                time.sleep(random.uniform(0, min(ESPERA_MAXIMA_S, ESPERA_BASE_S * 2 ** tentativa)))
+            else:
+                self.disjuntor.sucesso()
+                if chave is not None:
+                    self._guardar(chave, resposta)
+                return resposta
+
+    def _resposta_guardada(self, chave, erro):
+        resposta = self._guardada(chave) if chave is not None else None
+        if resposta is None:
+            raise erro
+        self._contar('respostas_guardadas')
+        logging.warning(f"Servindo a última resposta guardada: {erro}")
+        return copy.deepcopy(resposta)
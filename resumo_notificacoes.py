@@ -0,0 +1,214 @@
+# resumo_notificacoes.py
+"""
+Resumos de notificações por e-mail.
+
+- Administradores: um e-mail por administrador com os novos pedidos pendentes desde o último resumo,
+  agrupados por espaço, em vez de nenhuma notificação. Só os pedidos criados depois do último resumo
+  são lidos, em consultas em lote (marcas, pendentes, espaços, usuários e o total de pendentes de
+  cada espaço, agrupado no banco); o custo não cresce com os pendentes antigos nem com os espaços.
+  O `created_at` é o instante da gravação, e não o da confirmação da transação, então cada ciclo relê
+  RESUMO_MARGEM_S segundos antes da marca e descarta os ids já enviados.
+- Professores: com NOTIFICACOES_MODO=resumo as notificações ficam na tabela `emails_pendentes` e são
+  enviadas em um único e-mail por destinatário depois que a janela de agrupamento expira.
+
+As tabelas `emails_pendentes` e `notificacoes_controle` são criadas por
+migracoes/0006_fila_notificacoes.sql.
+
+Uso (por exemplo a cada 15 minutos em um cron):
+    python resumo_notificacoes.py --janela-minutos 10
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from database import supabase
+from email_service import send_emails, TABELA_FILA
+
+TABELA_CONTROLE = 'notificacoes_controle'
+MARCA_RESUMO_ADMINISTRADORES = 'resumo_administradores'
+MARCA_ENVIADOS = 'resumo_administradores_enviados'
+JANELA_PADRAO_MINUTOS = 10
+MARGEM_S = float(os.getenv('RESUMO_MARGEM_S', 300))
+
+
+def _instante(valor):
+    return datetime.fromisoformat(valor.replace('Z', '+00:00'))
+
+
+def ler_marcas(chaves):
+    # Lê várias marcas em uma única consulta e retorna {chave: valor}
+    if not chaves:
+        return {}
+    response = supabase.table(TABELA_CONTROLE).select('chave', 'valor').in_('chave', list(chaves)).execute()
+    return {linha['chave']: linha['valor'] for linha in response.data}
+
+
+def marca_administrador(administrador_id):
+    return f'{MARCA_RESUMO_ADMINISTRADORES}:{administrador_id}'
+
+
+def _ids_enviados(valor):
+    # Valor das marcas de ids enviados: JSON {id: created_at}
+    return {int(id_): criado for id_, criado in json.loads(valor or '{}').items()}
+
+
+def montar_resumos(pendentes, laboratorios, usuarios, totais, enviados=None):
+    """
+    Agrupa os pedidos pendentes por administrador e por espaço.
+
+    Parâmetros:
+    totais (dict): Total de pendentes de cada espaço, inclusive os já resumidos.
+    enviados (dict): {administrador_id: ids já enviados a ele}; esses pedidos ficam de fora do resumo
+        daquele administrador.
+
+    Retorna uma lista de tuplas ((assunto, corpo, email_administrador), administrador_id, pedidos incluídos).
+    """
+    enviados = enviados or {}
+    por_admin = {}
+    for pendente in pendentes:
+        lab = laboratorios.get(pendente['laboratorio_id'])
+        if not lab or not lab.get('administrador_id'):
+            continue
+        if pendente['id'] in enviados.get(lab['administrador_id'], ()):
+            continue
+        por_admin.setdefault(lab['administrador_id'], {}).setdefault(lab['id'], []).append(pendente)
+
+    resumos = []
+    for administrador_id, por_lab in por_admin.items():
+        admin = usuarios.get(administrador_id)
+        if not admin or not admin.get('email'):
+            continue
+        quantidade = sum(len(pedidos) for pedidos in por_lab.values())
+        linhas = [f"Olá,\n\nHá {quantidade} novo(s) pedido(s) de agendamento aguardando sua análise."]
+        for laboratorio_id, pedidos in por_lab.items():
+            linhas.append(f"\n{laboratorios[laboratorio_id]['nome']} ({totais.get(laboratorio_id, len(pedidos))} pendente(s) no total):")
+            for pedido in sorted(pedidos, key=lambda p: p['data_agendamento']):
+                professor = usuarios.get(pedido['usuario_id'], {})
+                aulas = ', '.join([f"{aula}ª Aula" for aula in sorted(pedido['aulas'])])
+                linhas.append(
+                    f"- {pedido['data_agendamento']} | {aulas} | {professor.get('name') or professor.get('email', 'Desconhecido')}"
+                    f" | {pedido.get('descricao') or 'Sem descrição'}"
+                )
+        linhas.append("\nAcesse o painel do AgendaMCPF para aprovar ou rejeitar os pedidos.\n\nAtenciosamente,\nEquipe 🦉AgendaMCPF")
+        incluidos = [pedido for pedidos in por_lab.values() for pedido in pedidos]
+        resumos.append((("Resumo de Agendamentos Pendentes", '\n'.join(linhas), admin['email']), administrador_id, incluidos))
+
+    return resumos
+
+
+def contar_pendentes(ids_laboratorios):
+    # Total de pendentes de cada espaço em uma única chamada, agrupado no banco (migracoes/0010_contagem_pendentes.sql)
+    response = supabase.rpc('contar_pendentes', {'p_laboratorio_ids': list(ids_laboratorios)}).execute()
+    return {linha['laboratorio_id']: linha['total'] for linha in response.data}
+
+
+def enviar_resumos_administradores():
+    """
+    Envia o resumo dos novos pendentes para cada administrador e retorna quantos e-mails foram enviados.
+
+    A marca geral guarda até onde todos os administradores já receberam o resumo. São lidos os pedidos
+    criados depois dela menos MARGEM_S (índice agendamentos_pendentes_criacao), e os ids da margem que
+    já foram enviados, guardados em MARCA_ENVIADOS, são descartados. Se algum envio falhar, a marca
+    geral fica parada e cada administrador que recebeu o resumo ganha uma marca própria com os ids
+    enviados a ele: o próximo ciclo reenvia só aos que falharam.
+    """
+    gerais = ler_marcas([MARCA_RESUMO_ADMINISTRADORES, MARCA_ENVIADOS])
+    desde = gerais.get(MARCA_RESUMO_ADMINISTRADORES)
+    ja_enviados = _ids_enviados(gerais.get(MARCA_ENVIADOS))
+    consulta = (
+        supabase.table('agendamentos')
+        .select('id', 'usuario_id', 'laboratorio_id', 'data_agendamento', 'aulas', 'descricao', 'created_at')
+        .eq('status', 'pendente')
+    )
+    if desde:
+        consulta = consulta.gt('created_at', (_instante(desde) - timedelta(seconds=MARGEM_S)).isoformat())
+    pendentes = [pendente for pendente in consulta.execute().data if pendente['id'] not in ja_enviados]
+    if not pendentes:
+        return 0
+
+    ids_labs = list({p['laboratorio_id'] for p in pendentes})
+    laboratorios = {
+        lab['id']: lab
+        for lab in supabase.table('laboratorios').select('id', 'nome', 'administrador_id').in_('id', ids_labs).execute().data
+    }
+    ids_admins = {lab['administrador_id'] for lab in laboratorios.values() if lab['administrador_id']}
+    ids_usuarios = list({p['usuario_id'] for p in pendentes} | ids_admins)
+    usuarios = {
+        usuario['id']: usuario
+        for usuario in supabase.table('users').select('id', 'name', 'email').in_('id', ids_usuarios).execute().data
+    }
+    lidas = ler_marcas([marca_administrador(admin_id) for admin_id in ids_admins])
+    enviados_admins = {admin_id: _ids_enviados(lidas[marca_administrador(admin_id)])
+                       for admin_id in ids_admins if marca_administrador(admin_id) in lidas}
+    totais = contar_pendentes(ids_labs)
+
+    resumos = montar_resumos(pendentes, laboratorios, usuarios, totais, enviados_admins)
+    enviados = send_emails([mensagem for mensagem, _, _ in resumos])
+    if len(enviados) == len(resumos):
+        # Todos os administradores estão em dia: a marca geral avança, os ids da nova margem são
+        # guardados e as marcas próprias perdem o sentido
+        nova_marca = max([_instante(p['created_at']) for p in pendentes] + ([_instante(desde)] if desde else []))
+        limite = nova_marca - timedelta(seconds=MARGEM_S)
+        margem = {id_: criado for id_, criado in {**ja_enviados, **{p['id']: p['created_at'] for p in pendentes}}.items()
+                  if _instante(criado) > limite}
+        supabase.table(TABELA_CONTROLE).upsert([
+            {'chave': MARCA_RESUMO_ADMINISTRADORES, 'valor': nova_marca.isoformat()},
+            {'chave': MARCA_ENVIADOS, 'valor': json.dumps(margem)},
+        ], on_conflict='chave').execute()
+        if lidas:
+            supabase.table(TABELA_CONTROLE).delete().in_('chave', list(lidas)).execute()
+    elif enviados:
+        supabase.table(TABELA_CONTROLE).upsert([
+            {'chave': marca_administrador(resumos[indice][1]),
+             'valor': json.dumps({**enviados_admins.get(resumos[indice][1], {}), **{p['id']: p['created_at'] for p in resumos[indice][2]}})}
+            for indice in enviados
+        ], on_conflict='chave').execute()
+    return len(enviados)
+
+
+def agrupar_fila(fila, limite):
+    """
+    Agrupa as notificações enfileiradas por destinatário, mantendo apenas os grupos cuja notificação
+    mais antiga é anterior ao limite (a janela de agrupamento já expirou).
+
+    Retorna uma lista de tuplas ((assunto, corpo, destinatario), ids).
+    """
+    grupos = {}
+    for item in sorted(fila, key=lambda item: _instante(item['created_at'])):
+        grupos.setdefault(item['destinatario'], []).append(item)
+
+    mensagens = []
+    for destinatario, itens in grupos.items():
+        if _instante(itens[0]['created_at']) > limite:
+            continue
+        if len(itens) == 1:
+            mensagem = (itens[0]['assunto'], itens[0]['corpo'], destinatario)
+        else:
+            corpo = f"\n\n{'-' * 40}\n\n".join(f"{item['assunto']}\n\n{item['corpo']}" for item in itens)
+            mensagem = (f"Resumo de {len(itens)} notificações de agendamento", corpo, destinatario)
+        mensagens.append((mensagem, [item['id'] for item in itens]))
+    return mensagens
+
+
+def enviar_emails_agrupados(janela_minutos=JANELA_PADRAO_MINUTOS):
+    # Envia as notificações enfileiradas, uma mensagem por destinatário, e retorna quantas saíram
+    fila = supabase.table(TABELA_FILA).select('*').execute().data
+    if not fila:
+        return 0
+    limite = datetime.now(timezone.utc) - timedelta(minutes=janela_minutos)
+    grupos = agrupar_fila(fila, limite)
+    enviados = send_emails([mensagem for mensagem, _ in grupos])
+    ids_enviados = [id_fila for indice in enviados for id_fila in grupos[indice][1]]
+    if ids_enviados:
+        supabase.table(TABELA_FILA).delete().in_('id', ids_enviados).execute()
+    return len(enviados)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Envia os resumos de notificações do AgendaMCPF.')
+    parser.add_argument('--janela-minutos', type=int, default=JANELA_PADRAO_MINUTOS, help='Tempo de agrupamento das notificações dos professores')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"{enviar_resumos_administradores()} resumo(s) enviado(s) aos administradores.")
+    print(f"{enviar_emails_agrupados(args.janela_minutos)} e-mail(s) agrupado(s) enviado(s) aos professores.")
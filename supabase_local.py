@@ -0,0 +1,380 @@
+# supabase_local.py
+import operator
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+import httpx
+from postgrest.exceptions import APIError
+
+# Colunas geradas e índices únicos do esquema real (ver validacao.py)
+COLUNAS_GERADAS = {
+    'users': {'email_normalizado': lambda linha: (linha.get('email') or '').strip(' ').lower()},
+    'laboratorios': {'nome_normalizado': lambda linha: re.sub(' +', ' ', (linha.get('nome') or '').strip(' ').lower())},
+}
+RESTRICOES_UNICAS = {
+    'users': [('escola_id', 'email_normalizado')],
+    'laboratorios': [('escola_id', 'nome_normalizado')],
+    'tarefas_agendadas': [('tarefa', 'referencia')],
+}
+
+
+class RespostaLocal:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _literal_array(valor):
+    # Converte o literal '{1,2}' usado nas consultas PostgREST para uma lista
+    itens = [item.strip() for item in valor.strip('{}').split(',') if item.strip()]
+    return [int(item) if item.lstrip('-').isdigit() else item for item in itens]
+
+
+def _comparavel(valor_linha, valor_filtro):
+    if isinstance(valor_linha, list) and isinstance(valor_filtro, str):
+        return _literal_array(valor_filtro)
+    return valor_filtro
+
+
+OPERADORES = {'eq': operator.eq, 'neq': operator.ne, 'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le}
+
+
+def _dividir(texto):
+    # Separa as condições de um filtro lógico do PostgREST pelas vírgulas de fora dos parênteses e aspas
+    partes, atual, nivel, aspas = [], '', 0, False
+    for caractere in texto:
+        if caractere == '"':
+            aspas = not aspas
+        elif not aspas and caractere in '()':
+            nivel += 1 if caractere == '(' else -1
+        elif not aspas and nivel == 0 and caractere == ',':
+            partes.append(atual)
+            atual = ''
+            continue
+        atual += caractere
+    return partes + [atual]
+
+
+def _condicao(texto):
+    # Converte 'coluna.operador.valor', 'and(...)' ou 'or(...)' em um teste sobre a linha
+    if texto.startswith(('and(', 'or(')):
+        combinar = all if texto.startswith('and(') else any
+        testes = [_condicao(parte) for parte in _dividir(texto[texto.index('(') + 1:-1])]
+        return lambda linha: combinar(teste(linha) for teste in testes)
+    coluna, nome_operador, valor = texto.split('.', 2)
+    valor = valor.strip('"')
+    comparar = OPERADORES[nome_operador]
+
+    def teste(linha):
+        atual = linha.get(coluna)
+        if atual is None:
+            return False
+        return comparar(atual, type(atual)(valor) if isinstance(atual, (int, float)) else valor)
+    return teste
+
+
+class ConsultaLocal:
+    """
+    Reproduz o subconjunto do construtor de consultas do supabase-py usado pelo sistema
+    (select/insert/update/delete com filtros, ordenação e paginação) sobre tabelas em memória.
+    """
+
+    def __init__(self, cliente, tabela):
+        self._cliente = cliente
+        self._tabela = tabela
+        self._operacao = 'select'
+        self._colunas = None
+        self._dados = None
+        self._filtros = []
+        self._ordem = []
+        self._limite = None
+        self._inicio = 0
+        self._contar = None
+
+    # Operações
+    def select(self, *colunas, count=None):
+        self._operacao = 'select'
+        self._contar = count
+        self._colunas = [c.strip() for coluna in colunas for c in coluna.split(',')] if colunas else None
+        return self
+
+    def insert(self, dados):
+        self._operacao = 'insert'
+        self._dados = dados
+        return self
+
+    def upsert(self, dados, on_conflict='id'):
+        self._operacao = 'upsert'
+        self._dados = dados
+        self._conflito = on_conflict
+        return self
+
+    def update(self, dados):
+        self._operacao = 'update'
+        self._dados = dados
+        return self
+
+    def delete(self):
+        self._operacao = 'delete'
+        return self
+
+    # Filtros
+    def _filtro(self, coluna, teste):
+        self._filtros.append((coluna, teste))
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v == _comparavel(v, valor))
+
+    def neq(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v != _comparavel(v, valor))
+
+    def gt(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v > valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v >= valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v < valor)
+
+    def lte(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v <= valor)
+
+    def in_(self, coluna, valores):
+        valores = list(valores)
+        return self._filtro(coluna, lambda v: v in valores)
+
+    def or_(self, filtros):
+        # Subconjunto da sintaxe do PostgREST: comparações e and(...) separados por vírgula
+        return self._filtro(None, _condicao(f'or({filtros})'))
+
+    def is_(self, coluna, valor):
+        esperado = None if valor in (None, 'null') else valor
+        return self._filtro(coluna, lambda v: v is esperado or v == esperado)
+
+    def order(self, coluna, desc=False):
+        self._ordem.append((coluna, desc))
+        return self
+
+    def limit(self, quantidade):
+        self._limite = quantidade
+        return self
+
+    def range(self, inicio, fim):
+        self._inicio = inicio
+        self._limite = fim - inicio + 1
+        return self
+
+    # Execução
+    def _corresponde(self, linha):
+        # Filtros sem coluna (or_) recebem a linha inteira
+        return all(teste(linha if coluna is None else linha.get(coluna)) for coluna, teste in self._filtros)
+
+    def _projetar(self, linha):
+        if not self._colunas or '*' in self._colunas:
+            return dict(linha)
+        return {coluna: linha.get(coluna) for coluna in self._colunas}
+
+    def execute(self):
+        self._cliente._registrar_consulta(self._tabela, self._operacao)
+        with self._cliente._lock:
+            linhas = self._cliente._tabelas.setdefault(self._tabela, [])
+            if self._operacao == 'select':
+                resultado = [linha for linha in linhas if self._corresponde(linha)]
+                for coluna, desc in reversed(self._ordem):
+                    resultado.sort(key=lambda linha: (linha.get(coluna) is None, linha.get(coluna)), reverse=desc)
+                fim = None if self._limite is None else self._inicio + self._limite
+                return RespostaLocal([self._projetar(linha) for linha in resultado[self._inicio:fim]],
+                                     count=len(resultado) if self._contar else None)
+            if self._operacao in ('insert', 'upsert'):
+                novos = self._dados if isinstance(self._dados, list) else [self._dados]
+                gravados = []
+                for dados in novos:
+                    existente = None
+                    if self._operacao == 'upsert':
+                        chaves = [c.strip() for c in self._conflito.split(',')]
+                        existente = next((linha for linha in linhas if all(linha.get(c) == dados.get(c) for c in chaves)), None)
+                    if existente is not None:
+                        self._cliente._gravar(self._tabela, linhas, existente, dados)
+                        gravados.append(dict(existente))
+                    else:
+                        linha = self._cliente._nova_linha(self._tabela, dados)
+                        self._cliente._verificar_unicidade(self._tabela, linhas, linha)
+                        linhas.append(linha)
+                        gravados.append(dict(linha))
+                return RespostaLocal(gravados)
+            if self._operacao == 'update':
+                alterados = []
+                for linha in linhas:
+                    if self._corresponde(linha):
+                        self._cliente._gravar(self._tabela, linhas, linha, self._dados)
+                        alterados.append(dict(linha))
+                return RespostaLocal(alterados)
+            removidos = [linha for linha in linhas if self._corresponde(linha)]
+            self._cliente._tabelas[self._tabela] = [linha for linha in linhas if not self._corresponde(linha)]
+            return RespostaLocal([dict(linha) for linha in removidos])
+
+
+def _buscar_agendamentos(tabelas, p_escola_id, p_termo=None, p_laboratorio_id=None, p_usuario_id=None,
+                         p_data_inicio=None, p_data_fim=None, p_limite=20, p_deslocamento=0):
+    # Reproduz a função buscar_agendamentos de migracoes/0009_busca_textual.sql; a relevância é a
+    # fração das palavras do termo presentes na descrição, sem radicais nem trigramas
+    palavras = (p_termo or '').casefold().split()
+    resultados = []
+    for tabela, origem in (('agendamentos', 'agendamento'), ('agendamentos_arquivo', 'agendamento'), ('horarios_fixos', 'horario_fixo')):
+        if origem == 'horario_fixo' and p_usuario_id is not None:
+            continue
+        for linha in tabelas.get(tabela, []):
+            inicio = linha.get('data_inicio', linha.get('data_agendamento'))
+            fim = linha.get('data_fim', linha.get('data_agendamento'))
+            if linha.get('escola_id') != p_escola_id \
+                    or (p_laboratorio_id is not None and linha['laboratorio_id'] != p_laboratorio_id) \
+                    or (p_usuario_id is not None and linha['usuario_id'] != p_usuario_id) \
+                    or (p_data_inicio is not None and fim < p_data_inicio) \
+                    or (p_data_fim is not None and inicio > p_data_fim):
+                continue
+            descricao = (linha.get('descricao') or '').casefold()
+            relevancia = sum(palavra in descricao for palavra in palavras) / len(palavras) if palavras else 0.0
+            if palavras and not relevancia:
+                continue
+            resultados.append({
+                'origem': origem, 'id': linha['id'], 'laboratorio_id': linha['laboratorio_id'],
+                'usuario_id': linha.get('usuario_id'), 'data_inicio': inicio, 'data_fim': fim,
+                'dia_semana': linha.get('dia_semana'), 'aulas': linha['aulas'], 'descricao': linha.get('descricao'),
+                'status': linha.get('status'), 'relevancia': relevancia,
+            })
+    resultados.sort(key=lambda r: (r['relevancia'], r['data_inicio'], r['id']), reverse=True)
+    inicio = max(p_deslocamento, 0)
+    return resultados[inicio:inicio + min(max(p_limite, 1), 100)]
+
+
+def _contar_pendentes(tabelas, p_laboratorio_ids):
+    # Reproduz a função contar_pendentes de migracoes/0010_contagem_pendentes.sql
+    totais = {}
+    for linha in tabelas.get('agendamentos', []):
+        if linha.get('status') == 'pendente' and linha['laboratorio_id'] in p_laboratorio_ids:
+            totais[linha['laboratorio_id']] = totais.get(linha['laboratorio_id'], 0) + 1
+    return [{'laboratorio_id': laboratorio_id, 'total': total} for laboratorio_id, total in totais.items()]
+
+
+FUNCOES = {'buscar_agendamentos': _buscar_agendamentos, 'contar_pendentes': _contar_pendentes}
+
+
+class ChamadaLocal:
+    def __init__(self, cliente, nome, parametros):
+        self._cliente = cliente
+        self._nome = nome
+        self._parametros = parametros
+
+    def execute(self):
+        self._cliente._registrar_consulta('rpc', self._nome)
+        with self._cliente._lock:
+            return RespostaLocal(FUNCOES[self._nome](self._cliente._tabelas, **self._parametros))
+
+
+class ClienteLocal:
+    """
+    Substituto local do cliente Supabase para testes de carga e desenvolvimento sem rede.
+
+    Parâmetros:
+    latencia (float): Atraso em segundos aplicado a cada chamada, simulando a ida e volta ao servidor.
+
+    Falhas podem ser injetadas com `injetar_falhas` para exercitar resiliencia.py: uma fração das
+    chamadas falha com erro de rede e outra fração demora `atraso_lentidao` segundos a mais.
+    """
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.taxa_falhas = 0.0
+        self.taxa_lentidao = 0.0
+        self.atraso_lentidao = 0.0
+        self.total_consultas = 0
+        self.consultas_por_tabela = {}
+        self._tabelas = {}
+        self._sequencias = {}
+        self._lock = threading.RLock()
+
+    def table(self, nome):
+        return ConsultaLocal(self, nome)
+
+    def rpc(self, nome, parametros):
+        return ChamadaLocal(self, nome, parametros)
+
+    def _registrar_consulta(self, tabela, operacao):
+        with self._lock:
+            self.total_consultas += 1
+            chave = f"{tabela}.{operacao}"
+            self.consultas_por_tabela[chave] = self.consultas_por_tabela.get(chave, 0) + 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        if self.taxa_falhas and random.random() < self.taxa_falhas:
+            raise httpx.ConnectError(f'Falha de rede simulada em {tabela}.{operacao}')
+        if self.taxa_lentidao and random.random() < self.taxa_lentidao:
+            time.sleep(self.atraso_lentidao)
+
+    def injetar_falhas(self, taxa_falhas=0.0, taxa_lentidao=0.0, atraso_lentidao=0.0):
+        # Frações de 0 a 1 das chamadas que falham ou ficam lentas; zero desliga a injeção
+        self.taxa_falhas = taxa_falhas
+        self.taxa_lentidao = taxa_lentidao
+        self.atraso_lentidao = atraso_lentidao
+
+    def _nova_linha(self, tabela, dados):
+        linha = dict(dados)
+        if linha.get('id') is None:
+            self._sequencias[tabela] = self._sequencias.get(tabela, 0) + 1
+            linha['id'] = self._sequencias[tabela]
+        else:
+            self._sequencias[tabela] = max(self._sequencias.get(tabela, 0), linha['id'])
+        agora = datetime.now(timezone.utc).isoformat()
+        linha.setdefault('created_at', agora)
+        linha.setdefault('updated_at', agora)
+        for coluna, calcular in COLUNAS_GERADAS.get(tabela, {}).items():
+            linha[coluna] = calcular(linha)
+        return linha
+
+    def _verificar_unicidade(self, tabela, linhas, linha):
+        for colunas in RESTRICOES_UNICAS.get(tabela, []):
+            chave = tuple(linha.get(coluna) for coluna in colunas)
+            if any(outra is not linha and tuple(outra.get(coluna) for coluna in colunas) == chave for outra in linhas):
+                raise APIError({
+                    'code': '23505',
+                    'message': f'duplicate key value violates unique constraint "{tabela}_{"_".join(colunas)}_key"',
+                    'details': f'Key ({", ".join(colunas)})=({", ".join(map(str, chave))}) already exists.',
+                    'hint': None,
+                })
+
+    def _gravar(self, tabela, linhas, linha, dados):
+        nova = dict(linha, **dados)
+        nova['updated_at'] = datetime.now(timezone.utc).isoformat()
+        for coluna, calcular in COLUNAS_GERADAS.get(tabela, {}).items():
+            nova[coluna] = calcular(nova)
+        self._verificar_unicidade(tabela, [outra for outra in linhas if outra is not linha], nova)
+        linha.update(nova)
+
+    def semear(self, tabela, linhas):
+        # Insere dados iniciais sem contabilizar consultas
+        with self._lock:
+            destino = self._tabelas.setdefault(tabela, [])
+            gravadas = [self._nova_linha(tabela, dados) for dados in linhas]
+            destino.extend(gravadas)
+            return [dict(linha) for linha in gravadas]
+
+    def zerar_contadores(self):
+        with self._lock:
+            self.total_consultas = 0
+            self.consultas_por_tabela = {}
+
+
+def criar_cliente_local():
+    latencia = float(os.getenv('SUPABASE_LOCAL_LATENCIA_MS', 0)) / 1000
+    cliente = ClienteLocal(latencia=latencia)
+    cliente.injetar_falhas(
+        taxa_falhas=float(os.getenv('SUPABASE_LOCAL_FALHAS', 0)),
+        taxa_lentidao=float(os.getenv('SUPABASE_LOCAL_LENTIDAO', 0)),
+        atraso_lentidao=float(os.getenv('SUPABASE_LOCAL_LENTIDAO_MS', 0)) / 1000,
+    )
+    return cliente
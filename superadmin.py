@@ -1,19 +1,24 @@
 # superadmin.py
 import streamlit as st
-import bcrypt
-import pandas as pd
 from lab_crud import adicionar_novo_laboratorio, confirmar_exclusao_laboratorio, editar_laboratorio
-from user_crud import adicionar_usuario, confirmar_exclusao_usuario, editar_usuario
+from user_crud import adicionar_usuario, confirmar_exclusao_usuario, editar_usuario, COLUNAS_USUARIO
 from database import supabase
+from functools import partial
+from perfilamento import usuarios_perfilados, definir_usuarios_perfilados
+from escolas import cabecalho_escola, escola_id
+from estado_sessao import estado_sessao, relatorio_memoria
+from dados_sessao import carregar_sessao
+from carregamento import mapa_usuarios
+from relatorios import exibir_exportacao
 
 def painel_superadmin():
     st.title("🦉AgendaMCPF")  # Título do sistema
 
 
     st.subheader("Painel de Administração Geral")
-    st.write("**EEEP Professora Maria Célia Pinheiro Falcão**")  # Nome da escola
+    cabecalho_escola()
     st.markdown("---")  # Linha separadora para organizar o layout
-    tab1, tab2 = st.tabs(["Gerenciar Usuários", "Gerenciar Espaços"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Gerenciar Usuários", "Gerenciar Espaços", "Relatórios", "Diagnóstico"])
 
     with tab1:
         gerenciar_usuarios()
@@ -21,16 +26,24 @@ def painel_superadmin():
     with tab2:
         gerenciar_laboratorios()
 
+    with tab3:
+        exportar_relatorios()
+
+    with tab4:
+        gerenciar_perfilamento()
+        exibir_memoria_sessoes()
+
 
 def gerenciar_usuarios():
     st.subheader("Adicionar Novo Usuário")
     adicionar_usuario()
     
     st.subheader("Usuários Cadastrados")
+    estado = estado_sessao()
     try:
-        # Listar usuários existentes
-        response = supabase.table('users').select('id', 'name', 'email', 'tipo_usuario').execute()
-        usuarios = response.data
+        # Listar usuários existentes; a lista fica na sessão e é corrigida pelas gravações (ver dados_sessao.py)
+        dados = carregar_sessao({'usuarios': ([f'usuarios:{escola_id()}'], partial(buscar_usuarios, escola_id()))})
+        usuarios = dados['usuarios']
         if not usuarios:
             st.info("Nenhum usuário cadastrado.")
             return
@@ -38,34 +51,75 @@ def gerenciar_usuarios():
             for usuario in usuarios:
                 if usuario['tipo_usuario'] != 'superadmin':
                     with st.expander(f"{usuario['name'] or usuario['email']} - {usuario['tipo_usuario']}"):
-                        if st.button("📝 Editar Usuário", key=f"edit_user_{usuario['id']}"):
-                            st.session_state['editar_usuario'] = usuario
-                            st.rerun()
+                        # Os botões só marcam o id na sessão, em callbacks, antes da próxima execução
+                        st.button("📝 Editar Usuário", key=f"edit_user_{usuario['id']}",
+                                  on_click=setattr, args=(estado, 'editar_usuario_id', usuario['id']))
 
+                        st.button("❌ Excluir Usuário", key=f"delete_user_{usuario['id']}",
+                                  on_click=setattr, args=(estado, 'excluir_usuario_id', usuario['id']))
 
-                        if st.button("❌ Excluir Usuário", key=f"delete_user_{usuario['id']}"):
-                            st.session_state['confirm_delete_user_id'] = usuario['id']
-                            st.rerun()
+                        # O registro em edição vem da lista recém-carregada; a sessão guarda só o id
+                        if estado.editar_usuario_id == usuario['id']:
+                            editar_usuario(usuario)
 
-                        if st.session_state.get('editar_usuario') and st.session_state['editar_usuario']['id'] == usuario['id']:
-                            editar_usuario(st.session_state['editar_usuario'])
+        if estado.excluir_usuario_id:
+            # Exibir a confirmação de exclusão
+            confirmar_exclusao_usuario(estado.excluir_usuario_id)
 
-        # Inicializar o estado se necessário
-        if 'confirm_delete_user_id' not in st.session_state:
-            st.session_state['confirm_delete_user_id'] = None
 
-        if st.session_state['confirm_delete_user_id']:
-            # Exibir a confirmação de exclusão
-            confirmar_exclusao_usuario(st.session_state['confirm_delete_user_id'])
+    except Exception as e:
+        st.error(f'Erro ao carregar os usuários: {e}')
 
-        if 'editar_usuario' not in st.session_state:
-            st.session_state['editar_usuario'] = None
-        
 
+
+def buscar_usuarios(escola_id):
+    return supabase.table('users').select(*COLUNAS_USUARIO).eq('escola_id', escola_id).execute().data
+
+
+def buscar_laboratorios(escola_id):
+    return supabase.table('laboratorios').select('*').eq('escola_id', escola_id).execute().data
+
+
+def exportar_relatorios():
+    st.subheader("Relatório de Agendamentos")
+    try:
+        dados = carregar_sessao({'laboratorios': ([f'laboratorios:{escola_id()}'], partial(buscar_laboratorios, escola_id()))})
+        if not dados['laboratorios']:
+            st.info("Nenhum Espaço cadastrado.")
+            return
+        exibir_exportacao('relatorio_escola', escola_id(), dados['laboratorios'])
+    except Exception as e:
+        st.error(f'Erro ao carregar os espaços: {e}')
+
+
+def gerenciar_perfilamento():
+    st.subheader("Perfilamento de Desempenho")
+    st.write("As execuções dos painéis dos usuários selecionados são perfiladas e gravadas no servidor para análise.")
+    try:
+        response = supabase.table('users').select('email').eq('escola_id', escola_id()).order('email').execute()
+        emails = [usuario['email'] for usuario in response.data]
+        perfilados = usuarios_perfilados()
+        selecionados = st.multiselect(
+            "Perfilar as sessões de",
+            options=emails,
+            default=[email for email in emails if email in perfilados],
+            key='usuarios_perfilados'
+        )
+        # Mantém as marcações feitas nas outras escolas
+        novos = (perfilados - set(emails)) | set(selecionados)
+        if novos != perfilados:
+            definir_usuarios_perfilados(novos)
     except Exception as e:
         st.error(f'Erro ao carregar os usuários: {e}')
 
 
+def exibir_memoria_sessoes():
+    st.subheader("Memória das Sessões")
+    st.write("Tamanho estimado do estado guardado no servidor para cada sessão aberta neste processo.")
+    linhas = relatorio_memoria()
+    st.dataframe(linhas, hide_index=True)
+    st.caption(f"{len(linhas)} sessão(ões), {sum(linha['Estado total da sessão (bytes)'] for linha in linhas) / 1024:.1f} KiB no total.")
+
 
 def gerenciar_laboratorios():
     st.subheader("Adicionar Novo Espaço")
@@ -73,22 +127,26 @@ def gerenciar_laboratorios():
     
     st.subheader("Espaços Cadastrados")
     try:
-        response = supabase.table('laboratorios').select('*').execute()
-        laboratorios = response.data
-
-        # Inicializar o estado se necessário
-        if 'confirm_delete_lab_id' not in st.session_state:
-            st.session_state['confirm_delete_lab_id'] = None
+        dados = carregar_sessao({'laboratorios': ([f'laboratorios:{escola_id()}'], partial(buscar_laboratorios, escola_id()))})
+        laboratorios = dados['laboratorios']
+        estado = estado_sessao()
 
-        if st.session_state['confirm_delete_lab_id']:
+        if estado.excluir_laboratorio_id:
             # Exibir a confirmação de exclusão
-            confirmar_exclusao_laboratorio(st.session_state['confirm_delete_lab_id'])
+            confirmar_exclusao_laboratorio(estado.excluir_laboratorio_id)
 
         if not laboratorios:
             st.info("Nenhum Espaço cadastrado.")
 
             return
-        
+
+        # E-mails dos administradores em uma única consulta, e não uma por espaço
+        try:
+            administradores = mapa_usuarios({lab['administrador_id'] for lab in laboratorios}, escola_id(), colunas=('id', 'email'))
+        except Exception as e:
+            administradores = {}
+            st.error(f'Erro ao obter os administradores: {e}')
+
         for lab in laboratorios:
             with st.expander(f"{lab['nome']}"):
                 st.write(f"**Descrição:** {lab.get('descricao', '')}")
@@ -96,29 +154,23 @@ def gerenciar_laboratorios():
                 
                 # Obter o email do administrador
                 admin_email = 'Não atribuído'
-                if lab['administrador_id']:
-                    try:
-                        response_admin = supabase.table('users').select('email').eq('id', lab['administrador_id']).execute()
-                        if response_admin.data:
-                            admin_email = response_admin.data[0]['email']
-                    except Exception as e:
-                        st.error(f'Erro ao obter o administrador: {e}')
+                if lab['administrador_id'] in administradores:
+                    admin_email = administradores[lab['administrador_id']]['email']
                 st.write(f"**Administrador:** {admin_email}")
 
                 col1, col2 = st.columns(2)
                 with col1:
-                    if st.button("📝 Editar Laboratório", key=f"edit_lab_{lab['id']}"):
-                        st.session_state['editar_laboratorio'] = lab  # Armazena o laboratório a ser editado
-                        st.session_state['editando'] = True  # Indica que está em modo de edição
-                    
+                    # Guarda só o id do laboratório a ser editado
+                    st.button("📝 Editar Laboratório", key=f"edit_lab_{lab['id']}",
+                              on_click=setattr, args=(estado, 'editar_laboratorio_id', lab['id']))
+
                 with col2:
-                    if st.button("❌ Excluir Laboratório", key=f"delete_lab_{lab['id']}"):
-                        st.session_state['confirm_delete_lab_id'] = lab['id']
-                        st.rerun()
+                    st.button("❌ Excluir Laboratório", key=f"delete_lab_{lab['id']}",
+                              on_click=setattr, args=(estado, 'excluir_laboratorio_id', lab['id']))
                 
-                # Se estiver editando, exibe o formulário de edição
-                if st.session_state.get('editando') and st.session_state['editar_laboratorio']['id'] == lab['id']:
-                    editar_laboratorio(st.session_state['editar_laboratorio'])  # Chama a função de edição
+                # Se estiver editando, exibe o formulário de edição com o registro recém-carregado
+                if estado.editar_laboratorio_id == lab['id']:
+                    editar_laboratorio(lab)  # Chama a função de edição
 
     except Exception as e:
         st.error(f'Erro ao carregar os laboratórios: {e}')
@@ -0,0 +1,73 @@
+# tempo_inicializacao.py
+"""
+Medição da partida a frio do processo do Streamlit.
+
+Registra o tempo de import de cada módulo carregado por `importar` e a duração da primeira execução
+completa do script no processo, do início (`iniciar_execucao`) ao fim (`registrar_primeira_renderizacao`).
+A contagem não parte do início do processo: o servidor pode ficar parado muito tempo antes do primeiro
+acesso, e esse intervalo não é custo de partida. O relatório vai para o log e, se TEMPO_INICIALIZACAO_ARQUIVO estiver definido, é acrescentado como uma linha JSON
+nesse arquivo, permitindo comparar a partida entre implantações.
+"""
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+ARQUIVO_RELATORIO = os.getenv('TEMPO_INICIALIZACAO_ARQUIVO')
+
+_importacoes_ms = {}
+_lock = threading.Lock()
+_relatorio = None
+# Início da execução do script em andamento; cada sessão executa em sua própria thread
+_execucao = threading.local()
+
+
+def iniciar_execucao():
+    # Chamado no início de main.py, a cada execução
+    _execucao.inicio = time.perf_counter()
+
+
+def importar(nome_modulo):
+    """
+    Importa o módulo e, se for a primeira vez no processo, registra quanto tempo levou
+    (incluindo os módulos que ele importa).
+    """
+    if nome_modulo in sys.modules:
+        return sys.modules[nome_modulo]
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nome_modulo)
+    duracao_ms = round((time.perf_counter() - inicio) * 1000, 1)
+    with _lock:
+        _importacoes_ms.setdefault(nome_modulo, duracao_ms)
+        depois_da_partida = _relatorio is not None
+    if depois_da_partida:
+        # Painéis carregados sob demanda depois da primeira tela
+        logging.info(f"Import sob demanda: {nome_modulo} em {duracao_ms} ms")
+    return modulo
+
+
+def registrar_primeira_renderizacao():
+    # Chamado ao final de main.py; só a primeira execução completa do processo gera o relatório
+    global _relatorio
+    inicio = getattr(_execucao, 'inicio', None)
+    with _lock:
+        if _relatorio is not None or inicio is None:
+            return
+        _relatorio = {
+            'pid': os.getpid(),
+            'versao': os.getenv('APP_VERSAO', ''),
+            'primeira_execucao_ms': round((time.perf_counter() - inicio) * 1000, 1),
+            'importacoes_total_ms': round(sum(_importacoes_ms.values()), 1),
+            'importacoes_ms': dict(_importacoes_ms),
+        }
+    logging.info(f"Inicialização: {json.dumps(_relatorio, ensure_ascii=False)}")
+    if ARQUIVO_RELATORIO:
+        try:
+            with open(ARQUIVO_RELATORIO, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(json.dumps(_relatorio, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logging.error(f"Erro ao gravar o relatório de inicialização: {e}")
+
@@ -0,0 +1,301 @@
+# teste_carga.py
+"""
+Teste de carga com sessões simultâneas do Streamlit.
+
+Simula vários professores abrindo o painel ao mesmo tempo (como na publicação da agenda semanal)
+usando o AppTest do Streamlit contra o substituto local do Supabase (supabase_local.py).
+Cada sessão de professor faz login, solicita um agendamento e consulta a agenda; em seguida uma
+sessão de administrador por espaço aprova os pedidos pendentes.
+
+Uso:
+    python teste_carga.py --sessoes 40 --concorrencia 10 --latencia-ms 30
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# O substituto local precisa estar ativo antes de qualquer import de database.py
+os.environ['SUPABASE_LOCAL'] = '1'
+# Evita que o .env de desenvolvimento envie e-mails reais durante a carga
+os.environ['SMTP_SERVER'] = ''
+
+SENHA_PADRAO = 'carga123'
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+_componentes = None
+
+
+def permitir_sessoes_simultaneas():
+    """
+    O AppTest foi feito para uma sessão por vez: a cada run() ele instala um Runtime simulado global
+    e substitui `config.get_option` para ligar `global.appTest`, desfazendo as duas coisas ao terminar.
+    Com várias sessões em paralelo no mesmo processo, uma sessão desfaria o ambiente de outra que
+    ainda está executando. Aqui o modo de teste fica ligado e o último Runtime instalado continua
+    disponível enquanto o teste de carga roda. O bytecode de main.py também passa a ser compilado uma
+    única vez, como no servidor real, em vez de a cada rerun.
+    """
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+    from streamlit.testing.v1.util import build_mock_config_get_option
+    config.get_option = build_mock_config_get_option({'global.appTest': True})
+    cache_compartilhado = ScriptCache()
+    local_script_runner.ScriptCache = lambda: cache_compartilhado
+
+    ultimo = {}
+    instancia_original = Runtime.instance.__func__
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo['runtime'] = cls._instance
+            return cls._instance
+        if 'runtime' in ultimo:
+            return ultimo['runtime']
+        return instancia_original(cls)
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or 'runtime' in ultimo)
+
+
+def nova_sessao(timeout):
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(APP, default_timeout=timeout)
+    # A descoberta de componentes é feita pelo AppTest a cada sessão nova, algo que o servidor real
+    # faz uma única vez; reaproveitá-la evita medir o custo do próprio AppTest
+    if _componentes is not None:
+        app._bidi_component_manager = _componentes
+    return app
+
+
+def guardar_componentes(app):
+    global _componentes
+    _componentes = app._bidi_component_manager
+
+
+def memoria_processo():
+    # Retorna (memória residente atual, pico) em MB
+    try:
+        with open('/proc/self/status') as status:
+            valores = dict(linha.split(':', 1) for linha in status if ':' in linha)
+        return int(valores['VmRSS'].split()[0]) / 1024, int(valores['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError):
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return pico, pico
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+class Medicoes:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.falhas = []
+
+    def registrar(self, etapa, segundos):
+        with self._lock:
+            self.latencias.setdefault(etapa, []).append(segundos)
+
+    def falha(self, sessao, etapa, erro):
+        with self._lock:
+            self.falhas.append({'sessao': sessao, 'etapa': etapa, 'erro': str(erro)})
+
+
+def semear_dados(cliente, sessoes, laboratorios, rounds_bcrypt):
+    import bcrypt
+    from escolas import ESCOLA_PADRAO
+    senha_hash = bcrypt.hashpw(SENHA_PADRAO.encode('utf-8'), bcrypt.gensalt(rounds_bcrypt)).decode('utf-8')
+    escola_id = cliente.semear('escolas', [{'slug': ESCOLA_PADRAO, 'nome': 'Escola de Carga'}])[0]['id']
+    cliente.semear('users', [{'name': 'Superadmin', 'email': 'superadmin@carga.local', 'password': senha_hash, 'tipo_usuario': 'superadmin', 'escola_id': escola_id}])
+    admins = cliente.semear('users', [
+        {'name': f'Admin {i}', 'email': f'admin{i}@carga.local', 'password': senha_hash, 'tipo_usuario': 'admlab', 'escola_id': escola_id}
+        for i in range(laboratorios)
+    ])
+    cliente.semear('laboratorios', [
+        {'nome': f'Espaço {i}', 'descricao': '', 'capacidade': 40, 'administrador_id': admin['id'], 'escola_id': escola_id}
+        for i, admin in enumerate(admins)
+    ])
+    cliente.semear('users', [
+        {'name': f'Professor {i}', 'email': f'professor{i}@carga.local', 'password': senha_hash, 'tipo_usuario': 'professor', 'escola_id': escola_id}
+        for i in range(sessoes)
+    ] + [{'name': 'Aquecimento', 'email': 'aquecimento@carga.local', 'password': senha_hash, 'tipo_usuario': 'professor', 'escola_id': escola_id}])
+
+
+def executar(app, medicoes, etapa):
+    inicio = time.perf_counter()
+    app.run()
+    medicoes.registrar(etapa, time.perf_counter() - inicio)
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+
+
+def botao(app, rotulo):
+    return next(b for b in app.button if b.label.endswith(rotulo))
+
+
+def login(app, email, medicoes):
+    executar(app, medicoes, 'abertura')
+    app.text_input[0].input(email)
+    app.text_input[1].input(SENHA_PADRAO)
+    botao(app, 'Login').click()
+    executar(app, medicoes, 'login')
+
+
+def aquecer(timeout):
+    """
+    Abre um painel de cada perfil antes da carga, sem medir. Os imports feitos na primeira execução
+    compilam código e, no CPython 3.11, compilações simultâneas em várias threads podem falhar com
+    SystemError; além disso a partida a frio não faz parte do regime que queremos medir.
+    """
+    for email in ('superadmin@carga.local', 'admin0@carga.local', 'aquecimento@carga.local'):
+        app = nova_sessao(timeout)
+        login(app, email, Medicoes())
+        guardar_componentes(app)
+
+
+def sessao_professor(indice, medicoes, timeout):
+    app = nova_sessao(timeout)
+    etapa = 'abertura'
+    try:
+        login(app, f'professor{indice}@carga.local', medicoes)
+        etapa = 'agendar'
+        app.selectbox[0].set_value(app.selectbox[0].options[indice % len(app.selectbox[0].options)])
+        app.multiselect[0].set_value([1 + indice % 9])
+        app.text_input[0].input(f'Atividade de carga {indice}')
+        botao(app, 'Confirmar Agendamento').click()
+        executar(app, medicoes, etapa)
+        etapa = 'agenda'
+        botao(app, 'Consultar Agenda').click()
+        executar(app, medicoes, etapa)
+    except Exception as e:
+        medicoes.falha(f'professor{indice}', etapa, e)
+
+
+def sessao_administrador(indice, medicoes, timeout):
+    app = nova_sessao(timeout)
+    etapa = 'abertura'
+    try:
+        login(app, f'admin{indice}@carga.local', medicoes)
+        etapa = 'aprovar'
+        # Seleciona todas as linhas das tabelas de pendentes e aprova de uma vez; o AppTest não clica
+        # nas linhas, então a seleção é definida pelo estado do widget
+        while any(b.label.endswith('Aprovar') for b in app.button):
+            for tabela in app.dataframe:
+                if tabela.key and tabela.key.startswith('pendentes_'):
+                    app.session_state[tabela.key] = {'selection': {'rows': list(range(len(tabela.value))), 'columns': []}}
+            executar(app, medicoes, 'selecionar')
+            botao(app, 'Aprovar').click()
+            executar(app, medicoes, etapa)
+    except Exception as e:
+        medicoes.falha(f'admin{indice}', etapa, e)
+
+
+def relatorio(medicoes, cliente, duracao, memoria_inicial, resiliencia, cache):
+    memoria_atual, memoria_pico = memoria_processo()
+    total_reruns = sum(len(valores) for valores in medicoes.latencias.values())
+    return {
+        'duracao_s': round(duracao, 3),
+        'reruns': total_reruns,
+        'latencia_ms': {
+            etapa: {
+                'n': len(valores),
+                'p50': round(percentil(valores, 50) * 1000, 1),
+                'p90': round(percentil(valores, 90) * 1000, 1),
+                'p99': round(percentil(valores, 99) * 1000, 1),
+                'max': round(max(valores) * 1000, 1),
+                'media': round(statistics.fmean(valores) * 1000, 1),
+            }
+            for etapa, valores in medicoes.latencias.items()
+        },
+        'consultas': {
+            'total': cliente.total_consultas,
+            'por_rerun': round(cliente.total_consultas / total_reruns, 2) if total_reruns else 0,
+            'por_tabela': dict(sorted(cliente.consultas_por_tabela.items())),
+        },
+        'resiliencia': resiliencia,
+        'cache': cache,
+        'memoria_mb': {
+            'inicial': round(memoria_inicial, 1),
+            'final': round(memoria_atual, 1),
+            'pico': round(memoria_pico, 1),
+        },
+        'falhas': medicoes.falhas,
+    }
+
+
+def imprimir_relatorio(dados):
+    print(f"Duração total: {dados['duracao_s']} s | Reruns: {dados['reruns']}")
+    print(f"{'Etapa':<10} {'n':>5} {'p50':>9} {'p90':>9} {'p99':>9} {'máx':>9}  (ms)")
+    for etapa, valores in dados['latencia_ms'].items():
+        print(f"{etapa:<10} {valores['n']:>5} {valores['p50']:>9} {valores['p90']:>9} {valores['p99']:>9} {valores['max']:>9}")
+    consultas = dados['consultas']
+    print(f"Consultas ao Supabase: {consultas['total']} ({consultas['por_rerun']} por rerun)")
+    for chave, quantidade in consultas['por_tabela'].items():
+        print(f"  {chave:<28} {quantidade:>7}")
+    memoria = dados['memoria_mb']
+    print('Resiliência: ' + ' | '.join(f'{chave} {valor}' for chave, valor in dados['resiliencia'].items()))
+    print('Cache compartilhado: ' + ' | '.join(f'{chave} {valor}' for chave, valor in dados['cache'].items()))
+    print(f"Memória do processo: inicial {memoria['inicial']} MB | final {memoria['final']} MB | pico {memoria['pico']} MB")
+    if dados['falhas']:
+        print(f"Falhas: {len(dados['falhas'])}")
+        for falha in dados['falhas'][:10]:
+            print(f"  {falha['sessao']} [{falha['etapa']}]: {falha['erro']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga do AgendaMCPF com sessões simultâneas.')
+    parser.add_argument('--sessoes', type=int, default=40, help='Quantidade de sessões de professores')
+    parser.add_argument('--concorrencia', type=int, default=10, help='Sessões executadas ao mesmo tempo')
+    parser.add_argument('--laboratorios', type=int, default=3, help='Quantidade de espaços (um administrador por espaço)')
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help='Latência simulada por chamada ao Supabase')
+    parser.add_argument('--rounds-bcrypt', type=int, default=12, help='Custo do bcrypt das senhas semeadas')
+    parser.add_argument('--falhas', type=float, default=0.0, help='Fração das chamadas ao Supabase que falham com erro de rede')
+    parser.add_argument('--lentas', type=float, default=0.0, help='Fração das chamadas ao Supabase que ficam lentas')
+    parser.add_argument('--lentidao-ms', type=float, default=0.0, help='Atraso extra das chamadas lentas')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Tempo máximo de cada rerun em segundos')
+    parser.add_argument('--json', metavar='ARQUIVO', help='Grava o relatório em JSON para comparação entre versões')
+    args = parser.parse_args(argv)
+
+    from database import supabase
+    import cache_compartilhado
+    cliente = supabase.cliente
+    cliente.latencia = args.latencia_ms / 1000
+    semear_dados(cliente, args.sessoes, args.laboratorios, args.rounds_bcrypt)
+
+    permitir_sessoes_simultaneas()
+    aquecer(args.timeout)
+    cliente.zerar_contadores()
+    cliente.injetar_falhas(args.falhas, args.lentas, args.lentidao_ms / 1000)
+    estatisticas_iniciais = dict(supabase.estatisticas)
+    cache_inicial = dict(cache_compartilhado.estatisticas)
+    medicoes = Medicoes()
+    memoria_inicial, _ = memoria_processo()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        list(executor.map(lambda i: sessao_professor(i, medicoes, args.timeout), range(args.sessoes)))
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        list(executor.map(lambda i: sessao_administrador(i, medicoes, args.timeout), range(args.laboratorios)))
+    resiliencia = {chave: valor - estatisticas_iniciais[chave] for chave, valor in supabase.estatisticas.items()}
+    cache = {chave: valor - cache_inicial[chave] for chave, valor in cache_compartilhado.estatisticas.items()}
+    dados = relatorio(medicoes, cliente, time.perf_counter() - inicio, memoria_inicial, resiliencia, cache)
+
+    imprimir_relatorio(dados)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump(dados, arquivo, ensure_ascii=False, indent=2)
+    return 1 if dados['falhas'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
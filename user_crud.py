@@ -1,6 +1,16 @@
 import streamlit as st
 import bcrypt
 from database import supabase
+from validacao import email_em_uso, violacao_unicidade
+from escolas import escola_id
+from estado_sessao import estado_sessao
+from dados_sessao import aplicar, atualizar_linhas, remover_linhas
+
+# Colunas da lista de usuários do superadministrador; a senha nunca fica na sessão
+COLUNAS_USUARIO = ('id', 'name', 'email', 'tipo_usuario')
+
+def linhas_usuario(linhas):
+    return [{coluna: linha[coluna] for coluna in COLUNAS_USUARIO} for linha in linhas]
 
 
 def adicionar_usuario():
@@ -24,6 +34,8 @@ def adicionar_usuario():
                     st.warning('As senhas não coincidem.')
                 elif novo_email.strip() == '' or nova_senha.strip() == '':
                     st.warning('Email e senha são obrigatórios.')
+                elif email_em_uso(novo_email, escola_id()):
+                    st.warning('Já existe um usuário com este email.')
                 else:
                     # Hash da senha
                     hashed_password = bcrypt.hashpw(nova_senha.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -31,87 +43,103 @@ def adicionar_usuario():
                         'name': novo_nome.strip(),
                         'email': novo_email.strip(),
                         'password': hashed_password,
-                        'tipo_usuario': novo_tipo
+                        'tipo_usuario': novo_tipo,
+                        'escola_id': escola_id()
                     }
                     try:
                         response = supabase.table('users').insert(novo_usuario).execute()
+                        # A lista de usuários é desenhada depois do formulário e já recebe a nova linha
+                        aplicar([f'usuarios:{escola_id()}'], {'usuarios': atualizar_linhas(linhas_usuario(response.data))})
                         st.success('Usuário adicionado com sucesso!')
-                        st.rerun()
                     except Exception as e:
-                        st.error(f'Erro ao adicionar o usuário: {e}')
+                        if violacao_unicidade(e):
+                            st.warning('Já existe um usuário com este email.')
+                        else:
+                            st.error(f'Erro ao adicionar o usuário: {e}')
 
 def editar_usuario(usuario):
     st.subheader(f"Editar Usuário: {usuario['email']}")
+    prefixo = f"usuario_{usuario['id']}"
     with st.form(key=f"edit_user_{usuario['id']}"):
-        novo_nome = st.text_input("Nome", value=usuario['name'], help="Atualize o nome do usuário")
+        st.text_input("Nome", value=usuario['name'], help="Atualize o nome do usuário", key=f'{prefixo}_nome')
         col1, col2 = st.columns(2)
         with col1:
 
-            novo_email = st.text_input("Email", value=usuario['email'], help="Atualize o email do usuário")
+            st.text_input("Email", value=usuario['email'], help="Atualize o email do usuário", key=f'{prefixo}_email')
         with col2:
-            novo_tipo = st.radio("Tipo de Usuário", options=['admlab', 'professor'], index=['admlab', 'professor'].index(usuario['tipo_usuario']), help="Selecione o novo tipo de usuário")
+            st.radio("Tipo de Usuário", options=['admlab', 'professor'], index=['admlab', 'professor'].index(usuario['tipo_usuario']), help="Selecione o novo tipo de usuário", key=f'{prefixo}_tipo')
         col3, col4 = st.columns(2)
         with col3:
-            nova_senha = st.text_input("Nova Senha (deixe em branco para não alterar)", type='password', help="Digite uma nova senha")
+            st.text_input("Nova Senha (deixe em branco para não alterar)", type='password', help="Digite uma nova senha", key=f'{prefixo}_senha')
         with col4:
-            senha_confirmacao = st.text_input("Confirme a Nova Senha", type='password', help="Confirme a nova senha")
-
-        submitted = st.form_submit_button("💾 Atualizar Dados")
-
-        if submitted:
-            st.write(novo_email)
-            if nova_senha != senha_confirmacao:
-                st.warning('As senhas não coincidem.')
-
-            elif novo_email.strip() == '':
-                st.warning('O email não pode estar vazio.')
+            st.text_input("Confirme a Nova Senha", type='password', help="Confirme a nova senha", key=f'{prefixo}_confirmacao')
+
+        # Gravado em um callback: a lista acima já aparece corrigida na próxima execução
+        st.form_submit_button("💾 Atualizar Dados", on_click=salvar_usuario_editado, args=(usuario['id'], prefixo))
+
+def salvar_usuario_editado(usuario_id, prefixo):
+    novo_nome, novo_email, novo_tipo, nova_senha, senha_confirmacao = (
+        st.session_state[f'{prefixo}_{campo}'] for campo in ('nome', 'email', 'tipo', 'senha', 'confirmacao')
+    )
+    if nova_senha != senha_confirmacao:
+        st.warning('As senhas não coincidem.')
+
+    elif novo_email.strip() == '':
+        st.warning('O email não pode estar vazio.')
+    elif email_em_uso(novo_email, escola_id(), ignorar_id=usuario_id):
+        st.warning('Já existe um usuário com este email.')
+    else:
+        update_data = {
+            'name': novo_nome.strip(),
+            'email': novo_email.strip(),
+            'tipo_usuario': novo_tipo
+        }
+        if nova_senha.strip() != '':
+            hashed_password = bcrypt.hashpw(nova_senha.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            update_data['password'] = hashed_password
+        try:
+            response = supabase.table('users').update(update_data).eq('escola_id', escola_id()).eq('id', usuario_id).execute()
+            aplicar([f'usuarios:{escola_id()}'], {'usuarios': atualizar_linhas(linhas_usuario(response.data))})
+            st.success('Usuário atualizado com sucesso!')
+            estado_sessao().editar_usuario_id = None  # Fecha o formulário de edição
+
+        except Exception as e:
+            if violacao_unicidade(e):
+                st.warning('Já existe um usuário com este email.')
             else:
-                update_data = {
-                    'name': novo_nome.strip(),
-                    'email': novo_email.strip(),
-                    'tipo_usuario': novo_tipo
-                }
-                if nova_senha.strip() != '':
-                    hashed_password = bcrypt.hashpw(nova_senha.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-                    update_data['password'] = hashed_password
-                try:
-                    response = supabase.table('users').update(update_data).eq('id', usuario['id']).execute()
-                    st.success('Usuário atualizado com sucesso!')
-                    st.rerun()
-
-                except Exception as e:
-                    st.error(f'Erro ao atualizar o usuário: {e}')
+                st.error(f'Erro ao atualizar o usuário: {e}')
 
 
 
 def confirmar_exclusao_usuario(usuario_id):
     try:
         # Obter o usuário pelo ID
-        response = supabase.table('users').select('email').eq('id', usuario_id).execute()
+        response = supabase.table('users').select('email').eq('escola_id', escola_id()).eq('id', usuario_id).execute()
         if not response.data:
             st.error('Usuário não encontrado.')
-            st.session_state['confirm_delete_user_id'] = None  # Resetar o estado
+            estado_sessao().excluir_usuario_id = None  # Resetar o estado
             return
         usuario = response.data[0]
         st.warning(f"Tem certeza que deseja excluir o usuário **{usuario['email']}**? Esta ação não pode ser desfeita.")
         col1, col2 = st.columns(2)
         with col1:
-            if st.button('❌ Confirmar Exclusão', key=f'confirm_delete_user_{usuario_id}'):
-                try:
-                    response = supabase.table('users').delete().eq('id', usuario_id).execute()
-                    st.success('Usuário excluído com sucesso!')
-                    st.session_state['confirm_delete_user_id'] = None  # Resetar o estado
-                    st.rerun()
-                except Exception as e:
-                    st.error(f'Erro ao excluir o usuário: {e}')
-                    st.session_state['confirm_delete_user_id'] = None  # Resetar o estado
+            st.button('❌ Confirmar Exclusão', key=f'confirm_delete_user_{usuario_id}', on_click=excluir_usuario, args=(usuario_id,))
         with col2:
-            if st.button('Cancelar', key=f'cancel_delete_user_{usuario_id}'):
-                st.session_state['confirm_delete_user_id'] = None  # Resetar o estado
-                st.rerun()
+            # Resetar o estado
+            st.button('Cancelar', key=f'cancel_delete_user_{usuario_id}', on_click=setattr, args=(estado_sessao(), 'excluir_usuario_id', None))
     except Exception as e:
         st.error(f'Erro ao obter o usuário: {e}')
-        st.session_state['confirm_delete_user_id'] = None  # Resetar o estado
+        estado_sessao().excluir_usuario_id = None  # Resetar o estado
+
+def excluir_usuario(usuario_id):
+    try:
+        response = supabase.table('users').delete().eq('escola_id', escola_id()).eq('id', usuario_id).execute()
+        # Os agendamentos do usuário são removidos junto; as agendas dependem de usuarios:<escola>
+        aplicar([f'usuarios:{escola_id()}', f'agendamentos_usuario:{usuario_id}'], {'usuarios': remover_linhas([usuario_id])})
+        st.success('Usuário excluído com sucesso!')
+    except Exception as e:
+        st.error(f'Erro ao excluir o usuário: {e}')
+    estado_sessao().excluir_usuario_id = None  # Resetar o estado
 
 def ler_usuario(usuario_id):
     # Lógica para ler um usuário
@@ -0,0 +1,49 @@
+# validacao.py
+"""
+Unicidade de e-mails de usuários e nomes de espaços dentro de cada escola.
+
+A comparação é feita por colunas normalizadas geradas pelo banco e protegidas por índices únicos
+(migracoes/0003_unicidade_normalizada.sql e 0007_escolas.sql), de modo que cada verificação é uma busca de uma única
+linha pelo índice. As funções abaixo aplicam a mesma normalização das expressões SQL; `btrim` sem
+argumentos remove só espaços, e não tabulações ou quebras de linha, daí o `strip(' ')`.
+"""
+import logging
+import re
+from database import supabase
+
+# Código do PostgreSQL para violação de restrição de unicidade
+CODIGO_VIOLACAO_UNICIDADE = '23505'
+
+
+def normalizar_email(email):
+    return email.strip(' ').lower()
+
+
+def normalizar_nome_laboratorio(nome):
+    return re.sub(' +', ' ', nome.strip(' ').lower())
+
+
+def _existe(tabela, coluna, valor, escola_id, ignorar_id=None):
+    # Sem a última resposta boa: a verificação precisa refletir o banco no momento da gravação
+    consulta = supabase.table(tabela, guardar=False).select('id').eq('escola_id', escola_id).eq(coluna, valor)
+    if ignorar_id is not None:
+        consulta = consulta.neq('id', ignorar_id)
+    try:
+        return bool(consulta.limit(1).execute().data)
+    except Exception as e:
+        # O índice único continua garantindo a regra na gravação; ver violacao_unicidade
+        logging.error(f"Erro ao verificar unicidade em {tabela}.{coluna}: {e}")
+        return False
+
+
+def email_em_uso(email, escola_id, ignorar_id=None):
+    return _existe('users', 'email_normalizado', normalizar_email(email), escola_id, ignorar_id)
+
+
+def nome_laboratorio_em_uso(nome, escola_id, ignorar_id=None):
+    return _existe('laboratorios', 'nome_normalizado', normalizar_nome_laboratorio(nome), escola_id, ignorar_id)
+
+
+def violacao_unicidade(erro):
+    # Identifica o erro devolvido pelo PostgREST quando um índice único é violado (escritas concorrentes)
+    return getattr(erro, 'code', None) == CODIGO_VIOLACAO_UNICIDADE